@@ -0,0 +1,184 @@
+#!/usr/bin/env python3
+"""
+Analog Movement
+Proportional movement from the position stream by pulse-width modulating the direction keys
+
+Keyboard games only know "held" or "not held", so a light push is turned
+into a duty cycle: on every tick of a fixed-rate PWM cycle the direction
+keys of the current position are pressed and released again after
+duty * period (a light push holds w for 30% of each cycle, a full push
+keeps it held). Ticks and releases are scheduler timers, so the listener
+sleeps until the next edge instead of spinning.
+
+The radial deadzone and the response curve are applied once per (x, y)
+when the lookup table is built; a position update is one list index.
+"""
+
+import math
+
+# Positions the firmware reports per axis
+AXIS_RANGE = 100
+AXIS_SIZE = 2 * AXIS_RANGE + 1
+
+DEFAULT_DEADZONE = 15  # Radius below which the stick counts as centered
+DEFAULT_SATURATION = 95  # Radius at which the duty reaches 100%
+DEFAULT_CURVE = 1.0  # Response curve exponent: 1 linear, > 1 finer control near the center
+DEFAULT_PERIOD = 0.1  # PWM cycle length (seconds)
+
+
+def build_duty_table(deadzone=DEFAULT_DEADZONE, curve=DEFAULT_CURVE, saturation=DEFAULT_SATURATION,
+                     square=True):
+    """(x duty, y duty) for every position, indexed by position_index(x, y)
+
+    Duties are signed fractions of the cycle in -1..1. The magnitude comes
+    from the radius (radial deadzone, then the response curve). With square
+    it is split over the axes relative to the larger one, so a full diagonal
+    push holds both keys all the time like the 8-way mode does; otherwise
+    relative to the radius, for outputs where a diagonal must not be faster.
+    """
+    if not 0 <= deadzone < saturation <= AXIS_RANGE * math.sqrt(2):
+        raise ValueError("Expected 0 <= deadzone < saturation")
+    if curve <= 0:
+        raise ValueError("The response curve exponent must be positive")
+
+    span = saturation - deadzone
+    table = []
+    for y in range(-AXIS_RANGE, AXIS_RANGE + 1):
+        for x in range(-AXIS_RANGE, AXIS_RANGE + 1):
+            radius = math.hypot(x, y)
+            if radius <= deadzone:
+                table.append((0.0, 0.0))
+                continue
+            magnitude = min(1.0, (radius - deadzone) / span) ** curve
+            scale = max(abs(x), abs(y)) if square else radius
+            table.append((magnitude * x / scale, magnitude * y / scale))
+    return table
+
+
+def position_index(x, y):
+    """Index of a position in a duty table, clamping out-of-range values"""
+    x = -AXIS_RANGE if x < -AXIS_RANGE else AXIS_RANGE if x > AXIS_RANGE else x
+    y = -AXIS_RANGE if y < -AXIS_RANGE else AXIS_RANGE if y > AXIS_RANGE else y
+    return (y + AXIS_RANGE) * AXIS_SIZE + x + AXIS_RANGE
+
+
+class AnalogMovement:
+    """Drives the controller's direction keys from stick positions
+
+    Runs entirely on the listener thread: update() is called per position
+    and the PWM ticks and releases are controller.scheduler timers. A
+    position that is not refreshed within the controller's direction
+    timeout counts as centered, like a direction message in the 8-way mode.
+    """
+
+    def __init__(self, controller, deadzone=DEFAULT_DEADZONE, curve=DEFAULT_CURVE,
+                 saturation=DEFAULT_SATURATION, period=DEFAULT_PERIOD):
+        if period <= 0:
+            raise ValueError("The PWM period must be positive")
+        self.controller = controller
+        self.scheduler = controller.scheduler
+        self.clock = controller.clock
+        self.table = build_duty_table(deadzone, curve, saturation)
+        self.deadzone = deadzone
+        self.curve = curve
+        self.period = period
+
+        self.duty = (0.0, 0.0)
+        self.updated_at = None
+        self.cycle_target = 0  # Keys pressed at the start of the running cycle
+        self.cycles = 0
+        self._tick_handle = None
+        self._next_tick = None
+        self._release_handles = [None, None]
+
+    def update(self, x, y):
+        """New stick position, restarts the cycle if it needs other keys"""
+        self.duty = duty = self.table[position_index(x, y)]
+        self.updated_at = self.clock()
+        target = self.target_of(duty)
+        if target != self.cycle_target or self._tick_handle is None:
+            # Direction change, start or return to the deadzone: act now
+            self.restart()
+
+    def target_of(self, duty):
+        """Mask of the keys a duty pair presses at the start of a cycle"""
+        right, left, up, down = self.controller.axis_masks
+        dx, dy = duty
+        target = 0
+        if dx > 0:
+            target |= right
+        elif dx < 0:
+            target |= left
+        if dy > 0:
+            target |= up
+        elif dy < 0:
+            target |= down
+        return target
+
+    def restart(self):
+        self._cancel(self._tick_handle)
+        self._tick_handle = None
+        self._next_tick = self.clock()
+        self.tick()
+
+    def tick(self):
+        """Start one PWM cycle"""
+        started = self._next_tick
+        now = self.clock()
+        controller = self.controller
+        if self.updated_at is None or (not controller.changes_only
+                                       and now - self.updated_at > controller.direction_timeout):
+            self.duty = (0.0, 0.0)
+
+        for index, handle in enumerate(self._release_handles):
+            self._cancel(handle)
+            self._release_handles[index] = None
+
+        state = controller.key_state
+        target = self.cycle_target = self.target_of(self.duty)
+        release, press = state.diff(target, controller.direction_mask)
+        if release or press:
+            controller.change_keys(release, press)
+        if not target:
+            # Centered: nothing to modulate until the next position
+            self._tick_handle = None
+            return
+
+        # Partly pressed axes are released within this cycle
+        right, left, up, down = controller.axis_masks
+        for index, duty in enumerate(self.duty):
+            if 0.0 < abs(duty) < 1.0:
+                if index == 0:
+                    mask = right if duty > 0 else left
+                else:
+                    mask = up if duty > 0 else down
+                self._release_handles[index] = self.scheduler.call_at(
+                    started + abs(duty) * self.period, self.release_axis, mask)
+
+        # Fixed rate from the first tick, skipping cycles the listener missed
+        self.cycles += 1
+        next_tick = started + self.period
+        if next_tick <= now:
+            next_tick = now + self.period
+        self._next_tick = next_tick
+        self._tick_handle = self.scheduler.call_at(next_tick, self.tick)
+
+    def release_axis(self, mask):
+        """End the pressed part of one axis"""
+        held = self.controller.key_state.mask & mask
+        if held:
+            self.controller.change_keys(held, 0)
+
+    def stop(self):
+        """Stop modulating (the caller releases the keys)"""
+        self._cancel(self._tick_handle)
+        self._tick_handle = None
+        for index, handle in enumerate(self._release_handles):
+            self._cancel(handle)
+            self._release_handles[index] = None
+        self.duty = (0.0, 0.0)
+        self.cycle_target = 0
+
+    def _cancel(self, handle):
+        if handle is not None:
+            self.scheduler.cancel(handle)
@@ -0,0 +1,196 @@
+#!/usr/bin/env python3
+"""
+Async Controller
+Runs a GameJoystickController on an asyncio event loop instead of its listener thread
+
+The serial port is read from a loop reader callback (add_reader on the
+port's file descriptor) and the controller's timers, direction timeouts
+and liveness deadline are driven by a single loop timer that is re-armed
+after every batch, so the controller needs no thread of its own and can
+sit next to other async services:
+
+    async with AsyncJoystickController(GameJoystickController()) as joystick:
+        await joystick.wait_closed()
+
+Event handling is the same code the threaded listener runs; only the
+waiting is done by the loop. Ports without a selectable descriptor
+(pyserial on Windows, or a Proactor loop) wait for data in the loop's
+default executor instead.
+"""
+
+import asyncio
+
+import controller_logging
+from serial_reader import SerialLineReader
+
+log = controller_logging.get_logger()
+
+
+class AsyncJoystickController:
+    """asyncio front end of a GameJoystickController"""
+
+    # Longest the loop timer sleeps, so profile swaps scheduled from other threads are picked up
+    IDLE_WAIT = SerialLineReader.IDLE_WAIT
+
+    def __init__(self, controller):
+        self.controller = controller
+        self.loop = None
+        self.reader = None
+        self._fd = None
+        self._timer = None
+        self._tasks = set()
+        self._closed = None
+
+    async def start(self, port=None):
+        """Connect (unless port or the controller already has one) and start handling events"""
+        controller = self.controller
+        self.loop = asyncio.get_running_loop()
+        self._closed = asyncio.Event()
+        if port is not None:
+            controller.attach_serial_port(port)
+        elif controller.serial_port is None:
+            # Port discovery probes in threads and blocks until a board answers
+            if not await self.loop.run_in_executor(None, controller.connect_serial):
+                raise ConnectionError("No JoystickShield answered on any serial port")
+
+        controller.focus_tracker.start()
+        if controller.profile_manager is not None:
+            controller.profile_manager.start()
+        if controller.mouse_output is not None:
+            controller.mouse_output.start()
+        controller.is_running = True
+        controller.stopped.clear()
+        self._attach()
+
+    def _attach(self):
+        """Start reading the controller's current serial port"""
+        controller = self.controller
+        self.reader = SerialLineReader(controller.serial_port)
+        controller.mark_link_alive()
+        controller.restore_device_settings()
+        self._fd = None
+        if self.reader.fd is not None:
+            try:
+                self.loop.add_reader(self.reader.fd, self._on_readable)
+                self._fd = self.reader.fd
+            except NotImplementedError:
+                pass
+        if self._fd is None:
+            self._spawn(self._read_in_executor())
+        self._run_timers()
+
+    def _detach(self):
+        if self._fd is not None:
+            self.loop.remove_reader(self._fd)
+            self._fd = None
+        self.reader = None
+
+    def _on_readable(self):
+        try:
+            items = self.reader.read_ready()
+        except Exception as e:
+            log.error("❌ Serial port read error: %s", e)
+            self._link_lost()
+            return
+        self.controller.mark_link_alive()
+        self.controller.process_serial_items(items)
+        self._run_timers()
+
+    async def _read_in_executor(self):
+        """Reader for ports the loop cannot watch: wait for data in the executor"""
+        reader = self.reader
+        controller = self.controller
+        while controller.is_running and self.reader is reader:
+            try:
+                ready = await self.loop.run_in_executor(None, reader.wait, self.IDLE_WAIT)
+            except Exception as e:
+                log.error("❌ Serial port read error: %s", e)
+                self._link_lost()
+                return
+            if ready and self.reader is reader:
+                self._on_readable()
+
+    def _run_timers(self):
+        """Run everything that is due, then sleep until the next deadline"""
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        controller = self.controller
+        if not controller.is_running or self.reader is None:
+            return
+        controller.run_timers()
+        if controller.link_timed_out():
+            self._link_lost()
+            return
+
+        deadline = controller.next_wakeup()
+        liveness = controller.liveness_deadline()
+        if liveness is not None and (deadline is None or liveness < deadline):
+            deadline = liveness
+        delay = self.IDLE_WAIT if deadline is None else min(self.IDLE_WAIT, deadline - controller.clock())
+        self._timer = self.loop.call_later(max(delay, 0.0), self._run_timers)
+
+    def _link_lost(self):
+        """Release everything, then reconnect or close"""
+        self._detach()
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        controller = self.controller
+        if not controller.is_running:
+            return
+        controller.on_link_lost()
+        if controller.auto_reconnect:
+            self._spawn(self._reconnect())
+        else:
+            self._closed.set()
+
+    async def _reconnect(self):
+        controller = self.controller
+        # reconnect() backs off on controller.stopped, which stop() sets
+        if await self.loop.run_in_executor(None, controller.reconnect) and controller.is_running:
+            self._attach()
+        else:
+            self._closed.set()
+
+    def _spawn(self, coroutine):
+        task = self.loop.create_task(coroutine)
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def wait_closed(self):
+        """Wait until the link is lost for good or stop() is called"""
+        await self._closed.wait()
+
+    async def stop(self):
+        """Stop handling events and release every key"""
+        controller = self.controller
+        if self._closed is None:
+            return
+        controller.is_running = False
+        controller.stopped.set()
+        self._detach()
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        for task in list(self._tasks):
+            task.cancel()
+        if self._tasks:
+            await asyncio.gather(*self._tasks, return_exceptions=True)
+        controller.stop()
+        self._closed.set()
+
+    async def run(self, port=None):
+        """start(), wait until closed, stop()"""
+        await self.start(port)
+        try:
+            await self.wait_closed()
+        finally:
+            await self.stop()
+
+    async def __aenter__(self):
+        await self.start()
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.stop()
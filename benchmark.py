@@ -0,0 +1,1362 @@
+#!/usr/bin/env python3
+"""
+JoystickController Benchmarks
+Measures the controller's hot path against simulated devices
+
+Usage: python benchmark.py <benchmark> [options]
+"""
+
+import argparse
+import contextlib
+import io
+import logging
+import os
+import random
+import sys
+import threading
+import time
+from collections import defaultdict
+
+import serial
+
+import controller_logging
+from joystick_controller_final import GameJoystickController
+from joystick_simulator import (
+    FIRMWARE_BANNER, RecordedSerialPort, VirtualJoystickShield, synthetic_session_chunks,
+    synthetic_session_ticks,
+)
+from key_scheduler import ManualClock
+import message_dispatch
+from output_backends import RecordingBackend
+from serial_reader import SerialLineReader
+
+
+def percentile(samples, fraction):
+    """Nearest-rank percentile of a list of samples"""
+    ordered = sorted(samples)
+    index = min(len(ordered) - 1, int(round(fraction * (len(ordered) - 1))))
+    return ordered[index]
+
+
+def print_latency_summary(name, samples_ms):
+    """Print p50/p99/max for a list of millisecond samples"""
+    print(f"  {name:<10} n={len(samples_ms):<5} "
+          f"p50={percentile(samples_ms, 0.50):7.3f} ms  "
+          f"p99={percentile(samples_ms, 0.99):7.3f} ms  "
+          f"max={max(samples_ms):7.3f} ms")
+
+
+class RecordingController(GameJoystickController):
+    """Controller whose key injections go to a recording backend"""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, output=RecordingBackend(keep=False), **kwargs)
+        self.output.on_send = self.on_injected
+        self.liveness_timeout = None  # Benchmark devices send no heartbeats
+        self.injected = threading.Event()
+        self.injected_at = None
+        self.released = threading.Event()
+
+    def on_injected(self, transitions):
+        if any(down for _, down in transitions):
+            self.injected_at = time.perf_counter()
+            self.injected.set()
+        else:
+            self.released.set()
+
+
+def measure_reader_latency(reader_mode, events):
+    """Byte arrival to key injection latency for one reader mode"""
+    samples = []
+
+    with VirtualJoystickShield() as device:
+        controller = RecordingController(reader_mode=reader_mode)
+        controller.serial_port = serial.Serial(device.port_name, 115200, timeout=1)
+        controller.is_running = True
+
+        with contextlib.redirect_stdout(io.StringIO()):
+            listener = threading.Thread(target=controller.serial_listener, daemon=True)
+            listener.start()
+
+            # Alternate directions so every line injects a fresh key press
+            directions = ["Joystick Up", "Joystick Down"]
+            for i in range(events):
+                controller.injected.clear()
+                sent_at = device.send_line(directions[i % 2])
+                if controller.injected.wait(1.0):
+                    samples.append((controller.injected_at - sent_at) * 1000)
+                # Random gap so arrivals do not line up with the polling period
+                time.sleep(random.uniform(0.002, 0.02))
+
+            controller.is_running = False
+            listener.join(timeout=2)
+            controller.serial_port.close()
+
+    return samples
+
+
+def bench_latency(args):
+    """Compare the polling and event-driven serial readers"""
+    print(f"⏱️  Byte arrival -> key injection latency ({args.events} events per mode)")
+    for mode in ("polling", "event"):
+        samples = measure_reader_latency(mode, args.events)
+        print_latency_summary(mode, samples)
+
+
+def frame_with_readline(chunks, tokens):
+    """Per-line readline/decode/strip, as the polling listener does"""
+    port = RecordedSerialPort(chunks)
+    lines = matched = 0
+    while port.in_waiting:
+        data = port.readline().decode('utf-8', errors='ignore').strip()
+        lines += 1
+        if data in tokens:
+            matched += 1
+    return lines, matched
+
+
+def frame_with_buffer(chunks, tokens):
+    """Bulk read and split into byte lines, as SerialLineReader does"""
+    reader = SerialLineReader(RecordedSerialPort(chunks))
+    lines = matched = 0
+    while reader.serial_port.in_waiting:
+        for line in reader.read_lines():
+            lines += 1
+            if line in tokens:
+                matched += 1
+    return lines, matched
+
+
+def bench_framing(args):
+    """Line framing throughput over a recorded byte stream"""
+    chunks = synthetic_session_chunks(args.events)
+    controller = GameJoystickController()
+    byte_tokens = set(controller.dispatch_table.actions)
+    text_tokens = {token.decode('utf-8') for token in byte_tokens}
+
+    total_bytes = sum(len(chunk) for chunk in chunks)
+    print(f"📼 Line framing throughput ({len(chunks)} ticks, {total_bytes} bytes)")
+    for name, frame, tokens in (("readline", frame_with_readline, text_tokens),
+                                ("buffered", frame_with_buffer, byte_tokens)):
+        start = time.perf_counter()
+        lines, matched = frame(chunks, tokens)
+        elapsed = time.perf_counter() - start
+        print(f"  {name:<10} {lines / elapsed:12,.0f} lines/sec  ({lines} lines, {matched} matched)")
+
+
+def legacy_classify(data, key_mapping):
+    """The substring chain process_joystick_data used to run per line"""
+    data = data.strip()
+    if " > " in data:
+        _, actual_data = data.split(" > ", 1)
+        data = actual_data.strip()
+
+    ignore_patterns = ["Calibrating", "JoystickShield", "Starting", "=", "complete", "Complete"]
+    if any(pattern in data for pattern in ignore_patterns):
+        return "ignore"
+    if "Joystick NotCenter" in data:
+        return "not_center"
+    if "Joystick Center" in data:
+        return "center"
+    if data in key_mapping:
+        keys = key_mapping[data]
+        if keys:
+            if "Joystick " in data and data != "Joystick Button Clicked":
+                return "direction"
+            elif "Clicked" in data:
+                data.replace(" Clicked", "").strip()
+                return "click"
+            return "hold"
+    return "unknown"
+
+
+def bench_dispatch(args):
+    """Per-message classification cost, substring chain vs dispatch table"""
+    reader = SerialLineReader(RecordedSerialPort(synthetic_session_chunks(args.events)))
+    lines = []
+    while reader.serial_port.in_waiting:
+        lines.extend(reader.read_lines())
+    texts = [line.decode('utf-8') for line in lines]
+
+    controller = GameJoystickController()
+    key_mapping = controller.key_mapping
+    table = controller.dispatch_table
+
+    print(f"🧭 Per-message dispatch cost ({len(lines)} messages)")
+
+    start = time.perf_counter()
+    for data in texts:
+        legacy_classify(data, key_mapping)
+    legacy_ns = (time.perf_counter() - start) / len(lines) * 1e9
+
+    start = time.perf_counter()
+    for line in lines:
+        table.lookup(line)
+    table_ns = (time.perf_counter() - start) / len(lines) * 1e9
+
+    print(f"  {'substring':<10} {legacy_ns:8.1f} ns/message")
+    print(f"  {'table':<10} {table_ns:8.1f} ns/message")
+
+
+def decode_stream(chunks, controller):
+    """Decode a recorded stream into actions, returns the action count"""
+    table = controller.dispatch_table
+    frame_actions = controller.frame_actions
+    reader = SerialLineReader(RecordedSerialPort(chunks))
+    actions = 0
+    while reader.serial_port.in_waiting:
+        for item in reader.read_lines():
+            if type(item) is bytes:
+                table.lookup(item)
+                actions += 1
+            else:
+                for index in item.event_indexes():
+                    frame_actions[index]
+                    actions += 1
+                # Position is always part of the frame
+                actions += 1
+    return actions
+
+
+def bench_protocol(args):
+    """Bytes per event and decode throughput, text vs binary protocol"""
+    controller = GameJoystickController()
+    ticks = list(synthetic_session_ticks(args.events))
+    events = sum(len(lines) + (1 if x or y else 0) for lines, _, x, y in ticks)
+
+    print(f"📦 Wire protocol comparison ({len(ticks)} ticks, {events} text events)")
+    for binary in (False, True):
+        name = "binary" if binary else "text"
+        chunks = synthetic_session_chunks(args.events, binary=binary)
+        total_bytes = sum(len(chunk) for chunk in chunks)
+        # 10 bits per byte on the wire (start + 8 data + stop)
+        wire_ms = total_bytes * 10 / 115200 / len(chunks) * 1000
+
+        start = time.perf_counter()
+        decode_stream(chunks, controller)
+        elapsed = time.perf_counter() - start
+
+        print(f"  {name:<8} {total_bytes / events:6.2f} bytes/event  "
+              f"{wire_ms:6.3f} ms/tick on wire @115200  "
+              f"{events / elapsed:12,.0f} events/sec decoded")
+
+
+def legacy_check_direction_timeout(controller, last_direction_time):
+    """The per-key time.time() scan check_direction_timeout used to run"""
+    current_time = time.time()
+    keys_to_release = []
+    for key in controller.DIRECTION_KEYS:
+        if key in last_direction_time:
+            if current_time - last_direction_time[key] > controller.direction_timeout:
+                keys_to_release.append(key)
+        elif controller.key_state.is_pressed(key):
+            keys_to_release.append(key)
+    return keys_to_release
+
+
+def measure_release_error(events):
+    """Real-time error between the due time and the actual timeout release"""
+    samples = []
+
+    with VirtualJoystickShield() as device:
+        controller = RecordingController()
+        controller.serial_port = serial.Serial(device.port_name, 115200, timeout=1)
+        controller.is_running = True
+
+        with contextlib.redirect_stdout(io.StringIO()):
+            listener = threading.Thread(target=controller.serial_listener, daemon=True)
+            listener.start()
+
+            for _ in range(events):
+                controller.injected.clear()
+                controller.released.clear()
+                device.send_line("Joystick Up")
+                if controller.injected.wait(1.0):
+                    pressed_at = time.perf_counter()
+                    if controller.released.wait(1.0):
+                        released_at = time.perf_counter()
+                        samples.append((released_at - pressed_at - controller.direction_timeout) * 1000)
+
+            controller.is_running = False
+            listener.join(timeout=2)
+            controller.serial_port.close()
+
+    return samples
+
+
+def bench_timeout(args):
+    """Direction timeout release accuracy and per-check CPU cost"""
+    print("⏰ Direction timeout release")
+
+    # Virtual clock: the loop sleeps until the deadline and releases exactly on it
+    clock = ManualClock()
+    controller = RecordingController(clock=clock)
+    with contextlib.redirect_stdout(io.StringIO()):
+        controller.process_joystick_line(b"Joystick RightUp")
+        clock.advance(0.1)
+        controller.process_joystick_line(b"Joystick RightUp")
+        while controller.next_direction_deadline() is not None:
+            clock.set(controller.next_direction_deadline())
+            controller.check_direction_timeout()
+    print(f"  virtual clock: refreshed at 0.100 s, released at {clock():.3f} s "
+          f"(expected {0.1 + controller.direction_timeout:.3f} s)")
+
+    samples = measure_release_error(min(args.events, 100))
+    print_latency_summary("real error", samples)
+
+    print("🧮 Timeout check cost per call")
+    iterations = args.events * 100
+    for held in (0, 4):
+        controller = RecordingController()
+        last_direction_time = {}
+        now = time.time()
+        for key in controller.DIRECTION_KEYS[:held]:
+            controller.key_state.apply(0, controller.key_state.bit(key))
+            last_direction_time[key] = now + 1000
+            controller.direction_deadlines.arm(key, controller.clock() + 1000)
+
+        start = time.perf_counter()
+        for _ in range(iterations):
+            legacy_check_direction_timeout(controller, last_direction_time)
+        legacy_ns = (time.perf_counter() - start) / iterations * 1e9
+
+        start = time.perf_counter()
+        for _ in range(iterations):
+            controller.check_direction_timeout()
+        deadline_ns = (time.perf_counter() - start) / iterations * 1e9
+
+        print(f"  {held} keys held: scan {legacy_ns:7.1f} ns  deadline heap {deadline_ns:7.1f} ns")
+
+
+def bench_logging(args):
+    """Per-event cost of the controller at each log level"""
+    reader = SerialLineReader(RecordedSerialPort(synthetic_session_chunks(args.events)))
+    lines = []
+    while reader.serial_port.in_waiting:
+        lines.extend(reader.read_lines())
+
+    print(f"📝 Per-event overhead by log level ({len(lines)} messages)")
+    with open(os.devnull, "w") as devnull:
+        for level in ("debug", "info", "game"):
+            controller_logging.setup_logging(level, stream=devnull)
+            controller = RecordingController()
+
+            start = time.perf_counter()
+            for line in lines:
+                controller.process_joystick_line(line)
+            elapsed = time.perf_counter() - start
+
+            controller_logging.shutdown_logging()
+            print(f"  {level:<10} {elapsed / len(lines) * 1e9:8.1f} ns/event")
+
+
+def bench_metrics(args):
+    """Per-event cost with latency instrumentation off and on"""
+    reader = SerialLineReader(RecordedSerialPort(synthetic_session_chunks(args.events)))
+    lines = []
+    while reader.serial_port.in_waiting:
+        lines.extend(reader.read_lines())
+
+    print(f"📊 Instrumentation overhead ({len(lines)} messages)")
+    controller_logging.get_logger().setLevel(controller_logging.GAME)
+    for enabled in (False, True):
+        controller = RecordingController()
+        if enabled:
+            controller.enable_metrics()
+
+        start = time.perf_counter()
+        for line in lines:
+            if controller.metrics is not None:
+                controller.metrics.mark_read()
+            controller.process_joystick_line(line)
+            if controller.metrics is not None:
+                controller.metrics.end_batch()
+        elapsed = time.perf_counter() - start
+
+        print(f"  {'enabled' if enabled else 'disabled':<10} {elapsed / len(lines) * 1e9:8.1f} ns/event")
+    for line in controller.metrics.summary_lines():
+        print(f"    {line}")
+
+
+def bench_output(args):
+    """Injection calls per key transition with batched output"""
+    reader = SerialLineReader(RecordedSerialPort(synthetic_session_chunks(args.events)))
+    lines = []
+    while reader.serial_port.in_waiting:
+        lines.extend(reader.read_lines())
+
+    print(f"⌨️  Batched key injection ({len(lines)} messages)")
+    controller_logging.get_logger().setLevel(controller_logging.GAME)
+    controller = RecordingController()
+    controller.output.keep = True
+
+    start = time.perf_counter()
+    for line in lines:
+        controller.process_joystick_line(line)
+    controller.release_pending_taps()
+    controller.release_all_keys()
+    elapsed = time.perf_counter() - start
+
+    transitions = len(controller.output.events)
+    batches = controller.output.batches
+    print(f"  transitions {transitions:8d}  (one keybd_event call each before)")
+    print(f"  batches     {batches:8d}  ({transitions / batches:.2f} transitions per call)")
+    print(f"  per event   {elapsed / len(lines) * 1e9:8.1f} ns")
+
+
+def legacy_direction_transitions(key_states, direction_keys, keys):
+    """The dict/set diff handle_joystick_direction_press used to run"""
+    currently_pressed = [key for key in direction_keys if key_states.get(key, False)]
+    transitions = []
+    if set(keys) != set(currently_pressed):
+        for key in currently_pressed:
+            if key not in keys:
+                transitions.append((key, False))
+                key_states[key] = False
+        for key in keys:
+            if key not in currently_pressed:
+                transitions.append((key, True))
+                key_states[key] = True
+    return transitions
+
+
+def bench_keystate(args):
+    """Direction change diffing: dict/set key states vs bitmask"""
+    controller = RecordingController()
+    actions = [controller.dispatch_table.lookup(line.encode())
+               for lines, _, _, _ in synthetic_session_ticks(args.events) for line in lines]
+    actions = [action for action in actions if action.kind == message_dispatch.DIRECTION]
+    targets = [list(action.keys) for action in actions]
+
+    print(f"🧮 Direction diff per event ({len(actions)} direction events)")
+
+    key_states = defaultdict(bool)
+    direction_keys = controller.DIRECTION_KEYS
+    start = time.perf_counter()
+    legacy_changes = 0
+    for keys in targets:
+        legacy_changes += len(legacy_direction_transitions(key_states, direction_keys, keys))
+    legacy_ns = (time.perf_counter() - start) / len(targets) * 1e9
+
+    state = controller.key_state
+    scope = controller.direction_mask
+    start = time.perf_counter()
+    mask_changes = 0
+    for action in actions:
+        release, press = state.diff(action.mask, scope)
+        if release or press:
+            mask_changes += len(state.transitions(release, press))
+            state.apply(release, press)
+    mask_ns = (time.perf_counter() - start) / len(actions) * 1e9
+
+    print(f"  dict/set  {legacy_ns:7.1f} ns  ({legacy_changes} transitions)")
+    print(f"  bitmask   {mask_ns:7.1f} ns  ({mask_changes} transitions)")
+
+
+class FakePortInfo:
+    """Port listing entry for a simulated device"""
+
+    def __init__(self, device, description, vid=None, pid=None):
+        self.device = device
+        self.description = description
+        self.vid = vid
+        self.pid = pid
+
+
+def bench_discovery(args):
+    """Port discovery time against silent, wrong-banner and real fake devices"""
+    import tempfile
+
+    from port_discovery import PortDiscovery
+
+    print("🔍 Port discovery (silent, wrong banner and JoystickShield pty devices)")
+    with contextlib.ExitStack() as stack:
+        silent = stack.enter_context(VirtualJoystickShield())
+        wrong = stack.enter_context(VirtualJoystickShield(identify_reply="GPS Receiver v2.1"))
+        shield = stack.enter_context(VirtualJoystickShield(identify_reply=FIRMWARE_BANNER))
+        listing = [
+            FakePortInfo(silent.port_name, "USB-SERIAL CH340", 0x1A86, 0x7523),
+            FakePortInfo(wrong.port_name, "Arduino Uno", 0x2341, 0x0043),
+            FakePortInfo(shield.port_name, "USB Serial Device", 0x2341, 0x0001),
+        ]
+        cache_path = os.path.join(stack.enter_context(tempfile.TemporaryDirectory()), "port.json")
+        discovery = PortDiscovery(cache_path=cache_path, list_ports=lambda: listing, probe_timeout=1.0)
+
+        for attempt in range(args.events):
+            label = "cold" if attempt == 0 else "cached"
+            start = time.perf_counter()
+            port, entry = discovery.find()
+            elapsed = (time.perf_counter() - start) * 1000
+            if port is None:
+                print(f"  {label:<8} ❌ nothing found after {elapsed:.0f} ms")
+                continue
+            port.close()
+            correct = "✅" if entry.device == shield.port_name else "❌ wrong device"
+            print(f"  {label:<8} {correct} {entry.device} in {elapsed:6.1f} ms")
+
+
+def stream_direction(device, seconds, interval=0.02):
+    """Hold the stick up on device for a while, stops quietly if it disappears"""
+    end = time.perf_counter() + seconds
+    while time.perf_counter() < end:
+        try:
+            device.send_line("Joystick Up")
+        except OSError:
+            return
+        time.sleep(interval)
+
+
+def wait_for_counter(metrics, name, value, timeout):
+    """Wait until a metrics counter reaches value, returns True if it did"""
+    deadline = time.perf_counter() + timeout
+    while metrics.counters.get(name, 0) < value:
+        if time.perf_counter() > deadline:
+            return False
+        time.sleep(0.001)
+    return True
+
+
+def bench_reconnect(args):
+    """Key release and reconnect time when the device disappears or goes silent"""
+    import tempfile
+
+    from port_discovery import PortDiscovery
+
+    print("🔌 Link loss and reconnect (pty device with heartbeats)")
+    # The link errors are expected here
+    controller_logging.get_logger().setLevel(logging.CRITICAL)
+    results = []
+
+    with contextlib.ExitStack() as stack:
+        def plug_in():
+            return stack.enter_context(
+                VirtualJoystickShield(identify_reply=FIRMWARE_BANNER, heartbeat_interval=0.2))
+
+        devices = [plug_in()]
+        listing = lambda: [FakePortInfo(devices[-1].port_name, "Arduino Uno", 0x2341, 0x0043)]
+        cache_path = os.path.join(stack.enter_context(tempfile.TemporaryDirectory()), "port.json")
+
+        controller = RecordingController()
+        controller.enable_metrics()
+        metrics = controller.metrics
+        controller.liveness_timeout = 0.6
+        controller.port_discovery = PortDiscovery(cache_path=cache_path, list_ports=listing, probe_timeout=0.5)
+        controller.serial_port = controller.port_discovery.find()[0]
+        controller.is_running = True
+
+        with contextlib.redirect_stdout(io.StringIO()):
+            listener = threading.Thread(target=controller.serial_listener, daemon=True)
+            listener.start()
+
+            for _ in range(args.events):
+                # Unplugged: the port disappears mid-stream, the board comes back on another port
+                faults = metrics.counters.get("link_faults", 0)
+                stream_direction(devices[-1], 0.3)
+                controller.released.clear()
+                devices[-1].close()
+                lost_at = time.perf_counter()
+                released = controller.released.wait(2.0)
+                released_ms = (time.perf_counter() - lost_at) * 1000
+                detected = wait_for_counter(metrics, "link_faults", faults + 1, 2.0)
+
+                time.sleep(0.3)
+                devices.append(plug_in())
+                back_at = time.perf_counter()
+                controller.injected.clear()
+                while not controller.injected.is_set() and time.perf_counter() - back_at < 5.0:
+                    stream_direction(devices[-1], 0.05)
+                resumed_ms = (time.perf_counter() - back_at) * 1000
+                results.append(f"  unplugged  keys released {released_ms:6.1f} ms "
+                               f"{'✅' if released and detected else '❌'}  "
+                               f"pressing again {resumed_ms:6.1f} ms after replug")
+
+                # Hung: the port stays open but nothing arrives, not even heartbeats
+                # Liveness is armed by the first heartbeat on the new connection
+                deadline = time.perf_counter() + 2.0
+                while not controller.heartbeat_seen and time.perf_counter() < deadline:
+                    time.sleep(0.01)
+                faults = metrics.counters.get("link_faults", 0)
+                reconnects = metrics.counters.get("reconnects", 0)
+                controller.press_keys_continuous("shift")
+                devices[-1].pause_heartbeat()
+                hung_at = time.perf_counter()
+                detected = wait_for_counter(metrics, "link_faults", faults + 1, 3.0)
+                detected_ms = (time.perf_counter() - hung_at) * 1000
+                released = not controller.key_state.is_pressed("shift")
+                devices[-1].pause_heartbeat(False)
+                recovered = wait_for_counter(metrics, "reconnects", reconnects + 1, 3.0)
+                results.append(f"  hung       fault after   {detected_ms:6.1f} ms "
+                               f"{'✅' if detected and released and recovered else '❌'}  "
+                               f"(liveness timeout {controller.liveness_timeout * 1000:.0f} ms)")
+
+            controller.is_running = False
+            controller.stopped.set()
+            listener.join(timeout=2)
+            controller.serial_port.close()
+
+    for line in results:
+        print(line)
+    print(f"  counters: {metrics.counters}")
+    for line in metrics.summary_lines():
+        if line.startswith("reconnect"):
+            print(f"  {line}")
+
+
+def held_after(events):
+    """Keys a recorded (time, key, down) event list leaves held"""
+    held = set()
+    for _, key, down in events:
+        if down:
+            held.add(key)
+        else:
+            held.discard(key)
+    return held
+
+
+def bench_profiles(args):
+    """Profile load/compile time and hot swaps while the stick streams"""
+    import json
+    import shutil
+    import tempfile
+
+    from game_profiles import PROFILE_DIR, load_profile
+
+    controller = RecordingController()
+    print(f"📁 Profile load and compile ({args.events} runs per file)")
+    for path in sorted(os.listdir(PROFILE_DIR)):
+        path = os.path.join(PROFILE_DIR, path)
+        load_ms = []
+        compile_ms = []
+        for _ in range(args.events):
+            start = time.perf_counter()
+            profile = load_profile(path, controller.vk_codes)
+            load_ms.append((time.perf_counter() - start) * 1000)
+            profile.compile(controller.key_state, controller.DIRECTION_KEYS)
+            compile_ms.append(profile.compile_ns / 1e6)
+        print(f"  {profile.name:<10} load p50 {percentile(load_ms, 0.5):.3f} ms  "
+              f"compile p50 {percentile(compile_ms, 0.5):.3f} ms")
+
+    print("🔁 Hot reload while streaming directions (pty device)")
+    controller_logging.get_logger().setLevel(logging.CRITICAL)
+    controller.output.keep = True
+    swaps = []
+    leaks = []
+    apply_profile = controller.apply_profile
+
+    def timed_apply(profile):
+        start = time.perf_counter_ns()
+        apply_profile(profile)
+        swaps.append((time.perf_counter_ns() - start) / 1e6)
+        # Nothing the new profile does not map may still be held
+        if controller.key_state.mask & ~profile.tables.mapped_mask:
+            leaks.append(profile.name)
+
+    controller.apply_profile = timed_apply
+    rng = random.Random(0)
+    lines = ["Joystick Up", "Joystick Down", "Joystick Left", "Joystick Right",
+             "Joystick LeftUp", "Joystick RightUp", "Joystick LeftDown", "Joystick RightDown"]
+
+    with tempfile.TemporaryDirectory() as directory, VirtualJoystickShield() as device:
+        path = os.path.join(directory, "default.json")
+        shutil.copy(os.path.join(PROFILE_DIR, "default.json"), path)
+        with open(os.path.join(PROFILE_DIR, "arrows.json"), "r", encoding="utf-8") as f:
+            variants = [None, json.load(f)]
+        with open(path, "r", encoding="utf-8") as f:
+            variants[0] = json.load(f)
+        for variant in variants:
+            variant["default"] = True
+
+        with contextlib.redirect_stdout(io.StringIO()):
+            controller.load_profiles(directory)
+        controller.profile_manager.interval = 0.01
+        controller.serial_port = serial.Serial(device.port_name, 115200, timeout=1)
+        controller.is_running = True
+        listener = threading.Thread(target=controller.serial_listener, daemon=True)
+        listener.start()
+        controller.profile_manager.start()
+
+        sent = 0
+        for swap in range(args.events):
+            # Rewrite the file atomically, the way an editor saves it
+            with open(path + ".tmp", "w", encoding="utf-8") as f:
+                json.dump(variants[(swap + 1) % 2], f)
+            os.replace(path + ".tmp", path)
+            end = time.perf_counter() + 0.05
+            while time.perf_counter() < end:
+                device.send_line(rng.choice(lines))
+                sent += 1
+                time.sleep(0.002)
+
+        # Stick released: the direction timeout has to let go of everything
+        time.sleep(controller.direction_timeout + 0.2)
+        controller.profile_manager.stop()
+        controller.is_running = False
+        listener.join(timeout=2)
+        controller.serial_port.close()
+
+    stuck = held_after(controller.output.events)
+    print(f"  {sent} direction lines, {len(swaps)} swaps on the listener thread")
+    print(f"  swap p50 {percentile(swaps, 0.5):.3f} ms  max {max(swaps):.3f} ms")
+    print(f"  keys left held after a swap: {leaks or 'none'}  "
+          f"stuck at the end: {sorted(stuck) or 'none'} {'✅' if not leaks and not stuck else '❌'}")
+
+
+def bench_analog(args):
+    """Analog mode: duty cycle accuracy and PWM tick jitter against a pty device"""
+    import analog_movement
+
+    start = time.perf_counter()
+    table = analog_movement.build_duty_table()
+    build_ms = (time.perf_counter() - start) * 1000
+    positions = [(random.randint(-100, 100), random.randint(-100, 100)) for _ in range(100000)]
+    start = time.perf_counter()
+    for x, y in positions:
+        table[analog_movement.position_index(x, y)]
+    lookup_ns = (time.perf_counter() - start) / len(positions) * 1e9
+    print(f"🕹️ Duty table: {len(table)} entries built in {build_ms:.1f} ms, lookup {lookup_ns:.0f} ns")
+
+    seconds = args.events / 1000
+    print(f"📈 PWM against a pty device ({seconds:.1f} s per push, firmware 100 ms position interval)")
+    controller_logging.get_logger().setLevel(logging.CRITICAL)
+    for y in (30, 40, 60, 100):
+        controller = RecordingController()
+        controller.output.keep = True
+        controller.enable_analog_movement()
+        movement = controller.analog_movement
+        expected = abs(movement.table[analog_movement.position_index(0, y)][1])
+
+        with VirtualJoystickShield() as device, contextlib.redirect_stdout(io.StringIO()):
+            controller.serial_port = serial.Serial(device.port_name, 115200, timeout=1)
+            controller.is_running = True
+            listener = threading.Thread(target=controller.serial_listener, daemon=True)
+            listener.start()
+            end = time.perf_counter() + seconds
+            while time.perf_counter() < end:
+                device.send_line(f"Joystick Position -> X: 0, Y: {y}")
+                time.sleep(0.1)
+            device.send_line("Joystick Center")
+            time.sleep(0.1)
+            controller.is_running = False
+            listener.join(timeout=2)
+            controller.serial_port.close()
+
+        # Time w was held, and how far each press was from the tick grid
+        events = [(at, down) for at, key, down in controller.output.events if key == "w"]
+        held = 0.0
+        presses = []
+        pressed_at = None
+        for at, down in events:
+            if down:
+                pressed_at = at
+                presses.append(at)
+            elif pressed_at is not None:
+                held += at - pressed_at
+                pressed_at = None
+        span = events[-1][0] - events[0][0] if len(events) > 1 else 0.0
+        jitter_ms = [abs((b - a) - movement.period) * 1000 for a, b in zip(presses, presses[1:])]
+        print(f"  Y={y:3d}  duty {expected * 100:5.1f}%  held {held / span * 100 if span else 0:5.1f}%  "
+              f"presses {len(presses):3d}  tick jitter p50 {percentile(jitter_ms, 0.5) if jitter_ms else 0:.2f} ms  "
+              f"max {max(jitter_ms) if jitter_ms else 0:.2f} ms  "
+              f"{'✅' if not controller.key_state.mask else '❌ stuck'}")
+
+
+def bench_mouse(args):
+    """Stick-to-mouse tick accuracy, sub-pixel carry and per-tick allocations"""
+    import gc
+
+    import mouse_output
+
+    print("🖱️ Per-tick cost and allocations (manual ticks)")
+    backend = RecordingBackend(keep=False)
+    mouse = mouse_output.StickMouse(backend, rate=1000)
+    mouse.update(37, -12)
+    now = time.perf_counter()
+    gc.collect()
+    gc.disable()
+    generation0 = gc.get_count()[0]
+    blocks = sys.getallocatedblocks()
+    start = time.perf_counter()
+    for _ in range(args.events):
+        mouse.tick(now)
+    tick_ns = (time.perf_counter() - start) / args.events * 1e9
+    grown = sys.getallocatedblocks() - blocks
+    containers = gc.get_count()[0] - generation0
+    gc.enable()
+    # A few objects come from the measurement itself, per-tick allocations would scale with the tick count
+    print(f"  {tick_ns:.0f} ns per tick, {containers} container allocations and "
+          f"{grown} blocks grown over {args.events} ticks {'✅' if containers < 5 and grown < 50 else '❌'}")
+
+    print("🐢 Slow push, sub-pixel carry (0.5 s at 1000 Hz)")
+    for y in (20, 25, 30):
+        backend = RecordingBackend(keep=False)
+        mouse = mouse_output.StickMouse(backend, rate=1000, smoothing=0)
+        mouse.update(0, y)
+        ticks = 500
+        for _ in range(ticks):
+            mouse.tick(mouse.updated_at)
+        expected = mouse.table[mouse_output.analog_movement.position_index(0, y)][1] * ticks
+        print(f"  Y={y}  expected {expected:6.2f} px, moved {-backend.mouse_y} px "
+              f"in {mouse.moves} moves {'✅' if abs(expected + backend.mouse_y) < 1 else '❌'}")
+
+    print("⏱️ Tick accuracy on the mouse thread (fake backend, 1 s each)")
+    for rate in (250, 500, 1000):
+        backend = RecordingBackend()
+        mouse = mouse_output.StickMouse(backend, rate=rate, smoothing=0, stale_after=10)
+        mouse.update(100, 0)
+        mouse.start()
+        time.sleep(1.0)
+        mouse.stop()
+        times = [at for at, _, _ in backend.mouse_moves]
+        intervals_ms = [(b - a) * 1000 for a, b in zip(times, times[1:])]
+        jitter_ms = [abs(interval - mouse.period * 1000) for interval in intervals_ms]
+        print(f"  {rate:4d} Hz  {mouse.ticks} ticks, {len(times)} moves, "
+              f"jitter p50 {percentile(jitter_ms, 0.5):.3f} ms  p99 {percentile(jitter_ms, 0.99):.3f} ms  "
+              f"max lateness {mouse.max_lateness * 1000:.3f} ms  late ticks {mouse.late_ticks}")
+
+
+def bench_combos(args):
+    """Per-event combo matching cost as the number of combos grows"""
+    import combo_engine
+    from key_state import KeyState
+
+    rng = random.Random(0)
+    buttons = ["Joystick", "Up", "Right", "Down", "Left", "E", "F"]
+    steps = buttons + combo_engine.DIRECTION_NAMES
+    events = [(rng.randrange(len(combo_engine.TOKENS)), index * 0.05) for index in range(args.events)]
+    key_state = KeyState(["q"])
+
+    print(f"🥋 Combo matching per event ({args.events} random button and direction events)")
+    for count in (1, 10, 100, 500, 1000):
+        data = {"combos": [{"sequence": [rng.choice(steps) for _ in range(rng.randint(2, 6))], "keys": "q"}
+                           for _ in range(count)],
+                "chords": [{"buttons": rng.sample(buttons, 2), "keys": "q"} for _ in range(min(count, 21))]}
+        start = time.perf_counter()
+        tables = combo_engine.compile_combos(data, key_state, {"q"})
+        compile_ms = (time.perf_counter() - start) * 1000
+
+        fired = []
+        engine = combo_engine.ComboEngine(lambda macro, name: fired.append(name))
+        engine.load(tables)
+        feed = engine.feed
+        start = time.perf_counter()
+        for token, now in events:
+            feed(token, now)
+        event_ns = (time.perf_counter() - start) / len(events) * 1e9
+        print(f"  {count:5d} combos  {len(tables.delta):5d} states  compile {compile_ms:7.2f} ms  "
+              f"{event_ns:6.0f} ns/event  {len(fired)} fired")
+
+    print("⏱️ Macro timing on the scheduler (manual clock)")
+    clock = ManualClock()
+    controller = RecordingController(clock=clock)
+    controller.output.keep = True
+    controller.output.clock = clock
+    macro = combo_engine.compile_macro(["+shift", 0.05, "e", 0.1, "+w", 0.2, "-w", "-shift"],
+                                       controller.key_state, controller.vk_codes)
+    controller.macro_player.play(macro, "bench")
+    while True:
+        deadline = controller.next_wakeup()
+        if deadline is None:
+            break
+        clock.set(deadline)
+        controller.run_timers()
+    for at, key, down in controller.output.events:
+        print(f"  {at * 1000:6.1f} ms  {'press  ' if down else 'release'} {key}")
+
+
+def bench_turbo(args):
+    """Turbo shot jitter with several buttons held, and stop on release and unplug"""
+    seconds = args.events / 1000
+    rates = {"E Button": 15.0, "F Button": 20.0, "Up Button": 10.0}
+    print(f"🔫 Turbo on {', '.join(f'{name} {rate:g} Hz' for name, rate in rates.items())} "
+          f"({seconds:.1f} s held, pty device)")
+    controller_logging.get_logger().setLevel(logging.CRITICAL)
+    controller = RecordingController()
+    controller.output.keep = True
+    controller.turbo.set_rates(rates)
+    lateness_ms = defaultdict(list)
+    controller.turbo.on_shot = lambda button, due, now: lateness_ms[button].append((now - due) * 1000)
+
+    def hold(device, buttons, seconds):
+        # The firmware repeats a held button's click line every 100 ms loop
+        for button in buttons:
+            device.send_line(f"{button} Pressed")
+        end = time.perf_counter() + seconds
+        while time.perf_counter() < end:
+            device.send_line("\r\n".join(f"{button} Clicked" for button in buttons))
+            time.sleep(0.1)
+
+    with contextlib.ExitStack() as stack:
+        device = stack.enter_context(VirtualJoystickShield())
+        controller.serial_port = serial.Serial(device.port_name, 115200, timeout=1)
+        controller.is_running = True
+        with contextlib.redirect_stdout(io.StringIO()):
+            listener = threading.Thread(target=controller.serial_listener, daemon=True)
+            listener.start()
+
+            hold(device, rates, seconds)
+            for button in rates:
+                device.send_line(f"{button} Released")
+            released_at = time.perf_counter()
+            time.sleep(0.3)
+            late_presses = sum(1 for at, _, down in controller.output.events if down and at > released_at + 0.005)
+
+            # Unplugged while held: the listener's read fails and every turbo stops
+            controller.auto_reconnect = False
+            hold(device, ["E Button"], 0.5)
+            device.close()
+            unplugged_at = time.perf_counter()
+            time.sleep(0.3)
+            unplug_presses = sum(1 for at, _, down in controller.output.events if down and at > unplugged_at + 0.005)
+            controller.is_running = False
+            listener.join(timeout=2)
+            controller.serial_port.close()
+
+    keys = {"E Button": "e", "F Button": "v", "Up Button": "o"}
+    for button, rate in rates.items():
+        presses = [at for at, key, down in controller.output.events
+                   if key == keys[button] and down and at < released_at]
+        shots = lateness_ms[button]
+        period_ms = 1000 / rate
+        intervals = [abs((b - a) * 1000 - period_ms) for a, b in zip(presses, presses[1:])]
+        print(f"  {button:<9} {len(shots):3d} shots  lateness p50 {percentile(shots, 0.5):.3f} ms  "
+              f"p99 {percentile(shots, 0.99):.3f} ms  interval error p99 {percentile(intervals, 0.99):.3f} ms")
+    print(f"  presses after release: {late_presses}  after unplug: {unplug_presses}  "
+          f"{'✅' if not late_presses and not unplug_presses and not controller.turbo.active else '❌'}")
+
+
+def bench_adaptive(args):
+    """Fixed vs adaptive direction timeout on jittered streams, through the replay harness"""
+    from joystick_simulator import jittered_hold_records
+    from session_recorder import replay_session
+
+    scenarios = [
+        ("steady link", dict(jitter=0.003)),
+        ("jittery link", dict(jitter=0.02, stall_chance=0.05, stall=0.2)),
+    ]
+    print(f"⏰ Direction timeout, {args.events} holds per stream, no Center lines (the timeout ends each hold)")
+    controller_logging.get_logger().setLevel(logging.CRITICAL)
+    for label, options in scenarios:
+        records, holds = jittered_hold_records(args.events, seed=1, center=False, **options)
+        for mode in ("fixed 150 ms", "adaptive"):
+            clock = ManualClock()
+            controller = RecordingController(clock=clock)
+            controller.output.keep = True
+            controller.output.clock = clock
+            if mode == "adaptive":
+                controller.enable_adaptive_timeout()
+            else:
+                controller.set_direction_timeout(0.15)
+            replay_session(controller, records)
+
+            releases = [at for at, _, down in controller.output.events if not down]
+            lags_ms = []
+            for _, ended in holds:
+                after = [at for at in releases if ended < at < ended + 0.45]
+                if after:
+                    lags_ms.append((max(after) - ended) * 1000)
+            print(f"  {label:<12} {mode:<12} spurious re-presses {controller.spurious_represses:4d} "
+                  f"of {controller.timeout_releases:4d} timeout releases  "
+                  f"stop lag p50 {percentile(lags_ms, 0.5):5.0f} ms  max {max(lags_ms):5.0f} ms  "
+                  f"final timeout {controller.direction_timeout * 1000:4.0f} ms")
+
+
+def bench_multidevice(args):
+    """Per-device latency with 1..8 pty devices streaming at once on one listener thread"""
+    from game_profiles import GameProfile
+    from multi_device import MultiDeviceController
+
+    # A key pair per device, so every injection can be traced back to its device
+    key_pairs = [("w", "s"), ("a", "d"), ("up", "down"), ("left", "right"),
+                 ("o", "j"), ("i", "k"), ("e", "f"), ("v", "space")]
+    interval = 0.002
+    print(f"🎮🎮 Multi-device latency, {args.events} lines per device every {interval * 1000:.0f} ms, "
+          f"one listener thread")
+    controller_logging.get_logger().setLevel(logging.CRITICAL)
+
+    for count in (1, 2, 4, 8):
+        output = RecordingBackend(keep=True)
+        multi = MultiDeviceController(output)
+        sent = defaultdict(list)
+        with contextlib.ExitStack() as stack:
+            devices = [stack.enter_context(VirtualJoystickShield()) for _ in range(count)]
+            for index, device in enumerate(devices):
+                controller = multi.add_device(serial.Serial(device.port_name, 115200, timeout=1))
+                controller.liveness_timeout = None
+                up, down = key_pairs[index]
+                profile = GameProfile(f"player{index + 1}", {"Joystick Up": up, "Joystick Down": down})
+                controller.apply_profile(profile.compile(controller.key_state, controller.DIRECTION_KEYS))
+
+            def stream(index, device):
+                directions = ["Joystick Up", "Joystick Down"]
+                next_send = time.perf_counter()
+                for i in range(args.events):
+                    sent[index].append(device.send_line(directions[i % 2]))
+                    next_send += interval * random.uniform(0.5, 1.5)
+                    time.sleep(max(0.0, next_send - time.perf_counter()))
+
+            with contextlib.redirect_stdout(io.StringIO()):
+                multi.start(block=False)
+                streams = [threading.Thread(target=stream, args=(index, device))
+                           for index, device in enumerate(devices)]
+                for thread in streams:
+                    thread.start()
+                for thread in streams:
+                    thread.join()
+                time.sleep(0.05)
+                multi.stop()
+
+        owner = {key: index for index, pair in enumerate(key_pairs[:count]) for key in pair}
+        presses = defaultdict(list)
+        for at, key, down in output.events:
+            if down:
+                presses[owner[key]].append(at)
+        per_device = []
+        for index in range(count):
+            per_device.append([(injected - sent_at) * 1000
+                               for sent_at, injected in zip(sent[index], presses[index])])
+        merged = [sample for samples in per_device for sample in samples]
+        worst = max(percentile(samples, 0.99) for samples in per_device)
+        matched = sum(len(samples) for samples in per_device)
+        print(f"  {count} device(s)  n={matched:<5} p50={percentile(merged, 0.5):6.3f} ms  "
+              f"p99={percentile(merged, 0.99):6.3f} ms  worst device p99={worst:6.3f} ms  "
+              f"({count / interval:,.0f} lines/s in total)")
+
+
+def run_mode_script(device, controller, events):
+    """The script both runtimes get: direction flips, clicks, center, a timeout, then an unplug"""
+    samples = []
+    directions = ["Joystick Up", "Joystick Down"]
+    for i in range(events):
+        controller.injected.clear()
+        sent_at = device.send_line(directions[i % 2])
+        if controller.injected.wait(1.0):
+            samples.append((controller.injected_at - sent_at) * 1000)
+        time.sleep(random.uniform(0.002, 0.01))
+        if i % 10 == 9:
+            device.send_line("E Button Clicked")
+            time.sleep(0.01)
+    device.send_line("Joystick Center")
+    # Held without repeats: the direction timeout releases it
+    device.send_line("Joystick Right")
+    time.sleep(0.5)
+    device.send_line("Joystick Left")
+    time.sleep(0.02)
+    device.close()
+    return samples
+
+
+def bench_modes(args):
+    """The same simulator script on the threaded listener and on the asyncio core"""
+    import asyncio
+
+    from async_controller import AsyncJoystickController
+
+    print(f"🧵 Threaded listener vs asyncio core ({args.events} direction changes, pty device)")
+    controller_logging.get_logger().setLevel(logging.CRITICAL)
+    transitions = {}
+    for mode in ("threaded", "asyncio"):
+        controller = RecordingController()
+        controller.output.keep = True
+        controller.auto_reconnect = False
+        with VirtualJoystickShield() as device, contextlib.redirect_stdout(io.StringIO()):
+            port = serial.Serial(device.port_name, 115200, timeout=1)
+            if mode == "threaded":
+                controller.serial_port = port
+                controller.is_running = True
+                runner = threading.Thread(target=controller.serial_listener, daemon=True)
+            else:
+                runner = threading.Thread(target=asyncio.run,
+                                          args=(AsyncJoystickController(controller).run(port),), daemon=True)
+            runner.start()
+            samples = run_mode_script(device, controller, args.events)
+            runner.join(timeout=2)
+
+        per_key = defaultdict(list)
+        for _, key, down in controller.output.events:
+            per_key[key].append(down)
+        transitions[mode] = dict(per_key)
+        print_latency_summary(mode, samples)
+        print(f"  {'':<10} {len(controller.output.events)} transitions, "
+              f"{'ended' if not runner.is_alive() else 'still running'} after unplug, "
+              f"held keys: {'+'.join(controller.key_state.held_keys()) or 'none'}")
+    same = transitions["threaded"] == transitions["asyncio"]
+    print(f"  same key transitions per key in both modes: {'✅' if same else '❌'}")
+
+
+def cpu_load(stop):
+    """Pure Python busy work holding the GIL, like an overlay or a burst of log formatting"""
+    while not stop.is_set():
+        sum(i * i for i in range(2000))
+
+
+def measure_split_latency(output, events, load_threads):
+    """Byte arrival to injection for one output, with load_threads busy threads in this interpreter"""
+    controller = GameJoystickController(output=output)
+    controller.liveness_timeout = None
+    stop_load = threading.Event()
+    loaders = [threading.Thread(target=cpu_load, args=(stop_load,), daemon=True) for _ in range(load_threads)]
+    sent = []
+
+    with VirtualJoystickShield() as device, contextlib.redirect_stdout(io.StringIO()):
+        controller.serial_port = serial.Serial(device.port_name, 115200, timeout=1)
+        controller.is_running = True
+        listener = threading.Thread(target=controller.serial_listener, daemon=True)
+        listener.start()
+        for loader in loaders:
+            loader.start()
+
+        directions = ["Joystick Up", "Joystick Down"]
+        for i in range(events):
+            sent.append(device.send_line(directions[i % 2]))
+            time.sleep(random.uniform(0.005, 0.015))
+        time.sleep(0.05)
+
+        stop_load.set()
+        controller.is_running = False
+        listener.join(timeout=2)
+        controller.serial_port.close()
+        output.close()
+
+    events_out = output.injected_events if hasattr(output, "injected_events") else output.events
+    # Every line flips the direction, so the n-th press belongs to the n-th line
+    presses = [at for at, _, down in events_out if down]
+    return [(injected - sent_at) * 1000 for sent_at, injected in zip(sent, presses)], len(presses)
+
+
+def bench_split(args):
+    """Single process vs injection process, idle and under CPU-heavy load in the controller's interpreter"""
+    from injection_process import RingOutput
+    from output_backends import VK_CODES
+
+    print(f"🔀 Byte arrival -> injection, single process vs injection process ({args.events} events, pty device)")
+    controller_logging.get_logger().setLevel(logging.CRITICAL)
+    for load_threads in (0, 2):
+        label = "idle" if not load_threads else f"{load_threads} busy threads"
+        for mode in ("single", "split"):
+            output = RecordingBackend() if mode == "single" else RingOutput("recording", VK_CODES)
+            samples, presses = measure_split_latency(output, args.events, load_threads)
+            print(f"  {label:<15}", end="")
+            print_latency_summary(mode, samples)
+            if presses != args.events:
+                print(f"  {'':<15}  ⚠️  {presses} presses for {args.events} lines")
+
+
+def rss_mb():
+    """Resident set size of this process in MB (peak where the current one is not available)"""
+    try:
+        with open("/proc/self/statm", "r") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 2 ** 20
+    except (OSError, ValueError, AttributeError):
+        import resource
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+class CountingController(RecordingController):
+    """Counts the lines and frames it processes and the listener thread's CPU time"""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.items = 0
+        self.listener_cpu = 0.0
+
+    def process_serial_items(self, items):
+        self.items += len(items)
+        super().process_serial_items(items)
+        self.listener_cpu = time.thread_time()
+
+
+def bench_soak(args):
+    """Controller on a fast simulated JoystickShield found by port discovery: throughput, CPU and memory"""
+    import gc
+
+    from joystick_simulator import JoystickShieldSimulator
+    from port_discovery import PortDiscovery
+
+    seconds = args.events
+    rate = 1000
+    print(f"🧪 Soak: {seconds} s of random play at {rate} Hz firmware loops (simulator in this process)")
+    controller_logging.get_logger().setLevel(logging.CRITICAL)
+
+    with JoystickShieldSimulator(interval=1.0 / rate, seed=1) as device, \
+            contextlib.redirect_stdout(io.StringIO()):
+        controller = CountingController()
+        controller.liveness_timeout = 3.0
+        controller.port_discovery = PortDiscovery(cache_path=None, list_ports=lambda: [],
+                                                  extra_ports=[device.port_name], probe_timeout=2.0)
+        found = controller.connect_serial()
+        controller.is_running = True
+        listener = threading.Thread(target=controller.serial_listener, daemon=True)
+        listener.start()
+
+        samples = []
+        started = time.perf_counter()
+        cpu_started = time.process_time()
+        previous = (started, 0, 0.0)
+        for second in range(seconds):
+            time.sleep(1.0)
+            now = time.perf_counter()
+            wall = now - previous[0]
+            samples.append((controller.items - previous[1]) / wall)
+            listener_cpu = (controller.listener_cpu - previous[2]) / wall
+            previous = (now, controller.items, controller.listener_cpu)
+            if second == 0:
+                rss_start, objects_start = rss_mb(), len(gc.get_objects())
+            if second in (0, seconds - 1) or (second + 1) % 10 == 0:
+                print(f"  t={second + 1:4d} s  {samples[-1]:8,.0f} lines/s  listener CPU {listener_cpu:6.1%}  "
+                      f"RSS {rss_mb():6.1f} MB", file=sys.__stdout__)
+        cpu = (time.process_time() - cpu_started) / (time.perf_counter() - started)
+        rss_end, objects_end = rss_mb(), len(gc.get_objects())
+
+        link_up = listener.is_alive()
+        controller.is_running = False
+        listener.join(timeout=2)
+        controller.serial_port.close()
+        sent_lines = device.model.lines
+
+    print(f"  found by discovery: {'✅' if found else '❌'}  link up to the end: {'✅' if link_up else '❌'}  "
+          f"lines sent {sent_lines:,}  processed {controller.items:,}")
+    print(f"  throughput p50 {percentile(samples, 0.5):,.0f} lines/s  process CPU {cpu:.1%} "
+          f"(simulator included)  overruns {device.overruns}  late loops {device.late_ticks}")
+    print(f"  growth after the first second: RSS {rss_end - rss_start:+.1f} MB, "
+          f"{objects_end - objects_start:+,d} GC-tracked objects")
+
+
+def traffic(device, seconds):
+    """Bytes per second and firmware loops per second the device sends over seconds"""
+    start_bytes, start_ticks = device.bytes_sent, device.ticks
+    time.sleep(seconds)
+    return (device.bytes_sent - start_bytes) / seconds, (device.ticks - start_ticks) / seconds
+
+
+def bench_commands(args):
+    """Device command round trips and traffic per setting against the simulated firmware"""
+    from device_commands import FIRMWARE_DEFAULTS
+    from joystick_simulator import JoystickShieldSimulator, ScriptedTrajectory
+
+    print(f"🧪 Device commands: {args.events} acknowledged round trips, then traffic per setting")
+    controller_logging.get_logger().setLevel(logging.CRITICAL)
+    # Right held for half a second, then centered, over and over
+    trajectory = ScriptedTrajectory([(0.5, 80, 0, []), (0.05, 80, 0, []), (0.4, 0, 0, []), (0.05, 0, 0, [])])
+
+    with JoystickShieldSimulator(trajectory, interval=0.1) as device:
+        controller = RecordingController()
+        controller.attach_serial_port(serial.Serial(device.port_name, 115200, timeout=1))
+        controller.is_running = True
+        listener = threading.Thread(target=controller.serial_listener, daemon=True)
+        with contextlib.redirect_stdout(io.StringIO()):
+            listener.start()
+        commands = controller.device_commands
+
+        round_trips = []
+        for index in range(args.events):
+            pending = commands.send("HEARTBEAT", 1)
+            if pending.wait(2.0):
+                round_trips.append(pending.round_trip * 1000)
+        print_latency_summary("ACK", round_trips)
+
+        settings = [
+            ("firmware defaults", {}),
+            ("2 ms, full stream", {"INTERVAL": 2}),
+            ("2 ms, changes only", {"INTERVAL": 2, "CHANGES": 1, "POSITION": 0}),
+            ("back to defaults", {}),
+        ]
+        print(f"  {'setting':<20} {'applied':>8} {'loops/s':>8} {'bytes/s':>9} {'timeout releases':>17}")
+        for name, target in settings:
+            sent = commands.apply(target)
+            applied = all(pending.wait(2.0) for pending in sent)
+            releases = controller.timeout_releases
+            rate, loops = traffic(device, 2.0)
+            print(f"  {name:<20} {'✅' if applied else '❌':>7} {loops:8.0f} {rate:9,.0f} "
+                  f"{controller.timeout_releases - releases:17d}")
+        back_to_defaults = commands.acknowledged == FIRMWARE_DEFAULTS and device.interval == 0.1
+
+        controller.is_running = False
+        listener.join(timeout=2)
+        controller.serial_port.close()
+    print(f"  host and simulator back at the firmware defaults: {'✅' if back_to_defaults else '❌'}")
+
+    with JoystickShieldSimulator(trajectory, interval=0.1, supports_commands=False) as device:
+        controller = RecordingController()
+        controller.attach_serial_port(serial.Serial(device.port_name, 115200, timeout=1))
+        controller.is_running = True
+        listener = threading.Thread(target=controller.serial_listener, daemon=True)
+        with contextlib.redirect_stdout(io.StringIO()):
+            listener.start()
+        started = time.perf_counter()
+        pending = controller.device_commands.send("INTERVAL", 2)
+        pending.wait(5.0)
+        gave_up = time.perf_counter() - started
+        controller.injected.clear()
+        still_working = controller.injected.wait(2.0) and listener.is_alive()
+        controller.is_running = False
+        listener.join(timeout=2)
+        controller.serial_port.close()
+    print(f"  old firmware: {pending.reply} after {pending.attempts} attempt(s) in {gave_up * 1000:.0f} ms, "
+          f"marked unsupported: {'✅' if controller.device_commands.supported is False else '❌'}, "
+          f"keys still injected: {'✅' if still_working else '❌'}")
+
+
+DEFAULT_EVENTS = {
+    "latency": 200,
+    "framing": 100000,
+    "dispatch": 100000,
+    "protocol": 100000,
+    "timeout": 1000,
+    "logging": 20000,
+    "metrics": 20000,
+    "output": 20000,
+    "keystate": 100000,
+    "discovery": 3,
+    "reconnect": 3,
+    "profiles": 40,
+    "analog": 2000,
+    "mouse": 100000,
+    "combos": 200000,
+    "turbo": 2000,
+    "adaptive": 300,
+    "multidevice": 1000,
+    "modes": 300,
+    "split": 500,
+    "soak": 10,
+    "commands": 50,
+}
+
+BENCHMARKS = {
+    "latency": bench_latency,
+    "framing": bench_framing,
+    "dispatch": bench_dispatch,
+    "protocol": bench_protocol,
+    "timeout": bench_timeout,
+    "logging": bench_logging,
+    "metrics": bench_metrics,
+    "output": bench_output,
+    "keystate": bench_keystate,
+    "discovery": bench_discovery,
+    "reconnect": bench_reconnect,
+    "profiles": bench_profiles,
+    "analog": bench_analog,
+    "mouse": bench_mouse,
+    "combos": bench_combos,
+    "turbo": bench_turbo,
+    "adaptive": bench_adaptive,
+    "multidevice": bench_multidevice,
+    "modes": bench_modes,
+    "split": bench_split,
+    "soak": bench_soak,
+    "commands": bench_commands,
+}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="JoystickController benchmarks")
+    parser.add_argument("benchmark", choices=sorted(BENCHMARKS))
+    parser.add_argument("--events", type=int, default=None, help="Events per measurement")
+    args = parser.parse_args()
+    if args.events is None:
+        args.events = DEFAULT_EVENTS[args.benchmark]
+
+    BENCHMARKS[args.benchmark](args)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,108 @@
+#!/usr/bin/env python3
+"""
+Binary Protocol
+Compact framed wire format for the JoystickShield firmware
+
+Frame layout (7 bytes, little endian):
+    sync      uint8   0xA5
+    events    uint16  bit i set -> EVENT_MESSAGES[i] happened this tick,
+                      bit 15 set -> joystick is away from center
+    x         int8    joystick X amplitude (-100..100)
+    y         int8    joystick Y amplitude (-100..100)
+    sequence  uint8   increments by one per frame
+    checksum  uint8   XOR of the events, x, y and sequence bytes
+
+Text lines are plain ASCII and can never contain the sync byte, so the
+host tells both protocols apart from the first byte of every message.
+"""
+
+import functools
+import struct
+
+SYNC = 0xA5
+SYNC_BYTE = bytes([SYNC])
+
+FRAME = struct.Struct("<BHbbBB")
+FRAME_SIZE = FRAME.size
+
+# Text message equivalent of every event bit, in bit order
+EVENT_MESSAGES = [
+    b"Joystick Up",
+    b"Joystick RightUp",
+    b"Joystick Right",
+    b"Joystick RightDown",
+    b"Joystick Down",
+    b"Joystick LeftDown",
+    b"Joystick Left",
+    b"Joystick LeftUp",
+    b"Joystick Button Clicked",
+    b"Up Button Clicked",
+    b"Right Button Clicked",
+    b"Down Button Clicked",
+    b"Left Button Clicked",
+    b"E Button Clicked",
+    b"F Button Clicked",
+]
+
+NOT_CENTER_BIT = 1 << 15
+
+
+class BinaryFrame:
+    """One decoded frame"""
+
+    __slots__ = ("events", "x", "y", "sequence")
+
+    def __init__(self, events, x, y, sequence):
+        self.events = events
+        self.x = x
+        self.y = y
+        self.sequence = sequence
+
+    @property
+    def not_center(self):
+        return bool(self.events & NOT_CENTER_BIT)
+
+    def event_indexes(self):
+        """Indexes into EVENT_MESSAGES of every event bit that is set"""
+        return event_indexes(self.events & ~NOT_CENTER_BIT)
+
+    def __repr__(self):
+        return f"BinaryFrame(events=0x{self.events:04X}, x={self.x}, y={self.y}, sequence={self.sequence})"
+
+
+@functools.lru_cache(maxsize=1024)
+def event_indexes(events):
+    """Tuple of the set bit indexes of an events mask (cached per mask)"""
+    return tuple(index for index in range(len(EVENT_MESSAGES)) if events & (1 << index))
+
+
+def frame_checksum(buffer, offset=0):
+    """XOR of the four payload fields of the frame starting at offset"""
+    return (buffer[offset + 1] ^ buffer[offset + 2] ^ buffer[offset + 3]
+            ^ buffer[offset + 4] ^ buffer[offset + 5])
+
+
+def encode_frame(events, x, y, sequence):
+    """Build one frame, as the firmware sends it"""
+    frame = bytearray(FRAME.pack(SYNC, events, x, y, sequence & 0xFF, 0))
+    frame[6] = frame_checksum(frame)
+    return bytes(frame)
+
+
+def decode_frame(view, offset):
+    """Decode the frame at offset, or None if its checksum does not match
+
+    The caller makes sure FRAME_SIZE bytes starting at offset are available.
+    """
+    _, events, x, y, sequence, checksum = FRAME.unpack_from(view, offset)
+    if (events ^ (events >> 8) ^ x ^ y ^ sequence ^ checksum) & 0xFF:
+        return None
+    return BinaryFrame(events, x, y, sequence)
+
+
+def events_from_messages(messages, not_center=False):
+    """Events bitmask for a list of text messages (bytes)"""
+    events = NOT_CENTER_BIT if not_center else 0
+    for message in messages:
+        events |= 1 << EVENT_MESSAGES.index(message)
+    return events
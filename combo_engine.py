@@ -0,0 +1,354 @@
+#!/usr/bin/env python3
+"""
+Combo Engine
+Button combos, chords and macros from the profile, compiled into lookup tables
+
+A profile may declare
+
+    "macros": {"dash": ["+shift", "+w", 0.2, "-w", "-shift"]},
+    "combos": [{"sequence": ["Down", "Right", "E"], "window": 0.5, "macro": "dash"}],
+    "chords": [{"buttons": ["E", "F"], "keys": "r"}]
+
+Sequence steps are buttons ("E" for "E Button Clicked") or stick
+directions ("Joystick Down"). A combo fires when its steps are pressed in
+order with the whole sequence inside window seconds; a chord fires once
+when exactly its buttons are held together. Both either tap keys or run
+a macro. Macro steps are "key" (tap), "+key" (press), "-key" (release)
+and numbers (seconds to wait); they run on the controller's scheduler,
+never sleeping on the listener thread.
+
+All combos are compiled into one Aho-Corasick automaton with a full
+transition table, so every event is a single table step no matter how
+many combos the profile has. Button presses still do their normal
+mapped action as well.
+"""
+
+import collections
+
+from message_dispatch import BUTTON_NAMES
+
+DIRECTION_NAMES = ["Joystick Up", "Joystick RightUp", "Joystick Right", "Joystick RightDown",
+                   "Joystick Down", "Joystick LeftDown", "Joystick Left", "Joystick LeftUp"]
+
+# Combo input alphabet: buttons first, so a button's token is its bit index
+TOKENS = BUTTON_NAMES + DIRECTION_NAMES
+TOKEN_IDS = {name: index for index, name in enumerate(TOKENS)}
+
+DEFAULT_WINDOW = 0.5  # Seconds from the first to the last step of a combo
+
+# Compiled macro step operations
+TAP = "tap"
+PRESS = "press"
+RELEASE = "release"
+WAIT = "wait"
+
+
+class ComboError(ValueError):
+    """A combo, chord or macro declaration that cannot be used"""
+
+
+def token_of(step):
+    """Token id of a sequence step, accepting "E" for "E Button" """
+    if step in TOKEN_IDS:
+        return TOKEN_IDS[step]
+    token = TOKEN_IDS.get(f"{step} Button")
+    if token is None:
+        raise ComboError(f"unknown combo step {step!r}")
+    return token
+
+
+def compile_macro(steps, key_state, known_keys):
+    """Macro step list -> tuple of (operation, key or mask or seconds)"""
+    if not isinstance(steps, list) or not steps:
+        raise ComboError("a macro must be a non-empty list of steps")
+    compiled = []
+    for step in steps:
+        if isinstance(step, (int, float)) and not isinstance(step, bool):
+            if step < 0:
+                raise ComboError(f"negative macro wait {step}")
+            compiled.append((WAIT, float(step)))
+            continue
+        if not isinstance(step, str) or not step:
+            raise ComboError(f"invalid macro step {step!r}")
+        operation, key = TAP, step
+        if step[0] in "+-" and len(step) > 1:
+            operation, key = (PRESS if step[0] == "+" else RELEASE), step[1:]
+        if key not in known_keys:
+            raise ComboError(f"macro uses unknown key {key!r}")
+        compiled.append((operation, key if operation == TAP else key_state.bit(key)))
+    return tuple(compiled)
+
+
+class Combo:
+    """One compiled combo: token sequence, time window and macro to run"""
+
+    __slots__ = ("name", "tokens", "window", "macro")
+
+    def __init__(self, name, tokens, window, macro):
+        self.name = name
+        self.tokens = tokens
+        self.window = window
+        self.macro = macro
+
+    def __repr__(self):
+        return f"Combo({self.name!r}, {len(self.tokens)} steps)"
+
+
+class CompiledCombos:
+    """Combo automaton and chord table of one profile
+
+    delta[state][token] is the next state, outputs[state] the combos that
+    end in state (longest first, suffix matches included). chords maps a
+    held-button mask to its macro.
+    """
+
+    __slots__ = ("combos", "delta", "outputs", "depth", "max_window", "chords", "uses_directions")
+
+    def __init__(self, combos=(), chords=None):
+        self.combos = list(combos)
+        self.chords = chords or {}
+        self.depth = max((len(combo.tokens) for combo in self.combos), default=0)
+        self.max_window = max((combo.window for combo in self.combos), default=0.0)
+        self.uses_directions = any(token >= len(BUTTON_NAMES)
+                                   for combo in self.combos for token in combo.tokens)
+        self._build()
+
+    def _build(self):
+        token_count = len(TOKENS)
+        goto = [{}]
+        outputs = [[]]
+        for combo in self.combos:
+            state = 0
+            for token in combo.tokens:
+                next_state = goto[state].get(token)
+                if next_state is None:
+                    next_state = goto[state][token] = len(goto)
+                    goto.append({})
+                    outputs.append([])
+                state = next_state
+            outputs[state].append(combo)
+
+        # Breadth first, so a state's failure state is complete before its children
+        delta = [None] * len(goto)
+        fail = [0] * len(goto)
+        delta[0] = [goto[0].get(token, 0) for token in range(token_count)]
+        queue = collections.deque(goto[0].values())
+        while queue:
+            state = queue.popleft()
+            outputs[state].extend(outputs[fail[state]])
+            row = list(delta[fail[state]])
+            for token, child in goto[state].items():
+                fail[child] = delta[fail[state]][token]
+                row[token] = child
+                queue.append(child)
+            delta[state] = row
+
+        self.delta = delta
+        self.outputs = [tuple(sorted(combos, key=lambda combo: -len(combo.tokens))) for combos in outputs]
+
+
+def compile_combos(data, key_state, known_keys, path="<profile>"):
+    """Validate and compile the combos, chords and macros of decoded profile JSON, or None"""
+    macros_data = data.get("macros", {})
+    combos_data = data.get("combos", [])
+    chords_data = data.get("chords", [])
+    if not (macros_data or combos_data or chords_data):
+        return None
+    if not isinstance(macros_data, dict):
+        raise ComboError(f"{path}: macros must map names to step lists")
+    if not isinstance(combos_data, list) or not isinstance(chords_data, list):
+        raise ComboError(f"{path}: combos and chords must be lists")
+
+    try:
+        macros = {name: compile_macro(steps, key_state, known_keys) for name, steps in macros_data.items()}
+
+        def action_of(entry, label):
+            if "macro" in entry:
+                macro = macros.get(entry["macro"])
+                if macro is None:
+                    raise ComboError(f"{label} uses unknown macro {entry['macro']!r}")
+                return macro
+            keys = entry.get("keys")
+            keys = [keys] if isinstance(keys, str) else keys
+            if not isinstance(keys, list) or not keys:
+                raise ComboError(f"{label} needs keys or a macro")
+            return compile_macro(list(keys), key_state, known_keys)
+
+        combos = []
+        for index, entry in enumerate(combos_data):
+            label = f"combo {entry.get('name', index)!r}" if isinstance(entry, dict) else f"combo {index}"
+            sequence = entry.get("sequence") if isinstance(entry, dict) else None
+            if (not isinstance(sequence, list) or len(sequence) < 2
+                    or not all(isinstance(step, str) for step in sequence)):
+                raise ComboError(f"{label} needs a sequence of at least two steps")
+            window = entry.get("window", DEFAULT_WINDOW)
+            if not isinstance(window, (int, float)) or window <= 0:
+                raise ComboError(f"{label} window must be a positive number")
+            combos.append(Combo(entry.get("name", "+".join(sequence)),
+                                tuple(token_of(step) for step in sequence),
+                                float(window), action_of(entry, label)))
+
+        chords = {}
+        for index, entry in enumerate(chords_data):
+            label = f"chord {index}"
+            buttons = entry.get("buttons") if isinstance(entry, dict) else None
+            if (not isinstance(buttons, list) or len(buttons) < 2
+                    or not all(isinstance(button, str) for button in buttons)):
+                raise ComboError(f"{label} needs at least two buttons")
+            mask = 0
+            for button in buttons:
+                token = token_of(button)
+                if token >= len(BUTTON_NAMES):
+                    raise ComboError(f"{label}: {button!r} is not a button")
+                mask |= 1 << token
+            chords[mask] = action_of(entry, label)
+    except ComboError as e:
+        raise ComboError(f"{path}: {e}") from e
+
+    return CompiledCombos(combos, chords)
+
+
+class ComboEngine:
+    """Advances the combo automaton and chord state, handing fired macros to run_macro
+
+    Runs on the listener thread. load() swaps in another profile's tables
+    and forgets any half-entered combo.
+    """
+
+    def __init__(self, run_macro):
+        self.run_macro = run_macro
+        self.tables = None
+        self.state = 0
+        self.times = []
+        self.count = 0
+        self.last_time = 0.0
+        self.held_buttons = 0
+        self.chord_fired = False
+        self.direction = None
+        self.fired = 0
+
+    def load(self, tables):
+        self.tables = tables
+        self.times = [0.0] * (tables.depth if tables is not None else 0)
+        self.reset()
+
+    def reset(self):
+        self.state = 0
+        self.count = 0
+        self.held_buttons = 0
+        self.chord_fired = False
+        self.direction = None
+
+    def feed(self, token, now):
+        """Advance every candidate combo by one token, fires the longest completed one"""
+        tables = self.tables
+        if not tables.combos:
+            return
+        if now - self.last_time > tables.max_window:
+            self.state = 0
+        self.last_time = now
+
+        times = self.times
+        depth = tables.depth
+        times[self.count % depth] = now
+        self.count += 1
+        state = self.state = tables.delta[self.state][token]
+        for combo in tables.outputs[state]:
+            length = len(combo.tokens)
+            if length <= self.count and now - times[(self.count - length) % depth] <= combo.window:
+                # One combo per input: start over so its tail cannot fire again
+                self.state = 0
+                self.fired += 1
+                self.run_macro(combo.macro, combo.name)
+                return
+
+    def button_down(self, button, now):
+        if self.tables is None:
+            return
+        token = TOKEN_IDS[button]
+        self.held_buttons |= 1 << token
+        chord = self.tables.chords.get(self.held_buttons)
+        if chord is not None and not self.chord_fired:
+            self.chord_fired = True
+            self.fired += 1
+            self.run_macro(chord, "chord")
+        self.feed(token, now)
+
+    def button_up(self, button):
+        if self.tables is None:
+            return
+        self.held_buttons &= ~(1 << TOKEN_IDS[button])
+        self.chord_fired = False
+
+    def buttons_changed(self, buttons, now):
+        """Button edges from a binary frame's button bits (bit i = BUTTON_NAMES[i])"""
+        if self.tables is None:
+            return
+        changed = buttons ^ self.held_buttons
+        while changed:
+            lowest = changed & -changed
+            changed ^= lowest
+            name = BUTTON_NAMES[lowest.bit_length() - 1]
+            if buttons & lowest:
+                self.button_down(name, now)
+            else:
+                self.button_up(name)
+
+    def direction_changed(self, direction, now):
+        """Stick direction message, fed as a step only when the direction changes"""
+        if self.tables is None or direction == self.direction:
+            return
+        self.direction = direction
+        if direction is not None and self.tables.uses_directions:
+            self.feed(TOKEN_IDS[direction], now)
+
+
+class MacroPlayer:
+    """Runs compiled macros on the controller's scheduler
+
+    Waits are added to the macro's start time rather than to the time a
+    step actually ran, so long macros do not drift. stop() cancels every
+    running macro and releases the keys the macros still hold.
+    """
+
+    def __init__(self, controller):
+        self.controller = controller
+        self.scheduler = controller.scheduler
+        self.running = {}  # run id -> scheduled continuation
+        self.held = 0  # Keys pressed by a "+key" step and not released yet (bitmask)
+        self._next_id = 0
+
+    def play(self, macro, name=None):
+        self._next_id += 1
+        self._advance(self._next_id, macro, 0, self.controller.clock())
+
+    def _advance(self, run_id, macro, index, due):
+        self.running.pop(run_id, None)
+        controller = self.controller
+        while index < len(macro):
+            operation, value = macro[index]
+            index += 1
+            if operation == WAIT:
+                if value > 0:
+                    due += value
+                    self.running[run_id] = self.scheduler.call_at(due, self._advance, run_id, macro, index, due)
+                    return
+            elif operation == TAP:
+                controller.tap_key(value)
+            elif operation == PRESS:
+                self.held |= value
+                controller.change_keys(0, value)
+            else:
+                self.held &= ~value
+                controller.change_keys(value, 0)
+
+    def stop(self):
+        for handle in self.running.values():
+            self.scheduler.cancel(handle)
+        self.running.clear()
+        held, self.held = self.held, 0
+        if held:
+            self.controller.change_keys(held, 0)
+
+    def __len__(self):
+        return len(self.running)
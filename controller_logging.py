@@ -0,0 +1,89 @@
+#!/usr/bin/env python3
+"""
+Controller Logging
+Leveled, queue-backed logging for the controller's event path
+
+The event path only puts records on a queue; a background listener thread
+formats them and writes them to the console. At the GAME level every event
+message is below the threshold, so logging calls return before any message
+is formatted.
+"""
+
+import logging
+import logging.handlers
+import queue
+import sys
+
+LOGGER_NAME = "joystick_controller"
+
+# Quiet level for playing: only errors get through
+GAME = logging.WARNING + 5
+logging.addLevelName(GAME, "GAME")
+
+LOG_LEVELS = {
+    "debug": logging.DEBUG,
+    "info": logging.INFO,
+    "game": GAME,
+}
+
+_listener = None
+
+
+class DeferredQueueHandler(logging.handlers.QueueHandler):
+    """QueueHandler that leaves all formatting to the listener thread
+
+    The standard handler formats the message before queueing it, which would
+    put the formatting cost back on the event path.
+    """
+
+    def prepare(self, record):
+        return record
+
+
+def get_logger():
+    """Logger used by the controller"""
+    return logging.getLogger(LOGGER_NAME)
+
+
+def setup_logging(level="info", stream=None):
+    """Route controller logging through a queue to a background writer
+
+    level is one of LOG_LEVELS or a numeric logging level. Calling this
+    again replaces the previous configuration.
+    """
+    global _listener
+
+    shutdown_logging()
+
+    if isinstance(level, str):
+        level = LOG_LEVELS[level]
+
+    console = logging.StreamHandler(stream or sys.stdout)
+    console.setFormatter(logging.Formatter("%(message)s"))
+
+    records = queue.SimpleQueue()
+    logger = get_logger()
+    logger.handlers[:] = [DeferredQueueHandler(records)]
+    logger.setLevel(level)
+    logger.propagate = False
+
+    _listener = logging.handlers.QueueListener(records, console)
+    _listener.start()
+    return logger
+
+
+def set_level(level):
+    """Change the level at runtime"""
+    if isinstance(level, str):
+        level = LOG_LEVELS[level]
+    get_logger().setLevel(level)
+
+
+def shutdown_logging():
+    """Flush queued records and stop the background writer"""
+    global _listener
+
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
+
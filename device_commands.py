@@ -0,0 +1,261 @@
+#!/usr/bin/env python3
+"""
+Device Commands
+Host-to-device settings commands with acknowledgements
+
+The host sends one line per command and the firmware answers each with
+an ACK or NAK line carrying the same sequence number:
+
+    host:   !7 INTERVAL 2           device: ACK 7 INTERVAL 2
+    host:   !8 INTERVAL 0           device: NAK 8 INTERVAL range
+
+Commands (firmware defaults in brackets):
+
+    INTERVAL <ms>   sample loop interval, 2-1000 [100]
+    POSITION 0|1    stream position lines / frame positions [1]
+    CHANGES 0|1     report only changes: no repeated direction, click and
+                    position lines, a held stick stays held until the next
+                    direction or Center [0]
+    HEARTBEAT 0|1   send the 1 s heartbeat [1]
+
+Replies are text lines in both wire protocols. Commands are written and
+their replies matched on the controller's listener thread; a command that
+is not acknowledged within timeout seconds is sent again, up to retries
+times. Firmware that never answers is marked unsupported after its first
+unanswered command, so older boards keep working with their defaults.
+"""
+
+import threading
+
+import controller_logging
+
+log = controller_logging.get_logger()
+
+COMMAND_PREFIX = "!"
+
+# Command -> (lowest, highest) accepted value
+COMMAND_RANGES = {
+    "INTERVAL": (2, 1000),
+    "POSITION": (0, 1),
+    "CHANGES": (0, 1),
+    "HEARTBEAT": (0, 1),
+}
+
+# What the firmware does before the host sends anything
+FIRMWARE_DEFAULTS = {"INTERVAL": 100, "POSITION": 1, "CHANGES": 0, "HEARTBEAT": 1}
+
+# Profile "device" fields -> commands
+PROFILE_FIELDS = {
+    "interval": "INTERVAL",
+    "position": "POSITION",
+    "changes_only": "CHANGES",
+    "heartbeat": "HEARTBEAT",
+}
+
+DEFAULT_TIMEOUT = 0.3  # Seconds to wait for a reply before sending again
+DEFAULT_RETRIES = 3
+
+
+class CommandError(ValueError):
+    """A command or value the device protocol does not have"""
+
+
+def validate(command, value):
+    """Checked (command, int value)"""
+    limits = COMMAND_RANGES.get(command)
+    if limits is None:
+        raise CommandError(f"unknown device command {command!r}")
+    if isinstance(value, bool):
+        value = int(value)
+    if not isinstance(value, int) or not limits[0] <= value <= limits[1]:
+        raise CommandError(f"{command} must be an integer from {limits[0]} to {limits[1]}")
+    return command, value
+
+
+def parse_device_settings(data, path):
+    """Profile "device" object -> {command: value}"""
+    if not isinstance(data, dict):
+        raise CommandError(f"{path}: device must be an object")
+    settings = {}
+    for field, value in data.items():
+        command = PROFILE_FIELDS.get(field)
+        if command is None:
+            raise CommandError(f"{path}: unknown device setting {field!r}")
+        try:
+            settings.update([validate(command, value)])
+        except CommandError as e:
+            raise CommandError(f"{path}: device {field}: {e}") from e
+    return settings
+
+
+class PendingCommand:
+    """One sent command, done once it is acknowledged, refused or given up on
+
+    ok is True for an ACK, False for a NAK or a timeout; reply holds the
+    device's reply line or "timeout".
+    """
+
+    def __init__(self, sequence, command, value):
+        self.sequence = sequence
+        self.command = command
+        self.value = value
+        self.attempts = 0
+        self.handle = None
+        self.sent_at = None
+        self.ok = None
+        self.reply = None
+        self.round_trip = None
+        self._done = threading.Event()
+
+    def finish(self, ok, reply, now):
+        self.ok = ok
+        self.reply = reply
+        self.round_trip = now - self.sent_at if self.sent_at is not None else None
+        self._done.set()
+
+    def wait(self, timeout=None):
+        """Block until done (from any thread but the listener), returns ok"""
+        self._done.wait(timeout)
+        return self.ok
+
+    @property
+    def done(self):
+        return self._done.is_set()
+
+    def __repr__(self):
+        return f"PendingCommand({self.sequence}, {self.command} {self.value}, ok={self.ok})"
+
+
+class DeviceCommands:
+    """Keeps the device's settings where the host wants them
+
+    desired holds the settings the host asked for, acknowledged the ones
+    the device confirmed. on_applied, if set, is called with (command,
+    value) on the listener thread after every ACK.
+    """
+
+    def __init__(self, controller, timeout=DEFAULT_TIMEOUT, retries=DEFAULT_RETRIES):
+        self.controller = controller
+        self.scheduler = controller.scheduler
+        self.clock = controller.clock
+        self.timeout = timeout
+        self.retries = retries
+        self.desired = dict(FIRMWARE_DEFAULTS)
+        self.acknowledged = dict(FIRMWARE_DEFAULTS)
+        self.pending = {}  # sequence -> PendingCommand
+        self.latest = {}  # command -> PendingCommand sent last
+        self.supported = None  # Unknown until the first reply or timeout
+        self.on_applied = None
+        self._sequence = 0
+
+    def send(self, command, value):
+        """Send one command, returns its PendingCommand
+
+        Safe to call from any thread: the write happens on the listener
+        thread once the controller is running.
+        """
+        command, value = validate(command, value)
+        self.desired[command] = value
+        self._sequence = sequence = self._sequence % 9999 + 1
+        pending = PendingCommand(sequence, command, value)
+        self.latest[command] = pending
+        if self.controller.serial_port is None:
+            # Sent by restore() once a port is connected
+            pending.finish(False, "not connected", self.clock())
+        elif self.controller.is_running:
+            self.scheduler.call_at(self.clock(), self._transmit, pending)
+        else:
+            self._transmit(pending)
+        return pending
+
+    def apply(self, settings):
+        """Bring the device to settings (missing commands at firmware defaults), returns what was sent"""
+        target = dict(FIRMWARE_DEFAULTS)
+        target.update(settings)
+        self.desired.update(target)
+        return [self.send(command, value) for command, value in target.items()
+                if value != self.expected(command)]
+
+    def expected(self, command):
+        """Value the device will have once everything sent is answered"""
+        latest = self.latest.get(command)
+        if latest is not None and not latest.done:
+            return latest.value
+        return self.acknowledged[command]
+
+    def _transmit(self, pending):
+        if self.supported is False:
+            pending.finish(False, "unsupported", self.clock())
+            return
+        port = self.controller.serial_port
+        pending.attempts += 1
+        pending.sent_at = self.clock()
+        try:
+            port.write(f"{COMMAND_PREFIX}{pending.sequence} {pending.command} {pending.value}\n".encode('ascii'))
+        except Exception as e:
+            log.error("❌ Unable to send %s %d to the device: %s", pending.command, pending.value, e)
+            pending.finish(False, str(e), self.clock())
+            return
+        self.pending[pending.sequence] = pending
+        pending.handle = self.scheduler.call_later(self.timeout, self._expired, pending)
+
+    def _expired(self, pending):
+        if self.pending.get(pending.sequence) is not pending:
+            return
+        del self.pending[pending.sequence]
+        if pending.attempts < self.retries and self.supported is not False:
+            self._transmit(pending)
+            return
+        pending.finish(False, "timeout", self.clock())
+        if self.supported is None:
+            # Old firmware: stay quiet and keep its defaults
+            self.supported = False
+            self.acknowledged = dict(FIRMWARE_DEFAULTS)
+            log.warning("⚠️  The device does not answer commands, keeping its default settings")
+        else:
+            log.error("❌ No reply to %s %d from the device", pending.command, pending.value)
+
+    def on_reply(self, message):
+        """An ACK or NAK line from the device"""
+        parts = message.split(None, 3)
+        if len(parts) < 3 or not parts[1].isdigit():
+            log.warning("⚠️  Malformed device reply: %s", message)
+            return
+        pending = self.pending.pop(int(parts[1]), None)
+        if pending is None:
+            # Reply to an attempt that was already answered or given up on
+            return
+        if pending.handle is not None:
+            self.scheduler.cancel(pending.handle)
+        self.supported = True
+        now = self.clock()
+        if parts[0] == "ACK":
+            self.acknowledged[pending.command] = pending.value
+            pending.finish(True, message, now)
+            log.info("📟 Device %s = %d (%.1f ms)", pending.command, pending.value, pending.round_trip * 1000)
+            if self.on_applied is not None:
+                self.on_applied(pending.command, pending.value)
+            desired = self.desired[pending.command]
+            if desired != self.expected(pending.command):
+                # The host changed its mind while this command was on the wire
+                self.send(pending.command, desired)
+        else:
+            pending.finish(False, message, now)
+            log.error("❌ Device refused %s %d: %s", pending.command, pending.value,
+                      parts[3] if len(parts) > 3 else "no reason")
+
+    def link_lost(self):
+        """Forget everything in flight; a reconnected board starts at its defaults"""
+        now = self.clock()
+        for pending in self.pending.values():
+            if pending.handle is not None:
+                self.scheduler.cancel(pending.handle)
+            pending.finish(False, "link lost", now)
+        self.pending.clear()
+        self.latest.clear()
+        self.acknowledged = dict(FIRMWARE_DEFAULTS)
+        self.supported = None
+
+    def restore(self):
+        """Send the desired settings the device has not confirmed yet, e.g. after a reconnect"""
+        return self.apply(self.desired)
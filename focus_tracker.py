@@ -0,0 +1,213 @@
+#!/usr/bin/env python3
+"""
+Focus Tracker
+Cached classification of the foreground window for key injection
+"""
+
+import threading
+import time
+
+# Import Windows API libraries
+try:
+    import win32gui
+    WIN32_AVAILABLE = True
+except ImportError:
+    WIN32_AVAILABLE = False
+
+# Foreground window kinds
+GAME = "game"
+CONSOLE = "console"
+OTHER = "other"
+
+# Window titles that mean our own console has focus
+CONSOLE_TITLE_KEYWORDS = ["python", "cmd"]
+
+
+class FocusInfo:
+    """Foreground window handle, title and kind"""
+
+    __slots__ = ("hwnd", "title", "kind")
+
+    def __init__(self, hwnd, title, kind):
+        self.hwnd = hwnd
+        self.title = title
+        self.kind = kind
+
+    def __repr__(self):
+        return f"FocusInfo(hwnd={self.hwnd!r}, title={self.title!r}, kind={self.kind!r})"
+
+
+def classify_window(hwnd, title):
+    """Kind of a foreground window from its handle and title"""
+    if not hwnd:
+        return OTHER
+    title_lower = title.lower()
+    if any(keyword in title_lower for keyword in CONSOLE_TITLE_KEYWORDS):
+        return CONSOLE
+    return GAME
+
+
+class FocusTracker:
+    """Caches the foreground window and its kind
+
+    The cache is refreshed when it is older than ttl seconds or when
+    invalidate() is called, which platform trackers do from a foreground
+    change notification. Subclasses only implement query_foreground().
+    """
+
+    def __init__(self, ttl=0.25, clock=time.monotonic):
+        self.ttl = ttl
+        self.clock = clock
+        self.queries = 0
+        self._info = None
+        self._expires = 0.0
+
+    def query_foreground(self):
+        """Return (hwnd, title) of the foreground window"""
+        raise NotImplementedError
+
+    def current(self):
+        """Cached FocusInfo of the foreground window"""
+        info = self._info
+        if info is None or self.clock() >= self._expires:
+            info = self.refresh()
+        return info
+
+    def refresh(self):
+        """Query the foreground window now and cache the result"""
+        self.queries += 1
+        try:
+            hwnd, title = self.query_foreground()
+        except Exception:
+            hwnd, title = 0, "Unknown"
+        info = FocusInfo(hwnd, title, classify_window(hwnd, title))
+        self._info = info
+        self._expires = self.clock() + self.ttl
+        return info
+
+    def invalidate(self):
+        """Drop the cached window, the next check queries again"""
+        self._info = None
+
+    def is_game_focused(self):
+        """True unless our own console (or another known non-game window) has focus"""
+        return self.current().kind != CONSOLE
+
+    def start(self):
+        """Start listening for foreground changes (no-op without notifications)"""
+
+    def stop(self):
+        """Stop listening for foreground changes"""
+
+
+class StaticFocusTracker(FocusTracker):
+    """Tracker for platforms without a foreground window API"""
+
+    def query_foreground(self):
+        return 0, "Unknown"
+
+    def is_game_focused(self):
+        return True
+
+
+class FakeFocusTracker(FocusTracker):
+    """In-memory tracker for tests, the foreground window is set by hand
+
+    With notify=True a change behaves like a foreground notification and
+    invalidates the cache at once; with notify=False only the TTL expires it.
+    """
+
+    def __init__(self, hwnd=1, title="Game", notify=True, **kwargs):
+        super().__init__(**kwargs)
+        self.notify = notify
+        self.hwnd = hwnd
+        self.title = title
+
+    def query_foreground(self):
+        return self.hwnd, self.title
+
+    def set_foreground(self, hwnd, title):
+        """Pretend another window came to the foreground"""
+        self.hwnd = hwnd
+        self.title = title
+        if self.notify:
+            self.invalidate()
+
+
+class Win32FocusTracker(FocusTracker):
+    """Foreground window tracker using win32gui and a WinEvent hook
+
+    start() installs an EVENT_SYSTEM_FOREGROUND hook on its own thread, so
+    the cache is invalidated the moment focus changes; the TTL is only a
+    safety net in case a notification is missed.
+    """
+
+    EVENT_SYSTEM_FOREGROUND = 0x0003
+    WINEVENT_OUTOFCONTEXT = 0x0000
+    WM_QUIT = 0x0012
+
+    def __init__(self, ttl=2.0, **kwargs):
+        super().__init__(ttl=ttl, **kwargs)
+        self._hook_thread = None
+        self._hook_thread_id = None
+        self._hook_ready = threading.Event()
+
+    def query_foreground(self):
+        hwnd = win32gui.GetForegroundWindow()
+        return hwnd, win32gui.GetWindowText(hwnd)
+
+    def start(self):
+        if self._hook_thread is not None:
+            return
+        self._hook_thread = threading.Thread(target=self._hook_loop, daemon=True)
+        self._hook_thread.start()
+        self._hook_ready.wait(1.0)
+
+    def stop(self):
+        if self._hook_thread is None:
+            return
+        import ctypes
+        if self._hook_thread_id is not None:
+            ctypes.windll.user32.PostThreadMessageW(self._hook_thread_id, self.WM_QUIT, 0, 0)
+        self._hook_thread.join(timeout=1.0)
+        self._hook_thread = None
+
+    def _hook_loop(self):
+        """Run the WinEvent hook and its message loop"""
+        import ctypes
+        from ctypes import wintypes
+
+        user32 = ctypes.windll.user32
+        kernel32 = ctypes.windll.kernel32
+
+        WinEventProc = ctypes.WINFUNCTYPE(
+            None, wintypes.HANDLE, wintypes.DWORD, wintypes.HWND,
+            wintypes.LONG, wintypes.LONG, wintypes.DWORD, wintypes.DWORD)
+
+        def on_foreground_change(hook, event, hwnd, id_object, id_child, thread, time_ms):
+            self.invalidate()
+
+        callback = WinEventProc(on_foreground_change)
+        hook = user32.SetWinEventHook(
+            self.EVENT_SYSTEM_FOREGROUND, self.EVENT_SYSTEM_FOREGROUND,
+            0, callback, 0, 0, self.WINEVENT_OUTOFCONTEXT)
+
+        self._hook_thread_id = kernel32.GetCurrentThreadId()
+        self._hook_ready.set()
+        if not hook:
+            return
+
+        try:
+            message = wintypes.MSG()
+            while user32.GetMessageW(ctypes.byref(message), 0, 0, 0) > 0:
+                user32.TranslateMessage(ctypes.byref(message))
+                user32.DispatchMessageW(ctypes.byref(message))
+        finally:
+            user32.UnhookWinEvent(hook)
+
+
+def create_focus_tracker():
+    """Best tracker for this platform"""
+    if WIN32_AVAILABLE:
+        return Win32FocusTracker()
+    return StaticFocusTracker()
@@ -0,0 +1,402 @@
+#!/usr/bin/env python3
+"""
+Game Profiles
+Key mapping profiles in JSON files, validated and compiled off the event path
+
+A profile file looks like
+
+    {
+        "name": "default",
+        "default": true,
+        "match": ["Some Game", "Other Game"],
+        "direction_timeout": 0.15,  # fixed; without it the timeout is learned
+        "tap_duration": 0.05,
+        "tap_durations": {"e": 0.1},
+        "turbo": {"E": 15},
+        "device": {"interval": 2, "changes_only": true},
+        "vk_codes": {"q": 81},
+        "mapping": {"Joystick Up": "w", "Joystick LeftUp": ["a", "w"], ...},
+        "macros": {...}, "combos": [...], "chords": [...]
+    }
+
+Everything but "mapping" is optional; "turbo" fires a button N times per
+second while it is held; "device" asks the firmware for a sample
+interval and streaming mode while the profile is active (fields in
+device_commands.py); combo_engine.py describes macros,
+combos and chords. "match" lists window title
+fragments (case-insensitive) for automatic per-game selection, "vk_codes"
+adds keys to the built-in table (a profile with a code the output backend
+cannot inject is rejected when it is loaded). Each profile is compiled into the
+dispatch table, frame actions and key masks the hot path uses; the
+controller swaps the whole compiled profile in between two serial batches.
+
+The frozen exe unpacks its bundled profiles into a temporary directory
+that is deleted on exit, so it reads and watches a profiles directory
+next to the exe instead (or in the home directory when that is not
+writable), seeded from the bundled copies on first start.
+"""
+
+import json
+import os
+import shutil
+import sys
+import threading
+import time
+
+import binary_protocol
+import controller_logging
+import message_dispatch
+from combo_engine import ComboError, compile_combos
+from device_commands import CommandError, parse_device_settings
+from focus_tracker import GAME as GAME_WINDOW
+
+log = controller_logging.get_logger()
+
+# Profiles shipped with the program (inside the PyInstaller bundle when frozen)
+BUNDLED_PROFILE_DIR = os.path.join(getattr(sys, "_MEIPASS", os.path.dirname(os.path.abspath(__file__))), "profiles")
+
+
+def user_profile_dir():
+    """Profiles directory users edit: the sources' own, or one next to the frozen exe"""
+    if not getattr(sys, "frozen", False):
+        return BUNDLED_PROFILE_DIR
+    exe_dir = os.path.dirname(os.path.abspath(sys.executable))
+    if os.access(exe_dir, os.W_OK):
+        return os.path.join(exe_dir, "profiles")
+    return os.path.join(os.path.expanduser("~"), ".joystick_controller_profiles")
+
+
+PROFILE_DIR = user_profile_dir()
+PROFILE_EXTENSION = ".json"
+
+# Seconds between checks for changed files and foreground windows
+WATCH_INTERVAL = 0.5
+
+# Fastest turbo a profile may ask for (shots per second)
+MAX_TURBO_RATE = 50
+
+# Messages a profile may map
+KNOWN_MESSAGES = ({message.decode('utf-8') for message in binary_protocol.EVENT_MESSAGES}
+                  | {message_dispatch.NOT_CENTER_MESSAGE})
+
+
+# Straight directions, in the order of CompiledTables.axis_masks
+AXIS_MESSAGES = ("Joystick Right", "Joystick Left", "Joystick Up", "Joystick Down")
+
+
+class ProfileError(ValueError):
+    """A profile file that cannot be used"""
+
+
+def seed_profile_dir(directory, source=BUNDLED_PROFILE_DIR):
+    """Create directory with copies of the bundled profiles unless it already exists"""
+    if os.path.exists(directory) or os.path.abspath(directory) == os.path.abspath(source):
+        return False
+    try:
+        os.makedirs(directory)
+        for name in sorted(os.listdir(source)):
+            if name.endswith(PROFILE_EXTENSION):
+                shutil.copy2(os.path.join(source, name), os.path.join(directory, name))
+    except OSError as e:
+        log.warning("⚠️  Unable to create the profile directory %s: %s", directory, e)
+        return False
+    print(f"📁 Profiles copied to {directory}, edit them there")
+    return True
+
+
+class CompiledTables:
+    """Lookup tables built from one key mapping"""
+
+    __slots__ = ("dispatch_table", "frame_actions", "direction_mask", "mapped_mask", "axis_masks", "combos")
+
+    def __init__(self, key_mapping, key_state, direction_keys, combos=None):
+        self.combos = combos  # CompiledCombos, None without combos, chords and macros
+        self.dispatch_table = message_dispatch.DispatchTable(key_mapping, key_state.mask_of)
+        # Every key a direction can hold is in the scope a direction change diffs over
+        self.direction_mask = key_state.mask_of(direction_keys)
+        self.mapped_mask = 0
+        for action in self.dispatch_table.actions.values():
+            self.mapped_mask |= action.mask
+            if action.kind == message_dispatch.DIRECTION:
+                self.direction_mask |= action.mask
+        # Binary frame event bit -> the action of its text equivalent
+        self.frame_actions = [self.dispatch_table.lookup(message)
+                              for message in binary_protocol.EVENT_MESSAGES]
+        # Keys analog movement modulates: right, left, up, down
+        self.axis_masks = tuple(key_state.mask_of(key_mapping.get(message) or ())
+                                for message in AXIS_MESSAGES)
+
+
+class GameProfile:
+    """A validated profile with its compiled tables"""
+
+    def __init__(self, name, key_mapping, vk_codes=None, match=(), is_default=False,
+                 direction_timeout=None, tap_duration=None, tap_durations=None, path=None, combo_data=None,
+                 turbo=None, device_settings=None):
+        self.name = name
+        self.key_mapping = key_mapping
+        self.vk_codes = vk_codes or {}
+        self.match = [fragment.lower() for fragment in match]
+        self.is_default = is_default
+        self.direction_timeout = direction_timeout
+        self.tap_duration = tap_duration
+        self.tap_durations = tap_durations or {}
+        self.path = path
+        self.combo_data = combo_data or {}
+        self.turbo = turbo or {}  # button ("E Button") -> shots per second
+        self.device_settings = device_settings or {}  # device command -> value
+        self.mtime = None
+        self.tables = None
+        self.compile_ns = 0
+
+    def compile(self, key_state, direction_keys):
+        """Build the lookup tables, timing how long it takes"""
+        started = time.perf_counter_ns()
+        known_keys = set(key_state.bits) | set(self.vk_codes)
+        try:
+            combos = compile_combos(self.combo_data, key_state, known_keys, self.path or self.name)
+        except ComboError as e:
+            raise ProfileError(str(e)) from e
+        self.tables = CompiledTables(self.key_mapping, key_state, direction_keys, combos)
+        self.compile_ns = time.perf_counter_ns() - started
+        return self
+
+    def matches(self, title):
+        title = title.lower()
+        return any(fragment in title for fragment in self.match)
+
+    def __repr__(self):
+        return f"GameProfile({self.name!r}, {len(self.key_mapping)} mappings)"
+
+
+def _check_number(data, field, path):
+    value = data.get(field)
+    if value is not None and (not isinstance(value, (int, float)) or isinstance(value, bool) or value <= 0):
+        raise ProfileError(f"{path}: {field} must be a positive number")
+    return value
+
+
+def parse_turbo(turbo, path):
+    """{"E": 15, ...} -> {"E Button": 15.0, ...}, validating buttons and rates"""
+    if not isinstance(turbo, dict):
+        raise ProfileError(f"{path}: turbo must map buttons to shots per second")
+    rates = {}
+    for button, rate in turbo.items():
+        name = button if button in message_dispatch.BUTTON_NAMES else f"{button} Button"
+        if name not in message_dispatch.BUTTON_NAMES:
+            raise ProfileError(f"{path}: unknown turbo button {button!r}")
+        try:
+            rate = float(rate)
+        except (TypeError, ValueError):
+            rate = 0.0
+        if not 0 < rate <= MAX_TURBO_RATE:
+            raise ProfileError(f"{path}: turbo rate of {button!r} must be between 0 and {MAX_TURBO_RATE} Hz")
+        rates[name] = rate
+    return rates
+
+
+def parse_profile(data, base_vk_codes, path="<profile>", output=None):
+    """Validate decoded profile JSON, returns an uncompiled GameProfile
+
+    With output, every vk_codes entry must be a code that backend can inject.
+    """
+    if not isinstance(data, dict):
+        raise ProfileError(f"{path}: a profile must be a JSON object")
+
+    vk_codes = data.get("vk_codes", {})
+    if not isinstance(vk_codes, dict) or not all(
+            isinstance(code, int) and not isinstance(code, bool) and 0 < code < 256 for code in vk_codes.values()):
+        raise ProfileError(f"{path}: vk_codes must map key names to virtual key codes (1-255)")
+    if output is not None:
+        unsupported = sorted(key for key, code in vk_codes.items() if not output.supports_vk_code(code))
+        if unsupported:
+            raise ProfileError(f"{path}: the {output.name} output cannot inject {unsupported}")
+    known_keys = set(base_vk_codes) | set(vk_codes)
+
+    mapping = data.get("mapping")
+    if not isinstance(mapping, dict) or not mapping:
+        raise ProfileError(f"{path}: mapping must be a non-empty object")
+
+    unknown_messages = sorted(set(mapping) - KNOWN_MESSAGES)
+    if unknown_messages:
+        raise ProfileError(f"{path}: unknown messages {unknown_messages}")
+
+    key_mapping = {}
+    for message, keys in mapping.items():
+        if keys is None or isinstance(keys, str):
+            key_list = [] if keys is None else [keys]
+        elif isinstance(keys, list) and keys and all(isinstance(key, str) for key in keys):
+            key_list = keys
+        else:
+            raise ProfileError(f"{path}: {message!r} must map to a key, a list of keys or null")
+        unknown_keys = [key for key in key_list if key not in known_keys]
+        if unknown_keys:
+            raise ProfileError(f"{path}: {message!r} uses unknown keys {unknown_keys}")
+        key_mapping[message] = keys
+
+    match = data.get("match", [])
+    if not isinstance(match, list) or not all(isinstance(fragment, str) for fragment in match):
+        raise ProfileError(f"{path}: match must be a list of window title fragments")
+
+    tap_durations = data.get("tap_durations", {})
+    if not isinstance(tap_durations, dict) or not all(
+            isinstance(value, (int, float)) and value > 0 for value in tap_durations.values()):
+        raise ProfileError(f"{path}: tap_durations must map keys to positive numbers")
+
+    try:
+        device_settings = parse_device_settings(data.get("device", {}), path)
+    except CommandError as e:
+        raise ProfileError(str(e)) from e
+
+    name = data.get("name") or os.path.splitext(os.path.basename(path))[0]
+    return GameProfile(
+        name, key_mapping, vk_codes=vk_codes, match=match, is_default=bool(data.get("default")),
+        direction_timeout=_check_number(data, "direction_timeout", path),
+        tap_duration=_check_number(data, "tap_duration", path),
+        tap_durations=tap_durations, path=path, turbo=parse_turbo(data.get("turbo", {}), path),
+        combo_data={field: data[field] for field in ("macros", "combos", "chords") if field in data},
+        device_settings=device_settings)
+
+
+def load_profile(path, base_vk_codes, output=None):
+    """Read and validate one profile file"""
+    try:
+        mtime = os.stat(path).st_mtime_ns
+        with open(path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+    except OSError as e:
+        raise ProfileError(f"{path}: {e}") from e
+    except ValueError as e:
+        raise ProfileError(f"{path}: invalid JSON ({e})") from e
+    profile = parse_profile(data, base_vk_codes, path, output)
+    profile.mtime = mtime
+    return profile
+
+
+class ProfileManager:
+    """Keeps the profiles of a directory compiled and picks one per game
+
+    A watcher thread reloads files whose modification time changed and
+    looks at the foreground window; whenever the profile that should be
+    active changes (or is reloaded) on_switch(profile) is called from the
+    watcher thread. forced names a profile that is used regardless of the
+    foreground window. on_reload(profiles), if set, is called with the
+    profiles each poll (re)loaded, active or not.
+    """
+
+    def __init__(self, directory, key_state, base_vk_codes, direction_keys,
+                 on_switch=None, focus_tracker=None, forced=None, interval=WATCH_INTERVAL, output=None,
+                 on_reload=None):
+        self.directory = directory
+        self.key_state = key_state
+        self.base_vk_codes = base_vk_codes
+        self.direction_keys = direction_keys
+        self.on_switch = on_switch
+        self.focus_tracker = focus_tracker
+        self.forced = forced
+        self.interval = interval
+        self.output = output
+        self.on_reload = on_reload
+
+        self.profiles = {}  # path -> GameProfile
+        self.active = None
+        self._stop = threading.Event()
+        self._thread = None
+
+    def profile_paths(self):
+        try:
+            names = sorted(os.listdir(self.directory))
+        except OSError:
+            return []
+        return [os.path.join(self.directory, name) for name in names if name.endswith(PROFILE_EXTENSION)]
+
+    def reload_changed(self):
+        """Load new and modified files, returns the profiles that were (re)loaded"""
+        loaded = []
+        paths = self.profile_paths()
+        for path in paths:
+            try:
+                mtime = os.stat(path).st_mtime_ns
+            except OSError:
+                continue
+            current = self.profiles.get(path)
+            if current is not None and current.mtime == mtime:
+                continue
+            try:
+                profile = load_profile(path, self.base_vk_codes, self.output).compile(
+                    self.key_state, self.direction_keys)
+            except ProfileError as e:
+                # Keep using the previous version of a broken file
+                log.error("❌ Profile not loaded: %s", e)
+                if current is not None:
+                    current.mtime = mtime
+                continue
+            self.profiles[path] = profile
+            loaded.append(profile)
+            log.log(controller_logging.GAME, "📁 Profile %s loaded (%d mappings, compiled in %.2f ms)",
+                    profile.name, len(profile.key_mapping), profile.compile_ns / 1e6)
+
+        for path in set(self.profiles) - set(paths):
+            log.log(controller_logging.GAME, "📁 Profile %s removed", self.profiles.pop(path).name)
+        return loaded
+
+    def find(self, name):
+        for profile in self.profiles.values():
+            if profile.name == name:
+                return profile
+        return None
+
+    def default_profile(self):
+        for profile in self.profiles.values():
+            if profile.is_default:
+                return profile
+        return self.find("default")
+
+    def select(self):
+        """Profile that should be active for the current foreground window"""
+        if self.forced:
+            return self.find(self.forced)
+
+        if self.focus_tracker is not None:
+            info = self.focus_tracker.current()
+            if info.kind != GAME_WINDOW:
+                # Our console or no window: keep whatever is active
+                return self.active if self.active in self.profiles.values() else self.default_profile()
+            for profile in self.profiles.values():
+                if profile.matches(info.title):
+                    return profile
+        return self.default_profile()
+
+    def poll(self):
+        """Reload changed files and switch profiles if needed, returns the new profile or None"""
+        reloaded = self.reload_changed()
+        if reloaded and self.on_reload is not None:
+            self.on_reload(reloaded)
+        profile = self.select()
+        if profile is None or (profile is self.active and profile not in reloaded):
+            return None
+        self.active = profile
+        if self.on_switch is not None:
+            self.on_switch(profile)
+        return profile
+
+    def start(self):
+        if self._thread is not None:
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._watch, daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        if self._thread is None:
+            return
+        self._stop.set()
+        self._thread.join(timeout=2.0)
+        self._thread = None
+
+    def _watch(self):
+        while not self._stop.wait(self.interval):
+            try:
+                self.poll()
+            except Exception as e:
+                log.error("❌ Profile watcher error: %s", e)
@@ -0,0 +1,338 @@
+#!/usr/bin/env python3
+"""
+Injection Process
+Key injection in a separate process, fed through a shared-memory event ring
+
+The controller process keeps serial ingest, parsing and the key logic;
+its output backend is a RingOutput that writes every key transition and
+mouse move as a fixed-size record into a single-producer/single-consumer
+ring in multiprocessing.shared_memory. An injector process drains the
+ring and calls the real backend, so logging, profile reloads or an
+overlay in the controller's interpreter cannot hold the GIL while a key
+is being injected.
+
+The ring itself takes no lock: the producer only moves the head and the
+consumer only moves the tail, each index written after the records it
+covers. There is one producer side but several producing threads (the
+listener, the mouse tick thread, stop()), so RingOutput serializes its
+writers with a lock that the injector never touches. A semaphore is used
+as a doorbell to wake the injector; it never guards the ring. Keys
+travel as indexes into a key table both sides share; keys a profile adds
+later are sent with their virtual key codes over a control queue before
+the first record that uses them.
+
+A batch the real backend rejects is reported back on the results queue.
+The controller then forgets every held key and writes a reset record,
+on which the injector releases every key it really holds, so both sides
+agree again on what is down.
+"""
+
+import multiprocessing
+import queue
+import signal
+import struct
+import threading
+import time
+from multiprocessing import shared_memory
+
+import output_backends
+from output_backends import OutputBackend, RecordingBackend
+
+# One event: ring write time (perf_counter_ns), kind, flags, mouse dx, mouse dy, key index
+RECORD = struct.Struct("<qBBhhH")
+# Head (records written) and tail (records read), on separate cache lines
+HEAD = struct.Struct("<Q")
+HEAD_OFFSET = 0
+TAIL_OFFSET = 64
+HEADER_SIZE = 128
+
+KIND_KEY_UP = 0
+KIND_KEY_DOWN = 1
+KIND_MOUSE = 2
+KIND_CLOSE = 3
+KIND_RESET = 4  # Release every key the injector holds
+
+FLAG_BATCH_END = 1  # Last transition of one send() batch
+
+DEFAULT_CAPACITY = 4096  # Records, a power of two
+MOUSE_LIMIT = 0x7FFF
+
+# Seconds the injector sleeps on the doorbell before looking at the ring anyway
+IDLE_WAIT = 0.5
+
+# Seconds close() waits for room in the ring and for the injector to finish
+CLOSE_TIMEOUT = 5.0
+
+
+class EventRing:
+    """Single-producer/single-consumer ring of RECORD entries in shared memory"""
+
+    def __init__(self, memory, capacity, owner):
+        if capacity & (capacity - 1):
+            raise ValueError("The ring capacity must be a power of two")
+        self.memory = memory
+        self.buffer = memory.buf
+        self.capacity = capacity
+        self.mask = capacity - 1
+        self.owner = owner
+        self.name = memory.name
+        self.overflows = 0
+
+    @classmethod
+    def create(cls, capacity=DEFAULT_CAPACITY):
+        memory = shared_memory.SharedMemory(create=True, size=HEADER_SIZE + capacity * RECORD.size)
+        HEAD.pack_into(memory.buf, HEAD_OFFSET, 0)
+        HEAD.pack_into(memory.buf, TAIL_OFFSET, 0)
+        return cls(memory, capacity, owner=True)
+
+    @classmethod
+    def attach(cls, name, capacity):
+        return cls(shared_memory.SharedMemory(name=name), capacity, owner=False)
+
+    def put(self, records):
+        """Producer: append (kind, flags, dx, dy, key) records, False if they do not fit"""
+        buffer = self.buffer
+        head = HEAD.unpack_from(buffer, HEAD_OFFSET)[0]
+        tail = HEAD.unpack_from(buffer, TAIL_OFFSET)[0]
+        if head - tail + len(records) > self.capacity:
+            self.overflows += 1
+            return False
+        now = time.perf_counter_ns()
+        for kind, flags, dx, dy, key in records:
+            RECORD.pack_into(buffer, HEADER_SIZE + (head & self.mask) * RECORD.size, now, kind, flags, dx, dy, key)
+            head += 1
+        # Publish only after the records are written
+        HEAD.pack_into(buffer, HEAD_OFFSET, head)
+        return True
+
+    def drain(self):
+        """Consumer: every record written since the last drain"""
+        buffer = self.buffer
+        head = HEAD.unpack_from(buffer, HEAD_OFFSET)[0]
+        tail = HEAD.unpack_from(buffer, TAIL_OFFSET)[0]
+        records = [RECORD.unpack_from(buffer, HEADER_SIZE + (position & self.mask) * RECORD.size)
+                   for position in range(tail, head)]
+        if records:
+            HEAD.pack_into(buffer, TAIL_OFFSET, head)
+        return records
+
+    def close(self):
+        self.buffer = None
+        self.memory.close()
+        if self.owner:
+            self.memory.unlink()
+
+
+def injector_main(ring_name, capacity, keys, vk_codes, backend_name, doorbell, control, results):
+    """Injector process: drain the ring into the real backend until a close record"""
+    # Ctrl+C is for the controller, which releases every key through the ring before closing it
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    ring = EventRing.attach(ring_name, capacity)
+    backend = output_backends.create_backend(backend_name, vk_codes)
+    if backend is None:
+        results.put(("error", f"no {backend_name or 'key injection'} backend in the injector process"))
+        ring.close()
+        return
+    injectable = [code for code in range(1, 256) if backend.supports_vk_code(code)]
+    results.put(("ready", backend.name, backend.supports_mouse, injectable))
+
+    keys = list(keys)
+    down = set()  # Keys the backend really pressed
+    batch = []
+    batches = failures = 0
+    running = True
+    while running:
+        doorbell.acquire(timeout=IDLE_WAIT)
+        for _, kind, flags, dx, dy, index in ring.drain():
+            if kind == KIND_CLOSE:
+                running = False
+                break
+            if kind == KIND_MOUSE:
+                backend.move_mouse(dx, dy)
+                continue
+            if kind == KIND_RESET:
+                release_held(backend, down)
+                continue
+            while index >= len(keys):
+                # Keys registered after start arrive on the control queue first
+                try:
+                    added = control.get(timeout=1.0)
+                except queue.Empty:
+                    break
+                backend.register_keys(added)
+                keys.extend(added)
+            if index < len(keys):
+                batch.append((keys[index], kind == KIND_KEY_DOWN))
+            else:
+                failures += 1
+            if flags & FLAG_BATCH_END and batch:
+                batches += 1
+                try:
+                    sent = backend.send(batch)
+                except Exception as e:
+                    sent = False
+                    print(f"❌ {backend.name} key injection failed {batch}: {e}")
+                if sent:
+                    for key, is_down in batch:
+                        if is_down:
+                            down.add(key)
+                        else:
+                            down.discard(key)
+                else:
+                    failures += 1
+                    results.put(("rejected", batch))
+                batch = []
+
+    events = backend.events if isinstance(backend, RecordingBackend) else None
+    results.put(("closed", {"batches": batches, "failures": failures}, events))
+    backend.close()
+    ring.close()
+
+
+def release_held(backend, down):
+    """Release every key in down, one by one if the backend rejects the batch"""
+    if not down:
+        return
+    releases = [(key, False) for key in down]
+    try:
+        if not backend.send(releases):
+            for release in releases:
+                backend.send((release,))
+    except Exception as e:
+        print(f"❌ {backend.name} could not release {sorted(down)}: {e}")
+    down.clear()
+
+
+class RingOutput(OutputBackend):
+    """Output backend that hands every batch to the injector process
+
+    send() returns once the batch is in the ring, so it cannot report a
+    batch the real backend rejects later. Those come back on the results
+    queue and are passed to on_rejected, which has to forget the held keys
+    and call reset(). After close(), stats holds the injector's counters
+    and, for the recording backend, injected_events the (perf_counter time,
+    key, down) of every injected transition.
+    """
+
+    def __init__(self, backend_name=None, vk_codes=None, capacity=DEFAULT_CAPACITY, start_timeout=10.0):
+        vk_codes = dict(vk_codes or output_backends.VK_CODES)
+        self.keys = list(vk_codes)
+        self.key_index = {key: index for index, key in enumerate(self.keys)}
+        self.ring = EventRing.create(capacity)
+        self.lock = threading.Lock()  # One writer at a time: listener, mouse thread and stop()
+        self.stats = None
+        self.injected_events = None
+        self.on_rejected = None
+        self.rejections = 0
+
+        context = multiprocessing.get_context("spawn")
+        self.doorbell = context.Semaphore(0)
+        self.control = context.Queue()
+        self.results = context.Queue()
+        self.process = context.Process(
+            target=injector_main, name="joystick-injector", daemon=True,
+            args=(self.ring.name, capacity, self.keys, vk_codes, backend_name, self.doorbell, self.control,
+                  self.results))
+        self.process.start()
+
+        try:
+            reply = self.results.get(timeout=start_timeout)
+        except queue.Empty:
+            reply = ("error", f"the injection process did not start within {start_timeout:g} s")
+        if reply[0] != "ready":
+            self.process.join(timeout=1.0)
+            if self.process.is_alive():
+                self.process.terminate()
+            self.ring.close()
+            raise RuntimeError(reply[1])
+        self.name = f"{reply[1]} via injection process"
+        self.supports_mouse = reply[2]
+        self.vk_codes = frozenset(reply[3])  # Codes the injector's backend can add
+        self._closed = False
+        self._finished = threading.Event()
+        self._watcher = threading.Thread(target=self._watch_results, name="injector-results", daemon=True)
+        self._watcher.start()
+
+    def _watch_results(self):
+        """Pass rejected batches to on_rejected until the injector closes or dies"""
+        while True:
+            try:
+                reply = self.results.get(timeout=IDLE_WAIT)
+            except queue.Empty:
+                if not self.process.is_alive():
+                    break
+                continue
+            except (EOFError, OSError):
+                break
+            if reply[0] == "rejected":
+                self.rejections += 1
+                if self.on_rejected is not None:
+                    self.on_rejected(reply[1])
+            elif reply[0] == "closed":
+                _, self.stats, self.injected_events = reply
+                break
+        self._finished.set()
+
+    def send(self, transitions):
+        key_index = self.key_index
+        last = len(transitions) - 1
+        records = []
+        for position, (key, down) in enumerate(transitions):
+            index = key_index.get(key)
+            if index is None:
+                return False
+            records.append((KIND_KEY_DOWN if down else KIND_KEY_UP,
+                            FLAG_BATCH_END if position == last else 0, 0, 0, index))
+        return self._put(records)
+
+    def _put(self, records):
+        with self.lock:
+            if not self.ring.put(records):
+                return False
+        self.doorbell.release()
+        return True
+
+    def supports(self, key):
+        return key in self.key_index
+
+    def supports_vk_code(self, vk_code):
+        return vk_code in self.vk_codes
+
+    def register_keys(self, vk_codes):
+        added = {key: vk_code for key, vk_code in vk_codes.items() if key not in self.key_index}
+        if not added:
+            return
+        with self.lock:
+            # On the control queue before any record can use the new indexes
+            self.control.put(added)
+            for key in added:
+                self.key_index[key] = len(self.keys)
+                self.keys.append(key)
+
+    def move_mouse(self, dx, dy):
+        if not self.supports_mouse:
+            return False
+        dx = max(-MOUSE_LIMIT, min(MOUSE_LIMIT, dx))
+        dy = max(-MOUSE_LIMIT, min(MOUSE_LIMIT, dy))
+        return self._put(((KIND_MOUSE, 0, dx, dy, 0),))
+
+    def reset(self):
+        """Have the injector release every key it holds, after everything already queued"""
+        return self._put(((KIND_RESET, 0, 0, 0, 0),))
+
+    def close(self):
+        """Stop the injector once it has injected everything already in the ring"""
+        if self._closed:
+            return
+        self._closed = True
+        # A crashed injector never drains a full ring: give up rather than spin
+        deadline = time.monotonic() + CLOSE_TIMEOUT
+        while not self._put(((KIND_CLOSE, 0, 0, 0, 0),)):
+            if not self.process.is_alive() or time.monotonic() > deadline:
+                break
+            time.sleep(0.001)
+        self._finished.wait(CLOSE_TIMEOUT)
+        self.process.join(timeout=2.0)
+        if self.process.is_alive():
+            self.process.terminate()
+        self.ring.close()
@@ -6,7 +6,7 @@ a = Analysis(
     ['joystick_controller_final.py'],
     pathex=[],
     binaries=[],
-    datas=[],
+    datas=[('profiles', 'profiles')],
     hiddenimports=[
         'serial',
         'serial.tools.list_ports',
@@ -15,6 +15,26 @@ a = Analysis(
         'win32gui',
         'keyboard',
         'input_method_manager',
+        'serial_reader',
+        'message_dispatch',
+        'binary_protocol',
+        'key_scheduler',
+        'controller_logging',
+        'focus_tracker',
+        'latency_metrics',
+        'session_recorder',
+        'output_backends',
+        'key_state',
+        'port_discovery',
+        'game_profiles',
+        'analog_movement',
+        'mouse_output',
+        'combo_engine',
+        'turbo_fire',
+        'multi_device',
+        'async_controller',
+        'injection_process',
+        'device_commands',
         'ctypes.wintypes'
     ],
     hookspath=[],
@@ -4,60 +4,145 @@ JoystickShield PC Controller - Final Game Version
 Optimized for gaming, ensures proper key recognition
 """
 
-import serial
-import serial.tools.list_ports
 import time
 import threading
 import sys
 import ctypes
-from ctypes import wintypes
-from collections import defaultdict
+import logging
+import argparse
+import asyncio
+import multiprocessing
+import signal
 
 # Import input method manager
 from input_method_manager import InputMethodManager
-
-# Import input libraries
-try:
-    import win32api
-    import win32con
-    import win32gui
-    WIN32_AVAILABLE = True
-except ImportError:
-    WIN32_AVAILABLE = False
-
-try:
-    import keyboard
-    KEYBOARD_AVAILABLE = True
-except ImportError:
-    KEYBOARD_AVAILABLE = False
+from serial_reader import SerialLineReader
+from key_scheduler import DeadlineTracker, RepeatCadence, TimerScheduler
+from key_state import KeyState
+import controller_logging
+from latency_metrics import LatencyMetrics
+from session_recorder import RecordingSerialPort, SessionRecorder
+from port_discovery import PortDiscovery
+from async_controller import AsyncJoystickController
+from injection_process import RingOutput
+import device_commands
+from device_commands import DeviceCommands
+import game_profiles
+from game_profiles import PROFILE_DIR, CompiledTables, ProfileManager
+import analog_movement
+from analog_movement import AnalogMovement
+import mouse_output
+from mouse_output import StickMouse
+from combo_engine import ComboEngine, MacroPlayer
+import turbo_fire
+from turbo_fire import TurboFire
+import focus_tracker
+import message_dispatch
+import output_backends
+
+log = controller_logging.get_logger()
+
+# A timeout release followed by a re-press of the same key within this many seconds was spurious
+SPURIOUS_REPRESS_WINDOW = 0.5
+
+# Button event bits of a binary frame (Joystick Button .. F Button)
+FRAME_BUTTON_SHIFT = 8
+FRAME_BUTTON_BITS = 0x7F
 
 class GameJoystickController:
     # Direction keys constant
     DIRECTION_KEYS = ["w", "a", "s", "d"]
 
-    def __init__(self):
+    # Serial reader modes
+    READER_MODES = ("event", "polling")
+
+    def __init__(self, reader_mode="event", clock=time.monotonic, output=None):
+        if reader_mode not in self.READER_MODES:
+            raise ValueError(f"Unknown reader mode: {reader_mode}")
+
         self.serial_port = None
         self.is_running = False
-        self.key_states = defaultdict(bool)
+        self.reader_mode = reader_mode
+        self.clock = clock  # Monotonic time source, replaceable for tests and replays
 
         # Direction key auto-release functionality
-        self.last_direction_time = {}  # Record last direction key trigger time
+        self.direction_deadlines = DeadlineTracker()  # key -> time at which it is released
         self.direction_timeout = 0.15  # Direction key timeout (seconds) - quick release when joystick stops
+        # Learn the timeout from the firmware's repeat cadence unless a fixed one is configured
+        self.adaptive_direction_timeout = True
+        self.direction_timeout_bounds = (0.12, 0.4)  # Adaptive timeout limits (seconds)
+        self.direction_cadence = RepeatCadence(*((0.1,) + self.direction_timeout_bounds))
+        self.direction_timeout_override = None  # Fixed timeout from the command line, overrides the profile
+        # Timeout releases followed by a re-press of the same key (the timeout was too short)
+        self.timeout_released = {}  # key -> time of its timeout release
+        self.timeout_releases = 0
+        self.spurious_represses = 0
+        # Firmware in report-on-change mode sends a direction once, so held keys have no timeout
+        self.changes_only = False
+
+        # Button taps: press now, release from the scheduler after tap_duration
+        self.scheduler = TimerScheduler(clock)
+        self.tap_duration = 0.05  # Default tap length (seconds)
+        self.tap_durations = {}  # Per-key tap length overrides
+        self.pending_taps = {}  # key -> scheduled release
+
+        # Auto-fire while turbo buttons are held (see turbo_fire.py), rates from the profile and --turbo
+        self.turbo = TurboFire(self)
+        self.turbo_rates = {}  # button ("E Button") -> shots per second, overrides the profile
 
         # Initialize input method manager
         self.input_method_manager = InputMethodManager()
 
-        # Use most compatible input method
-        self.use_win32 = WIN32_AVAILABLE
-        
+        # Hot-path latency histograms, None when instrumentation is off
+        self.metrics = None
+        self.metrics_path = "latency_metrics.json"
+        self.metrics_interval = None
+
+        # Handshake-based port search with a last-port cache
+        self.port_discovery = PortDiscovery()
+
+        # Link liveness: the firmware sends a heartbeat every second
+        self.liveness_timeout = 3.0  # Seconds without serial data before the link counts as lost
+        self.last_data_time = None
+        # Older firmware never sends a heartbeat and is silent while the stick is idle,
+        # so silence only counts once a heartbeat has been seen on this connection
+        self.heartbeat_seen = False
+        self.auto_reconnect = True
+        self.reconnect_delay = 0.1  # First retry delay (seconds), doubled after every failure
+        self.reconnect_max_delay = 2.0
+        self.stopped = threading.Event()
+        self.heartbeat_liveness_timeout = None  # liveness_timeout while the heartbeat is off
+
+        # Sample interval and streaming mode of the firmware (see device_commands.py)
+        self.device_commands = DeviceCommands(self)
+        self.device_commands.on_applied = self.on_device_setting
+        self.device_overrides = {}  # Command -> value from the command line, overrides the profile
+
+        # Raw serial session recording (see session_recorder.py)
+        self.record_path = None
+        self.session_recorder = None
+
+        # Foreground window check, cached and refreshed on focus changes
+        self.focus_tracker = focus_tracker.create_focus_tracker()
+        self._warned_focus_hwnd = None
+
         # Windows virtual key code mapping
-        self.vk_codes = {
-            'w': 0x57, 'a': 0x41, 's': 0x53, 'd': 0x44,
-            'v': 0x56, 'space': 0x20, 'e': 0x45, 'f': 0x46,
-            'up': 0x26, 'down': 0x28, 'left': 0x25, 'right': 0x27,
-            'o': 0x4F, 'j': 0x4A, 'i': 0x49, 'k': 0x4B,  # Basic keys
-            'shift': 0x10, 'ctrl': 0x11, 'alt': 0x12  # Modifier keys
-        }
+        self.vk_codes = dict(output_backends.VK_CODES)
+
+        # Held keys as a bitmask, one bit per key in vk_codes order
+        self.key_state = KeyState(self.vk_codes)
+        self.direction_mask = 0  # Keys a direction can hold, set by rebuild_dispatch_table
+        self.axis_masks = (0, 0, 0, 0)  # Right, left, up and down keys, set by rebuild_dispatch_table
+
+        # Proportional movement from position data (see analog_movement.py), None in 8-way mode
+        self.analog_movement = None
+        # Stick-to-mouse camera control (see mouse_output.py), None when off
+        self.mouse_output = None
+
+        # Key injection backend, picked once here (see output_backends.py)
+        self.output = output if output is not None else output_backends.create_backend(vk_codes=self.vk_codes)
+        if isinstance(self.output, RingOutput):
+            self.output.on_rejected = self.on_injection_rejected
         
         # Key mapping configuration
         self.key_mapping = {
@@ -83,16 +168,111 @@ class GameJoystickController:
             # Special functions
             "Joystick NotCenter": None,
         }
+
+        # Binary protocol state
+        self.last_frame_sequence = None
+        self.dropped_frames = 0
+        self.frame_not_center = False
+        self.last_position = (0, 0)
+
+        # Game profiles (see game_profiles.py), None while the built-in mapping is used
+        self.profile = None
+        self.profile_manager = None
+
+        # Profile combos, chords and macros (see combo_engine.py)
+        self.combo_engine = ComboEngine(self.run_macro)
+        self.macro_player = MacroPlayer(self)
+        self.frame_buttons = 0
+
+        # Wire message -> prebuilt action, compiled from key_mapping
+        self.dispatch_table = None
+        self.frame_actions = []
+        self.rebuild_dispatch_table()
+
+        self.action_handlers = {
+            message_dispatch.DIRECTION: self.on_direction_action,
+            message_dispatch.CLICK: self.on_click_action,
+            message_dispatch.HOLD: self.on_hold_action,
+            message_dispatch.CENTER: self.on_center_action,
+            message_dispatch.BUTTON_DOWN: self.on_button_down_action,
+            message_dispatch.BUTTON_UP: self.on_button_up_action,
+            message_dispatch.REPLY: self.on_reply_action,
+        }
+
+    def rebuild_dispatch_table(self):
+        """Compile key_mapping into the dispatch table
+
+        Must be called again whenever key_mapping changes.
+        """
+        self.install_tables(CompiledTables(self.key_mapping, self.key_state, self.DIRECTION_KEYS))
+
+    def install_tables(self, tables):
+        """Make compiled tables the ones the event path uses"""
+        self.dispatch_table = tables.dispatch_table
+        self.frame_actions = tables.frame_actions
+        self.direction_mask = tables.direction_mask
+        self.axis_masks = tables.axis_masks
+        self.macro_player.stop()
+        self.combo_engine.load(tables.combos)
+
+    def load_profiles(self, directory, forced=None):
+        """Load the profile directory, apply the matching profile and watch for changes
+
+        Returns False (keeping the built-in mapping) when there is no usable profile.
+        """
+        if directory == PROFILE_DIR:
+            game_profiles.seed_profile_dir(directory)
+        self.profile_manager = ProfileManager(
+            directory, self.key_state, output_backends.VK_CODES, self.DIRECTION_KEYS,
+            on_switch=self.switch_profile, focus_tracker=self.focus_tracker, forced=forced, output=self.output)
+        profile = self.profile_manager.poll()
+        if profile is None:
+            print(f"⚠️  No usable profile in {directory}, using the built-in mapping")
+            return False
+        return True
+
+    def switch_profile(self, profile):
+        """Swap in a compiled profile, on the listener thread once it is running"""
+        if self.is_running:
+            # Between two serial batches, so no event sees half of each profile
+            self.scheduler.call_at(self.clock(), self.apply_profile, profile)
+        else:
+            self.apply_profile(profile)
+
+    def apply_profile(self, profile):
+        """Use a compiled profile from now on"""
+        state = self.key_state
+        with state.lock:
+            self.vk_codes.update(profile.vk_codes)
+            if profile.vk_codes and self.output is not None:
+                self.output.register_keys(profile.vk_codes)
+            self.key_mapping = profile.key_mapping
+            self.install_tables(profile.tables)
+            if self.direction_timeout_override is not None:
+                self.set_direction_timeout(self.direction_timeout_override)
+            elif profile.direction_timeout is not None:
+                self.set_direction_timeout(profile.direction_timeout, adaptive=self.adaptive_direction_timeout)
+            elif self.adaptive_direction_timeout and self.direction_cadence is None:
+                self.enable_adaptive_timeout()
+            if profile.tap_duration is not None:
+                self.tap_duration = profile.tap_duration
+            self.tap_durations = profile.tap_durations
+            self.turbo.set_rates({**profile.turbo, **self.turbo_rates})
+            self.device_commands.apply({**profile.device_settings, **self.device_overrides})
+            self.profile = profile
+
+            # Held keys the new profile never presses would otherwise stay down
+            stale = state.mask & ~profile.tables.mapped_mask
+            if stale:
+                self.change_keys(stale, 0)
+
+        if self.metrics is not None:
+            self.metrics.histogram("profile_compile").record(profile.compile_ns)
+        log.log(controller_logging.GAME, "🎮 Profile: %s", profile.name)
     
     def get_foreground_window_title(self):
         """Get current active window title"""
-        if not WIN32_AVAILABLE:
-            return "Unknown"
-        try:
-            hwnd = win32gui.GetForegroundWindow()
-            return win32gui.GetWindowText(hwnd)
-        except:
-            return "Unknown"
+        return self.focus_tracker.current().title
 
     # Input method functions moved to input_method_manager.py
 
@@ -101,136 +281,134 @@ class GameJoystickController:
         return self.input_method_manager.switch_to_english_input()
 
     def ensure_game_focus(self):
-        """Ensure game window has focus"""
-        window_title = self.get_foreground_window_title()
-        if "python" in window_title.lower() or "cmd" in window_title.lower():
-            print(f"⚠️  Current active window: {window_title}")
-            print("Please switch to game window!")
+        """Ensure game window has focus (cached check, cheap on every key press)"""
+        info = self.focus_tracker.current()
+        if info.kind == focus_tracker.CONSOLE:
+            # Warn once per window instead of on every key press
+            if info.hwnd != self._warned_focus_hwnd:
+                self._warned_focus_hwnd = info.hwnd
+                log.warning("⚠️  Current active window: %s", info.title)
+                log.warning("Please switch to game window!")
             return False
+        self._warned_focus_hwnd = None
         return True
 
     def _get_input_method_name(self):
         """Get current input method name"""
-        return "Win32" if self.use_win32 else "keyboard"
-    
-    def press_key_win32(self, key):
-        """Press key using Win32 API"""
-        if not self.use_win32 or key not in self.vk_codes:
+        return self.output.name if self.output is not None else "none"
+
+    def game_has_focus(self):
+        """Focus check before presses, timed when metrics are on"""
+        metrics = self.metrics
+        if metrics is None:
+            return self.ensure_game_focus()
+        started = metrics.clock_ns()
+        focused = self.ensure_game_focus()
+        metrics.record_duration("focus_check", started)
+        return focused
+
+    def inject(self, transitions):
+        """Send a batch of (key, down) transitions in one backend call"""
+        output = self.output
+        if output is None:
             return False
 
+        metrics = self.metrics
         try:
-            # Ensure game window is active
-            if not self.ensure_game_focus():
-                return False
-
-            vk_code = self.vk_codes[key]
-            win32api.keybd_event(vk_code, 0, 0, 0)
-            return True
+            if metrics is not None:
+                metrics.mark_injected()
+                started = metrics.clock_ns()
+                sent = output.send(transitions)
+                metrics.record_duration("inject_call", started)
+                return sent
+            return output.send(transitions)
         except Exception as e:
-            print(f"❌ Win32 key press failed {key}: {e}")
+            log.error("❌ %s key injection failed %s: %s", output.name, transitions, e)
             return False
 
-    def release_key_win32(self, key):
-        """Release key using Win32 API"""
-        if not self.use_win32 or key not in self.vk_codes:
-            return False
+    def change_keys(self, release, press):
+        """Release and press held keys (bitmasks) in a single batch, updating key_state"""
+        state = self.key_state
+        with state.lock:
+            release &= state.mask
+            press &= ~state.mask
+            if press and not self.game_has_focus():
+                log.error("❌ Unable to press key: %s", '+'.join(state.keys_of(press)))
+                press = 0
+            if not (release or press):
+                return False
 
-        try:
-            vk_code = self.vk_codes[key]
-            win32api.keybd_event(vk_code, 0, win32con.KEYEVENTF_KEYUP, 0)
-            return True
-        except Exception as e:
-            print(f"❌ Win32 key release failed {key}: {e}")
-            return False
-    
-    def press_key_keyboard(self, key):
-        """Press key using keyboard library"""
-        if not KEYBOARD_AVAILABLE:
-            return False
-        try:
-            keyboard.press(key)
-            return True
-        except Exception as e:
-            print(f"❌ keyboard key press failed {key}: {e}")
-            return False
+            transitions = state.transitions(release, press)
+            if not self.inject(transitions):
+                log.error("❌ Unable to change keys: %s", transitions)
+                return False
+            state.apply(release, press)
 
-    def release_key_keyboard(self, key):
-        """Release key using keyboard library"""
-        if not KEYBOARD_AVAILABLE:
-            return False
-        try:
-            keyboard.release(key)
-            return True
-        except Exception as e:
-            print(f"❌ keyboard key release failed {key}: {e}")
-            return False
-    
-    def press_keys_continuous(self, keys):
-        """Press keys (continuous state)"""
-        if isinstance(keys, str):
-            keys = [keys]
+            for key, down in transitions:
+                if not down:
+                    self.direction_deadlines.disarm(key)
 
-        for key in keys:
-            if not self.key_states[key]:
-                success = False
-
-                # Prefer Win32 API
-                if self.use_win32:
-                    success = self.press_key_win32(key)
-                    method = "Win32"
-                else:
-                    success = self.press_key_keyboard(key)
-                    method = "keyboard"
-
-                # If preferred method fails, try backup method
-                if not success:
-                    if self.use_win32 and KEYBOARD_AVAILABLE:
-                        success = self.press_key_keyboard(key)
-                        method = "keyboard(backup)"
-                    elif not self.use_win32 and WIN32_AVAILABLE:
-                        success = self.press_key_win32(key)
-                        method = "Win32(backup)"
-
-                if success:
-                    self.key_states[key] = True
-                    print(f"🔽 Press: {key} ({method})")
+        if log.isEnabledFor(logging.INFO):
+            method = self._get_input_method_name()
+            for key, down in transitions:
+                if down:
+                    log.info("🔽 Press: %s (%s)", key, method)
                 else:
-                    print(f"❌ Unable to press key: {key}")
+                    log.info("🔼 Release: %s (%s)", key, method)
+        return True
+
+    def press_keys_continuous(self, keys):
+        """Press keys (continuous state)"""
+        state = self.key_state
+        press = state.mask_of(keys) & ~state.mask
+        if press and self.change_keys(0, press):
+            # Held direction keys always get a timeout release
+            self.refresh_direction_deadlines(state.keys_of(press & self.direction_mask))
     
     def press_keys(self, keys):
-        """Press keys (button event)"""
+        """Press keys (button event) - the release is scheduled, never waited for"""
         if isinstance(keys, str):
             keys = [keys]
 
         for key in keys:
-            success_press = False
-            success_release = False
-            method = ""
-
-            # Press
-            if self.use_win32:
-                success_press = self.press_key_win32(key)
-                method = "Win32"
-            else:
-                success_press = self.press_key_keyboard(key)
-                method = "keyboard"
-
-            if success_press:
-                print(f"🔽 Press: {key} ({method})")
-                time.sleep(0.05)  # Brief delay
-
-                # Release
-                if self.use_win32:
-                    success_release = self.release_key_win32(key)
-                else:
-                    success_release = self.release_key_keyboard(key)
+            self.tap_key(key)
+
+    def tap_key(self, key, duration=None):
+        """Press key now and schedule its release after the tap duration"""
+        pending = self.pending_taps.pop(key, None)
+        if pending is not None:
+            self.scheduler.cancel(pending)
+
+        if not self.game_has_focus():
+            if pending is not None:
+                self.finish_tap(key)
+            log.error("❌ Unable to press key: %s", key)
+            return
 
-                if success_release:
-                    print(f"🔼 Release: {key} ({method})")
-                else:
-                    print(f"❌ Unable to release key: {key}")
-            else:
-                print(f"❌ Unable to press key: {key}")
+        # Re-pressed before the scheduled release: release in the same batch so the game sees a new press
+        transitions = ((key, False), (key, True)) if pending is not None else ((key, True),)
+        if self.inject(transitions):
+            log.info("🔽 Press: %s (%s)", key, self._get_input_method_name())
+            if duration is None:
+                duration = self.tap_durations.get(key, self.tap_duration)
+            self.pending_taps[key] = self.scheduler.call_later(duration, self.finish_tap, key)
+        else:
+            log.error("❌ Unable to press key: %s", key)
+
+    def finish_tap(self, key):
+        """Release a tapped key"""
+        self.pending_taps.pop(key, None)
+
+        if self.inject(((key, False),)):
+            log.info("🔼 Release: %s (%s)", key, self._get_input_method_name())
+        else:
+            log.error("❌ Unable to release key: %s", key)
+
+    def release_pending_taps(self):
+        """Release every tapped key whose release is still scheduled"""
+        for key, pending in list(self.pending_taps.items()):
+            self.scheduler.cancel(pending)
+            self.finish_tap(key)
     
     def release_keys(self, keys):
         """Release keys"""
@@ -238,32 +416,28 @@ class GameJoystickController:
             keys = [keys]
 
         for key in keys:
-            if self.key_states[key]:
-                success = False
-                method = ""
-
-                if self.use_win32:
-                    success = self.release_key_win32(key)
-                    method = "Win32"
-                else:
-                    success = self.release_key_keyboard(key)
-                    method = "keyboard"
-
-                if success:
-                    self.key_states[key] = False
-                    print(f"🔼 Release: {key} ({method})")
-                else:
-                    print(f"❌ Unable to release key: {key}")
+            self.direction_deadlines.disarm(key)
+        self.change_keys(self.key_state.mask_of(keys), 0)
 
     def release_all_keys(self):
         """Release all keys"""
-        for key, pressed in self.key_states.items():
-            if pressed:
-                if self.use_win32:
-                    self.release_key_win32(key)
-                else:
-                    self.release_key_keyboard(key)
-                self.key_states[key] = False
+        state = self.key_state
+        with state.lock:
+            self.direction_deadlines.clear()
+            held = state.clear()
+            if held:
+                self.inject(state.transitions(held, 0))
+
+    def on_injection_rejected(self, transitions):
+        """The injection process rejected a batch: forget every held key and let it release them"""
+        state = self.key_state
+        with state.lock:
+            self.direction_deadlines.clear()
+            state.clear()
+            self.output.reset()
+        log.warning("⚠️  %s rejected %s, all keys released", self.output.name, transitions)
+        if self.metrics is not None:
+            self.metrics.increment("injection_rejections")
 
     def handle_button_press(self, button_name):
         """Handle button press event - immediate short press only"""
@@ -272,8 +446,17 @@ class GameJoystickController:
         if short_press_action in self.key_mapping:
             keys = self.key_mapping[short_press_action]
             if keys:
-                self.press_keys(keys)
-                print(f"� Button press: {button_name} -> {'+'.join(keys) if isinstance(keys, list) else keys}")
+                if self.turbo.rates and self.turbo.hold(button_name, [keys] if isinstance(keys, str) else keys):
+                    # Held turbo button: its shots come from the scheduler
+                    return
+                if self.metrics is not None:
+                    started = self.metrics.clock_ns()
+                    self.press_keys(keys)
+                    self.metrics.record_duration("press_keys", started)
+                else:
+                    self.press_keys(keys)
+                if log.isEnabledFor(logging.INFO):
+                    log.info("🔘 Button press: %s -> %s", button_name, '+'.join(keys) if isinstance(keys, list) else keys)
 
 
     def handle_joystick_direction_press(self, direction_name):
@@ -285,47 +468,40 @@ class GameJoystickController:
                 # Convert single key to list for consistent processing
                 if isinstance(keys, str):
                     keys = [keys]
+                self.set_direction_keys(self.key_state.mask_of(keys), keys, direction_name)
+
+    def set_direction_keys(self, target, keys, direction_name):
+        """Hold exactly the direction keys in target (bitmask of keys)"""
+        state = self.key_state
+        release, press = state.diff(target, self.direction_mask)
+        if self.direction_cadence is not None and not self.changes_only:
+            self.direction_timeout = self.direction_cadence.observe(self.clock())
+        if press and self.timeout_released:
+            self.count_spurious_represses(press)
+
+        # Debug information
+        if log.isEnabledFor(logging.DEBUG):
+            log.debug("🔍 Debug - Direction: %s", direction_name)
+            log.debug("🔍 Debug - Required keys: %s", keys)
+            log.debug("🔍 Debug - Currently pressed: %s", state.keys_of(state.mask & self.direction_mask))
+            log.debug("🔍 Debug - Key states: %s", state.held_keys())
 
-                # Get currently pressed direction keys
-                currently_pressed = [key for key in self.DIRECTION_KEYS if self.key_states.get(key, False)]
-
-                # Debug information
-                print(f"🔍 Debug - Direction: {direction_name}")
-                print(f"🔍 Debug - Required keys: {keys}")
-                print(f"🔍 Debug - Currently pressed: {currently_pressed}")
-                print(f"🔍 Debug - Key states: {dict(self.key_states)}")
-
-                # Only change keys if the direction actually changed
-                if set(keys) != set(currently_pressed):
-                    print(f"🔄 Keys need to change from {currently_pressed} to {keys}")
-
-                    # Release keys that are no longer needed
-                    keys_to_release = []
-                    for key in currently_pressed:
-                        if key not in keys:
-                            keys_to_release.append(key)
-                            self.release_single_key(key)
-
-                    # Press new keys that weren't pressed before
-                    keys_to_press = []
-                    for key in keys:
-                        if key not in currently_pressed:
-                            keys_to_press.append(key)
-                            self.press_single_key_continuous(key)
-
-                    keys_str = '+'.join(keys)
-                    if keys_to_release:
-                        print(f"� Released keys: {'+'.join(keys_to_release)}")
-                    if keys_to_press:
-                        print(f"🔽 Pressed keys: {'+'.join(keys_to_press)}")
-                    print(f"�🕹️ Joystick direction changed: {direction_name} -> {keys_str}")
-                else:
-                    print(f"✅ Keys already correct for {direction_name}")
-
-                # Update direction key timestamps for timeout mechanism
-                current_time = time.time()
-                for key in keys:
-                    self.last_direction_time[key] = current_time
+        # Only change keys if the direction actually changed
+        if release or press:
+            # Release keys that are no longer needed and press new ones, in one batch
+            self.change_keys(release, press)
+
+            if log.isEnabledFor(logging.INFO):
+                if release:
+                    log.info("🔼 Released keys: %s", '+'.join(state.keys_of(release)))
+                if press:
+                    log.info("🔽 Pressed keys: %s", '+'.join(state.keys_of(press)))
+                log.info("🕹️ Joystick direction changed: %s -> %s", direction_name, '+'.join(keys))
+        else:
+            log.debug("✅ Keys already correct for %s", direction_name)
+
+        # Re-arm direction key deadlines for timeout mechanism
+        self.refresh_direction_deadlines(keys)
 
     def handle_joystick_direction_release(self, direction_name):
         """Handle joystick direction release event"""
@@ -334,160 +510,304 @@ class GameJoystickController:
             keys = self.key_mapping[direction_name]
             if keys:
                 self.release_keys(keys)
-                keys_str = '+'.join(keys) if isinstance(keys, list) else keys
-                print(f"🔼 Joystick direction released: {direction_name} -> {keys_str}")
+                if log.isEnabledFor(logging.INFO):
+                    keys_str = '+'.join(keys) if isinstance(keys, list) else keys
+                    log.info("🔼 Joystick direction released: %s -> %s", direction_name, keys_str)
 
 
     def press_single_key_continuous(self, key):
         """Press single key (continuous state)"""
-        if not self.key_states[key]:
-            success = self.press_key_win32(key) if self.use_win32 else self.press_key_keyboard(key)
-            if success:
-                self.key_states[key] = True
-                print(f"🔽 Press: {key} ({self._get_input_method_name()})")
+        self.change_keys(0, self.key_state.bit(key))
 
     def release_single_key(self, key):
         """Release single key"""
-        if self.key_states[key]:
-            success = self.release_key_win32(key) if self.use_win32 else self.release_key_keyboard(key)
-            if success:
-                self.key_states[key] = False
-                print(f"🔼 Release: {key} ({self._get_input_method_name()})")
+        self.direction_deadlines.disarm(key)
+        self.change_keys(self.key_state.bit(key), 0)
 
     def release_all_direction_keys(self):
         """Release all direction keys"""
-        released_keys = []
-
-        for key in self.DIRECTION_KEYS:
-            if self.key_states[key]:
-                self.release_single_key(key)
-                released_keys.append(key)
-
-        if released_keys:
-            print(f"🎯 Joystick centered, releasing direction keys: {'+'.join(released_keys)}")
+        state = self.key_state
+        held = state.mask & self.direction_mask
+        if held and self.change_keys(held, 0) and log.isEnabledFor(logging.INFO):
+            log.info("🎯 Joystick centered, releasing direction keys: %s", '+'.join(state.keys_of(held)))
+
+    def refresh_direction_deadlines(self, keys):
+        """Push back the timeout release of held direction keys"""
+        if self.changes_only:
+            return
+        deadline = self.clock() + self.direction_timeout
+        for key in keys:
+            self.direction_deadlines.arm(key, deadline)
 
     def check_direction_timeout(self):
-        """Check if direction keys have timed out, release if so"""
-        current_time = time.time()
-        keys_to_release = []
-
-        for key in self.DIRECTION_KEYS:
-            if key in self.last_direction_time:
-                time_since_last = current_time - self.last_direction_time[key]
-                if time_since_last > self.direction_timeout:
-                    # Timeout, release key
-                    keys_to_release.append(key)
-            elif self.key_states.get(key, False):
-                # Key is pressed but no timestamp recorded, release it
-                keys_to_release.append(key)
-
-        # Release all timed out keys
-        for key in keys_to_release:
-            if self.key_states.get(key, False):
-                self.release_single_key(key)
-                print(f"⏰ Direction key timeout release: {key}")
-            # Clear record
-            if key in self.last_direction_time:
-                del self.last_direction_time[key]
+        """Release direction keys whose deadline has passed"""
+        now = self.clock()
+        expired = self.direction_deadlines.pop_expired(now)
+        if not expired:
+            return
+        state = self.key_state
+        held = state.mask_of(expired) & state.mask
+        if held and self.change_keys(held, 0):
+            released = state.keys_of(held)
+            for key in released:
+                self.timeout_released[key] = now
+                log.info("⏰ Direction key timeout release: %s", key)
+            self.timeout_releases += len(released)
+            if self.metrics is not None:
+                self.metrics.increment("timeout_releases", len(released))
+
+    def count_spurious_represses(self, press):
+        """Count direction keys pressed again soon after a timeout released them"""
+        now = self.clock()
+        for key in self.key_state.keys_of(press):
+            released_at = self.timeout_released.pop(key, None)
+            if released_at is not None and now - released_at <= SPURIOUS_REPRESS_WINDOW:
+                self.spurious_represses += 1
+                log.info("🔁 Spurious release and re-press: %s (%.0f ms apart, timeout %.0f ms)",
+                         key, (now - released_at) * 1000, self.direction_timeout * 1000)
+                if self.metrics is not None:
+                    self.metrics.increment("spurious_represses")
+
+    def set_direction_timeout(self, seconds, adaptive=False):
+        """Use a fixed direction timeout"""
+        self.direction_timeout = seconds
+        self.direction_cadence = None
+        self.adaptive_direction_timeout = adaptive
+
+    def enable_adaptive_timeout(self, minimum=None, maximum=None):
+        """Learn the direction timeout from the repeat cadence, within [minimum, maximum]"""
+        if minimum is not None or maximum is not None:
+            low, high = self.direction_timeout_bounds
+            self.direction_timeout_bounds = (low if minimum is None else minimum,
+                                             high if maximum is None else maximum)
+        self.adaptive_direction_timeout = True
+        self.direction_cadence = RepeatCadence(0.1, *self.direction_timeout_bounds)
+    
+    def next_direction_deadline(self):
+        """Time at which the next held direction key times out, or None"""
+        return self.direction_deadlines.next_deadline()
     
+    def enable_metrics(self, interval=None, path=None):
+        """Turn on latency instrumentation
+
+        interval: seconds between summaries in the log (None for no summary)
+        path: JSON file written by dump_metrics()
+        """
+        self.metrics = LatencyMetrics()
+        self.metrics_interval = interval
+        if path:
+            self.metrics_path = path
+        if interval:
+            self.scheduler.call_later(interval, self.report_metrics)
+
+    def report_metrics(self):
+        """Log a latency summary and schedule the next one"""
+        if self.metrics is None:
+            return
+        log.log(controller_logging.GAME, "📊 Latency summary (%.0f s)", self.metrics_interval)
+        for line in self.metrics.summary_lines():
+            log.log(controller_logging.GAME, "  %s", line)
+        if self.metrics_interval:
+            self.scheduler.call_later(self.metrics_interval, self.report_metrics)
+
+    def dump_metrics(self, *_signal_args):
+        """Write all histograms to metrics_path as JSON (also used as a signal handler)"""
+        if self.metrics is None:
+            return
+        try:
+            self.metrics.dump(self.metrics_path)
+            log.log(controller_logging.GAME, "📊 Latency metrics written to %s", self.metrics_path)
+        except OSError as e:
+            log.error("❌ Unable to write latency metrics: %s", e)
+
+    def install_metrics_signal(self):
+        """Dump metrics on SIGUSR1 (POSIX) or Ctrl+Break (Windows)"""
+        dump_signal = getattr(signal, "SIGUSR1", None) or getattr(signal, "SIGBREAK", None)
+        if self.metrics is None or dump_signal is None:
+            return
+        try:
+            signal.signal(dump_signal, self.dump_metrics)
+            print(f"📊 Send {signal.Signals(dump_signal).name} to dump latency metrics to {self.metrics_path}")
+        except ValueError:
+            # Only the main thread may install signal handlers
+            pass
+
     def connect_serial(self, baudrate=115200):
         """Connect to serial port - auto-find available port"""
         return self.auto_find_port(baudrate)
 
     def auto_find_port(self, baudrate=115200):
-        """Auto-find Arduino port"""
+        """Auto-find Arduino port by its banner, last good port first"""
         print("🔍 Auto-searching for Arduino port...")
-        ports = serial.tools.list_ports.comports()
+        started = time.perf_counter()
+        port, entry = self.port_discovery.find(baudrate)
 
-        if not ports:
-            print("❌ No serial port devices found")
+        if port is None:
+            print("❌ No JoystickShield answered on any serial port")
             return False
 
-        print(f"Found {len(ports)} serial port devices:")
-        for i, port in enumerate(ports, 1):
-            print(f"  {i}. {port.device} - {port.description}")
-
-        # Prioritize ports containing Arduino keywords
-        arduino_ports = []
-        other_ports = []
-
-        for port in ports:
-            description = port.description.lower()
-            if any(keyword in description for keyword in ['arduino', 'ch340', 'cp210', 'ftdi']):
-                arduino_ports.append(port)
-            else:
-                other_ports.append(port)
-
-        # Try Arduino-related ports first, then other ports
-        all_ports = arduino_ports + other_ports
-
-        for port in all_ports:
-            try:
-                print(f"🔌 Attempting connection: {port.device} ({port.description})")
-                self.serial_port = serial.Serial(port.device, baudrate, timeout=1)
-                print(f"✅ Successfully connected to: {port.device}")
-                time.sleep(2)  # Wait for Arduino restart
-                return True
-            except Exception as e:
-                print(f"   ❌ Connection failed: {e}")
-                continue
-
-        print("❌ All ports failed to connect")
-        return False
+        self.serial_port = port
+        print(f"✅ Successfully connected to: {entry.device} ({entry.description}) "
+              f"in {(time.perf_counter() - started) * 1000:.0f} ms")
+        return True
     
     def process_joystick_data(self, data):
         """Process joystick data"""
-        data = data.strip()
-
-        # Parse timestamped data
-        if " > " in data:
-            _, actual_data = data.split(" > ", 1)
-            data = actual_data.strip()
-
-        # Ignore system information
-        ignore_patterns = ["Calibrating", "JoystickShield", "Starting", "=", "complete", "Complete"]
-        if any(pattern in data for pattern in ignore_patterns):
+        self.process_joystick_line(data.strip().encode('utf-8'))
+
+    def process_joystick_line(self, line):
+        """Process one raw line from the serial reader (bytes, no line ending)"""
+        self.process_action(self.dispatch_table.lookup(line))
+
+    def process_binary_frame(self, frame):
+        """Process one binary protocol frame"""
+        if self.last_frame_sequence is not None:
+            self.dropped_frames += (frame.sequence - self.last_frame_sequence - 1) & 0xFF
+        self.last_frame_sequence = frame.sequence
+
+        not_center = frame.not_center
+        if not_center != self.frame_not_center:
+            self.frame_not_center = not_center
+            message = b"Joystick NotCenter" if not_center else b"Joystick Center"
+            self.process_action(self.dispatch_table.lookup(message))
+
+        for index in frame.event_indexes():
+            self.process_action(self.frame_actions[index])
+
+        # Held buttons are set in every frame, edges are what combos and chords need
+        buttons = (frame.events >> FRAME_BUTTON_SHIFT) & FRAME_BUTTON_BITS
+        if buttons != self.frame_buttons:
+            released = self.frame_buttons & ~buttons
+            while released:
+                lowest = released & -released
+                released ^= lowest
+                self.turbo.release(message_dispatch.BUTTON_NAMES[lowest.bit_length() - 1])
+            self.frame_buttons = buttons
+            self.combo_engine.buttons_changed(buttons, self.clock())
+
+        self.last_position = (frame.x, frame.y)
+        if frame.x or frame.y or not_center:
+            self.handle_movement(frame.x, frame.y)
+
+    def process_action(self, action):
+        """Act on a prebuilt MessageAction"""
+        if self.metrics is not None:
+            self.metrics.mark_parsed(action.kind)
+        if action.kind == message_dispatch.IGNORE:
+            if action.message == message_dispatch.HEARTBEAT_MESSAGE:
+                self.heartbeat_seen = True
             return
 
+        log.debug("📡 Received: %s", action.message)
 
-
-        print(f"📡 Received: {data}")
-
-        # Handle joystick center events
-        if "Joystick NotCenter" in data:
-            # Don't release keys for NotCenter, let timeout handle it
+        handler = self.action_handlers.get(action.kind)
+        if handler is None:
+            # NotCenter, position and unknown lines: let the timeout handle keys
             return
 
-        if "Joystick Center" in data:
-            # Joystick returned to center - release all direction keys
-            self.release_all_direction_keys()
-            print(f"🎯 Joystick returned to center")
-            return
-
-        # If we haven't received any joystick direction data for a while, release direction keys
-        # This handles the case where Arduino stops sending direction data when joystick is centered
-        current_time = time.time()
-        if self.last_direction_time:
-            oldest_direction_time = min(self.last_direction_time.values())
-            if current_time - oldest_direction_time > self.direction_timeout:
-                self.release_all_direction_keys()
-                self.last_direction_time.clear()
-
-        # Check key mapping (priority processing)
-        if data in self.key_mapping:
-            keys = self.key_mapping[data]
-            if keys:
-                # Joystick directions with immediate response
-                if "Joystick " in data and data != "Joystick Button Clicked":
-                    # Handle joystick direction press (immediate response)
-                    self.handle_joystick_direction_press(data)
-                elif "Clicked" in data:
-                    # Button press event
-                    button_name = data.replace(" Clicked", "").strip()
-                    self.handle_button_press(button_name)
-                else:
-                    self.press_keys_continuous(keys)
-            return
+        if self.metrics is not None:
+            self.metrics.mark_dispatched()
+        handler(action)
+
+    def on_direction_action(self, action):
+        """Joystick direction with immediate response"""
+        self.set_direction_keys(action.mask, action.keys, action.message)
+        if self.combo_engine.tables is not None:
+            self.combo_engine.direction_changed(action.message, self.clock())
+
+    def on_button_down_action(self, action):
+        """Button edge, only combos and chords look at these"""
+        self.combo_engine.button_down(action.button, self.clock())
+
+    def on_button_up_action(self, action):
+        self.combo_engine.button_up(action.button)
+        if action.button in self.turbo:
+            self.turbo.release(action.button)
+
+    def on_reply_action(self, action):
+        """ACK or NAK of a device command"""
+        self.device_commands.on_reply(action.message)
+
+    def on_device_setting(self, command, value):
+        """The device acknowledged a setting the host logic depends on"""
+        if command == "CHANGES":
+            self.changes_only = bool(value)
+            # No repeats to keep held keys and turbo buttons alive, only edges
+            self.turbo.hold_timeout = None if value else turbo_fire.HOLD_TIMEOUT
+            if value:
+                self.direction_deadlines.clear()
+        elif command == "HEARTBEAT":
+            if not value and self.liveness_timeout:
+                # Silence is normal without a heartbeat, only read errors mean a lost link
+                self.heartbeat_liveness_timeout = self.liveness_timeout
+                self.liveness_timeout = None
+            elif value and self.heartbeat_liveness_timeout is not None:
+                self.liveness_timeout = self.heartbeat_liveness_timeout
+                self.heartbeat_liveness_timeout = None
+
+    def run_macro(self, macro, name):
+        """A combo or chord fired"""
+        log.info("🎯 Combo: %s", name)
+        self.macro_player.play(macro, name)
+
+    def on_click_action(self, action):
+        """Button press event"""
+        self.handle_button_press(action.button)
+
+    def on_hold_action(self, action):
+        """Other mapped message, hold its keys"""
+        self.press_keys_continuous(list(action.keys))
+
+    def on_center_action(self, action):
+        """Joystick returned to center - release all direction keys"""
+        if self.analog_movement is not None:
+            self.analog_movement.stop()
+        if self.mouse_output is not None:
+            self.mouse_output.update(0, 0)
+        self.combo_engine.direction_changed(None, self.clock())
+        # A deliberate stop: neither a gap in the cadence nor a spurious release
+        if self.direction_cadence is not None:
+            self.direction_cadence.reset()
+        self.timeout_released.clear()
+        self.release_all_direction_keys()
+        log.info("🎯 Joystick returned to center")
+
+    def enable_analog_movement(self, deadzone=analog_movement.DEFAULT_DEADZONE,
+                               curve=analog_movement.DEFAULT_CURVE, period=analog_movement.DEFAULT_PERIOD):
+        """Move proportionally from position data instead of the 8-way direction messages"""
+        started = time.perf_counter()
+        self.analog_movement = AnalogMovement(self, deadzone=deadzone, curve=curve, period=period)
+        log.info("🕹️ Analog movement: deadzone %d, curve %.2f, %.0f ms cycle (table built in %.1f ms)",
+                 deadzone, curve, period * 1000, (time.perf_counter() - started) * 1000)
+        self.action_handlers[message_dispatch.DIRECTION] = self.on_analog_direction_action
+        self.action_handlers[message_dispatch.POSITION] = self.on_position_action
+
+    def enable_mouse_output(self, rate=mouse_output.DEFAULT_RATE, speed=mouse_output.DEFAULT_SPEED,
+                            deadzone=analog_movement.DEFAULT_DEADZONE, curve=mouse_output.DEFAULT_CURVE,
+                            smoothing=mouse_output.DEFAULT_SMOOTHING):
+        """Drive the mouse from position data instead of pressing direction keys"""
+        self.mouse_output = StickMouse(self.output, rate=rate, speed=speed, deadzone=deadzone, curve=curve,
+                                       smoothing=smoothing, stale_after=self.mouse_stale_after,
+                                       allowed=self.mouse_allowed)
+        log.info("🖱️ Mouse output: %d Hz, %.0f px/s, deadzone %d, curve %.2f", rate, speed, deadzone, curve)
+        self.action_handlers[message_dispatch.DIRECTION] = self.on_analog_direction_action
+        self.action_handlers[message_dispatch.POSITION] = self.on_position_action
+
+    def mouse_stale_after(self):
+        """Age at which a stick position counts as centered, the current direction timeout"""
+        # Without repeats a held position is only refreshed when it changes
+        return float("inf") if self.changes_only else self.direction_timeout
+
+    def mouse_allowed(self):
+        """Cached focus check for mouse moves, never the console"""
+        return self.focus_tracker.current().kind != focus_tracker.CONSOLE
+
+    def on_analog_direction_action(self, action):
+        """Direction messages carry nothing the position stream does not"""
+
+    def on_position_action(self, action):
+        """Joystick position line"""
+        self.handle_position_data(action.message)
 
     def handle_position_data(self, data):
         """Handle position data"""
@@ -506,69 +826,197 @@ class GameJoystickController:
                 x_pos = int(x_str)
                 y_pos = int(y_str)
 
-                dead_zone = 15
-                self.handle_movement(x_pos, y_pos, dead_zone)
+                self.handle_movement(x_pos, y_pos)
 
         except Exception as e:
-            print(f"⚠️  Position data parsing error: {e}")
+            log.warning("⚠️  Position data parsing error: %s", e)
     
-    def handle_movement(self, x_pos, y_pos, dead_zone):
+    def handle_movement(self, x_pos, y_pos):
         """Handle movement"""
-        # Determine which keys need to be pressed
-        keys_to_press = []
-
-        if y_pos > dead_zone:  # Up (positive Y-axis means up)
-            keys_to_press.append("w")
-        elif y_pos < -dead_zone:  # Down (negative Y-axis means down)
-            keys_to_press.append("s")
-
-        if x_pos < -dead_zone:  # Left
-            keys_to_press.append("a")
-        elif x_pos > dead_zone:  # Right
-            keys_to_press.append("d")
+        if self.analog_movement is not None:
+            self.analog_movement.update(x_pos, y_pos)
+        if self.mouse_output is not None:
+            self.mouse_output.update(x_pos, y_pos)
 
-        # Get currently pressed direction keys
-        currently_pressed = [key for key in self.DIRECTION_KEYS if self.key_states.get(key, False)]
-
-        # Only change keys if the direction actually changed
-        if set(keys_to_press) != set(currently_pressed):
-            # Release keys that are no longer needed
-            for key in currently_pressed:
-                if key not in keys_to_press:
-                    self.release_keys(key)
-
-            # Press new keys that weren't pressed before
-            for key in keys_to_press:
-                if key not in currently_pressed:
-                    self.press_keys_continuous([key])
-
-            if keys_to_press:
-                print(f"🎮 Movement changed: {'+'.join(keys_to_press)} (X={x_pos}, Y={y_pos})")
-            else:
-                print(f"🎮 Movement stopped (X={x_pos}, Y={y_pos})")
-    
     def serial_listener(self):
         """Serial port listening thread"""
-        print("🎮 Starting joystick data monitoring...")
+        print(f"🎮 Starting joystick data monitoring ({self.reader_mode} mode)...")
 
+        while self.is_running:
+            self.restore_device_settings()
+            if self.reader_mode == "polling":
+                self._polling_listener()
+            else:
+                self._event_listener()
+
+            # The listener only returns on stop() or a lost link
+            if not self.is_running:
+                break
+            self.on_link_lost()
+            if not self.auto_reconnect or not self.reconnect():
+                break
+
+    def _polling_listener(self):
+        """Poll the serial port every 10 ms"""
+        self.mark_link_alive()
         while self.is_running:
             try:
                 # Process serial port data
                 if self.serial_port and self.serial_port.is_open and self.serial_port.in_waiting:
+                    self.mark_link_alive()
                     data = self.serial_port.readline().decode('utf-8', errors='ignore')
+                    if self.metrics is not None:
+                        self.metrics.mark_read()
                     if data:
                         self.process_joystick_data(data)
-                # Check direction key timeout
-                self.check_direction_timeout()
+                    if self.metrics is not None:
+                        self.metrics.end_batch()
+                # Check direction key timeout and scheduled releases
+                self.run_timers()
+                if self.link_timed_out():
+                    break
 
             except Exception as e:
-                print(f"❌ Serial port read error: {e}")
+                if self.is_running:
+                    log.error("❌ Serial port read error: %s", e)
                 break
 
             time.sleep(0.01)
+
+    def _event_listener(self):
+        """Sleep until serial data arrives or the next timeout or scheduled release is due"""
+        reader = SerialLineReader(self.serial_port)
+        self.mark_link_alive()
+
+        while self.is_running:
+            try:
+                if not self.serial_port.is_open:
+                    break
+
+                deadline = self.next_wakeup()
+                liveness = self.liveness_deadline()
+                if liveness is not None and (deadline is None or liveness < deadline):
+                    deadline = liveness
+                timeout = None if deadline is None else deadline - self.clock()
+
+                if reader.wait(timeout):
+                    self.mark_link_alive()
+                    self.process_serial_items(reader.read_lines())
+                # Check direction key timeout and scheduled releases
+                self.run_timers()
+                if self.link_timed_out():
+                    break
+
+            except Exception as e:
+                if self.is_running:
+                    log.error("❌ Serial port read error: %s", e)
+                break
     
-    def start(self):
-        """Start controller"""
+    def process_serial_items(self, items):
+        """Process one batch of lines and binary frames from the serial reader"""
+        if self.metrics is not None:
+            self.metrics.mark_read()
+        for item in items:
+            if type(item) is bytes:
+                self.process_joystick_line(item)
+            else:
+                self.process_binary_frame(item)
+        if self.metrics is not None:
+            self.metrics.end_batch()
+
+    def next_wakeup(self):
+        """Clock time of the next direction timeout or scheduled timer, or None"""
+        deadline = self.next_direction_deadline()
+        scheduled = self.scheduler.next_deadline()
+        if scheduled is not None and (deadline is None or scheduled < deadline):
+            deadline = scheduled
+        return deadline
+
+    def run_timers(self):
+        """Release timed-out direction keys and run due scheduled actions"""
+        self.check_direction_timeout()
+        self.scheduler.run_due()
+
+    def mark_link_alive(self):
+        """Serial data (or a heartbeat) just arrived"""
+        self.last_data_time = self.clock()
+
+    def liveness_deadline(self):
+        """Clock time at which silence means a lost link, or None"""
+        if self.last_data_time is None or not self.liveness_timeout or not self.heartbeat_seen:
+            return None
+        return self.last_data_time + self.liveness_timeout
+
+    def link_timed_out(self):
+        """True once nothing has arrived for liveness_timeout seconds"""
+        deadline = self.liveness_deadline()
+        if deadline is None or self.clock() < deadline:
+            return False
+        log.error("💔 No data from the JoystickShield for %.1f s", self.liveness_timeout)
+        return True
+
+    def on_link_lost(self):
+        """Release every held key and close the dead port"""
+        if self.analog_movement is not None:
+            self.analog_movement.stop()
+        if self.mouse_output is not None:
+            self.mouse_output.update(0, 0)
+        self.macro_player.stop()
+        self.turbo.stop_all()
+        self.combo_engine.reset()
+        self.frame_buttons = 0
+        self.release_pending_taps()
+        self.release_all_keys()
+        # A reconnected board starts at its defaults until restore_device_settings()
+        self.device_commands.link_lost()
+        self.heartbeat_seen = False
+        for command, value in device_commands.FIRMWARE_DEFAULTS.items():
+            self.on_device_setting(command, value)
+        log.error("🔌 JoystickShield connection lost, all keys released")
+        if self.metrics is not None:
+            self.metrics.increment("link_faults")
+        try:
+            self.serial_port.close()
+        except Exception:
+            pass
+
+    def reconnect(self):
+        """Find the JoystickShield again with exponential backoff, True once connected"""
+        started = time.perf_counter()
+        delay = self.reconnect_delay
+        attempts = 0
+
+        while self.is_running:
+            attempts += 1
+            port, entry = self.port_discovery.find()
+            if port is not None:
+                self.attach_serial_port(port)
+                elapsed = time.perf_counter() - started
+                log.log(controller_logging.GAME, "🔌 Reconnected to %s after %d attempt(s) in %.0f ms",
+                        entry.device, attempts, elapsed * 1000)
+                if self.metrics is not None:
+                    self.metrics.histogram("reconnect").record(int(elapsed * 1e9))
+                    self.metrics.increment("reconnects")
+                return True
+
+            log.info("🔌 Reconnect attempt %d failed, retrying in %.1f s", attempts, delay)
+            if self.stopped.wait(delay):
+                break
+            delay = min(delay * 2, self.reconnect_max_delay)
+        return False
+
+    def restore_device_settings(self):
+        """Send the settings the host wants to a freshly (re)connected board"""
+        self.device_commands.restore()
+
+    def attach_serial_port(self, port):
+        """Use port from now on, recording it if a session is being recorded"""
+        if self.session_recorder is not None:
+            port = RecordingSerialPort(port, self.session_recorder)
+        self.serial_port = port
+
+    def prepare(self):
+        """Print the banner, connect the serial port and show the mappings, False if no port"""
         print("=" * 60)
         print("🎮 JoystickController - Final Game Version")
         print("=" * 60)
@@ -577,8 +1025,7 @@ class GameJoystickController:
         self.switch_to_english_input()
 
         # Display input method
-        method_name = "Win32 API" if self.use_win32 else "keyboard library"
-        print(f"🎯 Input method: {method_name}")
+        print(f"🎯 Input method: {self._get_input_method_name()}")
 
         # Check permissions
         try:
@@ -591,9 +1038,15 @@ class GameJoystickController:
             pass
 
         # Connect to serial port
-        if not self.connect_serial():
+        if self.serial_port is None and not self.connect_serial():
             print("❌ Unable to connect to serial port, program exiting")
-            return
+            return False
+
+        # Capture the raw session for later replay
+        if self.record_path:
+            self.session_recorder = SessionRecorder(self.record_path)
+            self.attach_serial_port(self.serial_port)
+            print(f"📼 Recording serial session to {self.record_path}")
         
         # Display key mappings
         print("\n🎯 Joystick Direction Mapping:")
@@ -631,8 +1084,20 @@ class GameJoystickController:
         print("4. If still no response, check game input settings")
         print("\n⌨️  Press Ctrl+C to exit")
         print("-" * 60)
-        
+        return True
+
+    def start(self):
+        """Start controller"""
+        if not self.prepare():
+            return
+
         # Start listening thread
+        self.install_metrics_signal()
+        self.focus_tracker.start()
+        if self.profile_manager is not None:
+            self.profile_manager.start()
+        if self.mouse_output is not None:
+            self.mouse_output.start()
         self.is_running = True
         listener_thread = threading.Thread(target=self.serial_listener)
         listener_thread.daemon = True
@@ -648,29 +1113,154 @@ class GameJoystickController:
     def stop(self):
         """Stop controller"""
         self.is_running = False
+        self.stopped.set()
+        if self.profile_manager is not None:
+            self.profile_manager.stop()
+        if self.analog_movement is not None:
+            self.analog_movement.stop()
+        if self.mouse_output is not None:
+            self.mouse_output.stop()
+        self.macro_player.stop()
+        self.turbo.stop_all()
+        self.release_pending_taps()
         self.release_all_keys()
+        if self.output is not None:
+            self.output.close()
+        self.focus_tracker.stop()
+        self.dump_metrics()
 
         if self.serial_port and self.serial_port.is_open:
             self.serial_port.close()
             print("✅ Serial port closed")
+        if self.session_recorder is not None:
+            self.session_recorder.close()
 
         print("✅ Controller stopped")
 
+def parse_turbo_rates(specs):
+    """["E=15", ...] -> {"E Button": 15.0, ...}"""
+    rates = {}
+    for spec in specs:
+        button, _, rate = spec.partition("=")
+        rates.update(game_profiles.parse_turbo({button.strip(): rate}, "--turbo"))
+    return rates
+
 def main():
+    # In the frozen exe the injection process re-runs this entry point; this hands it over
+    multiprocessing.freeze_support()
+    parser = argparse.ArgumentParser(description="JoystickShield PC Controller")
+    parser.add_argument("--log-level", choices=sorted(controller_logging.LOG_LEVELS), default="info",
+                        help="debug: every message, info: key changes, game: errors only")
+    parser.add_argument("--output", choices=sorted(output_backends.BACKENDS),
+                        help="Key injection backend (default: first available)")
+    parser.add_argument("--injection-process", action="store_true",
+                        help="Inject keys from a separate process fed through a shared-memory ring "
+                             "(injection_process.py)")
+    parser.add_argument("--profiles", metavar="DIR", default=PROFILE_DIR,
+                        help="Directory of JSON game profiles, reloaded when files change")
+    parser.add_argument("--profile", metavar="NAME",
+                        help="Always use this profile instead of picking one per game window")
+    stick_mode = parser.add_mutually_exclusive_group()
+    stick_mode.add_argument("--analog", action="store_true",
+                            help="Proportional movement from position data (direction keys pulse-width modulated)")
+    stick_mode.add_argument("--mouse", action="store_true",
+                            help="Stick moves the mouse (camera control) instead of pressing direction keys")
+    parser.add_argument("--deadzone", type=int, default=analog_movement.DEFAULT_DEADZONE,
+                        help="Analog and mouse mode: stick radius (0-100) that counts as centered")
+    parser.add_argument("--curve", type=float,
+                        help="Analog and mouse mode: response curve exponent (1 linear, >1 finer near center; "
+                             f"default {analog_movement.DEFAULT_CURVE} analog, {mouse_output.DEFAULT_CURVE} mouse)")
+    parser.add_argument("--mouse-rate", type=int, default=mouse_output.DEFAULT_RATE,
+                        help="Mouse mode: output ticks per second (250-1000)")
+    parser.add_argument("--mouse-speed", type=float, default=mouse_output.DEFAULT_SPEED,
+                        help="Mouse mode: pixels per second at full deflection")
+    parser.add_argument("--pwm-period", type=float, default=analog_movement.DEFAULT_PERIOD,
+                        help="Analog mode: key modulation cycle in seconds")
+    parser.add_argument("--turbo", metavar="BUTTON=HZ", action="append", default=[],
+                        help="Auto-fire a button while held, e.g. --turbo E=15 (repeatable, overrides the profile)")
+    parser.add_argument("--direction-timeout", type=float, metavar="SECONDS",
+                        help="Fixed direction key timeout (default: learned from the firmware's repeat rate)")
+    parser.add_argument("--sample-interval", type=int, metavar="MS",
+                        help="Ask the firmware to sample every MS milliseconds (2-1000, overrides the profile)")
+    parser.add_argument("--changes-only", action="store_true",
+                        help="Ask the firmware to report only changes (no repeated direction and click lines)")
+    parser.add_argument("--asyncio", action="store_true",
+                        help="Run on an asyncio event loop instead of the listener thread (async_controller.py)")
+    parser.add_argument("--record", metavar="PATH",
+                        help="Record the raw serial session for replay (session_recorder.py)")
+    parser.add_argument("--metrics", action="store_true",
+                        help="Record hot-path latency histograms")
+    parser.add_argument("--metrics-interval", type=float, default=60.0,
+                        help="Seconds between latency summaries (0 to disable)")
+    parser.add_argument("--metrics-file", default="latency_metrics.json",
+                        help="JSON file for latency dumps")
+    args = parser.parse_args()
+
+    controller_logging.setup_logging(args.log_level)
+
     print("🔍 Checking dependencies...")
 
-    if not WIN32_AVAILABLE and not KEYBOARD_AVAILABLE:
-        print("❌ Missing input libraries, please install:")
-        print("pip install pywin32 keyboard")
+    if args.injection_process:
+        try:
+            output = RingOutput(args.output, output_backends.VK_CODES)
+        except (RuntimeError, OSError) as e:
+            print(f"❌ Unable to start the injection process: {e}")
+            sys.exit(1)
+    else:
+        output = output_backends.create_backend(args.output, output_backends.VK_CODES)
+    if output is None:
+        print("❌ No key injection backend available, please install:")
+        print("pip install keyboard")
         sys.exit(1)
-
-    if WIN32_AVAILABLE:
-        print("✅ Win32 API available")
-    if KEYBOARD_AVAILABLE:
-        print("✅ keyboard library available")
-
-    controller = GameJoystickController()
-    controller.start()
+    print(f"✅ Key injection: {output.name}")
+
+    controller = GameJoystickController(output=output)
+    try:
+        controller.turbo_rates = parse_turbo_rates(args.turbo)
+    except ValueError as e:
+        parser.error(str(e))
+    controller.turbo.set_rates(controller.turbo_rates)
+    if args.direction_timeout is not None:
+        controller.direction_timeout_override = args.direction_timeout
+        controller.set_direction_timeout(args.direction_timeout)
+    if args.sample_interval is not None:
+        try:
+            controller.device_overrides.update([device_commands.validate("INTERVAL", args.sample_interval)])
+        except ValueError as e:
+            parser.error(str(e))
+    if args.changes_only:
+        controller.device_overrides["CHANGES"] = 1
+    if not controller.load_profiles(args.profiles, args.profile):
+        controller.device_commands.apply(controller.device_overrides)
+    if args.analog:
+        curve = args.curve if args.curve is not None else analog_movement.DEFAULT_CURVE
+        controller.enable_analog_movement(args.deadzone, curve, args.pwm_period)
+    elif args.mouse:
+        if not output.supports_mouse:
+            print(f"❌ The {output.name} output cannot move the mouse, try --output sendinput or uinput")
+            sys.exit(1)
+        curve = args.curve if args.curve is not None else mouse_output.DEFAULT_CURVE
+        controller.enable_mouse_output(args.mouse_rate, args.mouse_speed, args.deadzone, curve)
+    controller.record_path = args.record
+    if args.metrics:
+        controller.enable_metrics(args.metrics_interval or None, args.metrics_file)
+    try:
+        if args.asyncio:
+            run_async(controller)
+        else:
+            controller.start()
+    finally:
+        controller_logging.shutdown_logging()
+
+def run_async(controller):
+    """Connect, then run the controller on an asyncio loop until Ctrl+C or a lost link"""
+    if not controller.prepare():
+        return
+    controller.install_metrics_signal()
+    try:
+        asyncio.run(AsyncJoystickController(controller).run())
+    except KeyboardInterrupt:
+        print("\n\n🛑 Exiting...")
 
 if __name__ == "__main__":
     main()
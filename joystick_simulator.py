@@ -0,0 +1,655 @@
+#!/usr/bin/env python3
+"""
+JoystickShield Simulator
+Pty-backed fake serial device that speaks the firmware's text and binary protocols
+
+VirtualJoystickShield sends whatever a test tells it to. JoystickShieldSimulator
+runs a model of src/main.cpp's loop on a scripted or random stick trajectory,
+at the firmware's 10 Hz or far faster, for load and soak tests:
+
+    python joystick_simulator.py --rate 1000
+"""
+
+import io
+import math
+import os
+import random
+import select
+import threading
+import time
+
+import binary_protocol
+import device_commands
+import message_dispatch
+
+try:
+    import tty
+    PTY_AVAILABLE = True
+except ImportError:
+    PTY_AVAILABLE = False
+
+
+# Banner the firmware prints at startup and in reply to the identify command
+FIRMWARE_BANNER = "=== JoystickShield Game Controller ==="
+IDENTIFY_COMMAND = b"?"
+HEARTBEAT_LINE = "Arduino Heartbeat"
+
+
+class VirtualJoystickShield:
+    """Fake JoystickShield attached to a pseudo terminal (POSIX only)
+
+    With identify_reply set, a background thread answers the host's identify
+    command with that line, like the firmware does with its banner. Without
+    it the device ignores everything the host sends (a silent port). With
+    heartbeat_interval set, the same thread prints the firmware heartbeat
+    until pause_heartbeat() or close(). Everything the host writes goes
+    through on_host_data() on that thread.
+    """
+
+    def __init__(self, identify_reply=None, heartbeat_interval=None):
+        if not PTY_AVAILABLE:
+            raise RuntimeError("Pseudo terminals are not available on this platform")
+
+        self.master_fd, self.slave_fd = os.openpty()
+        # Raw mode so line endings pass through untouched
+        tty.setraw(self.slave_fd)
+        self.port_name = os.ttyname(self.slave_fd)
+
+        # Binary protocol frame counter
+        self.sequence = 0
+
+        self.identify_reply = identify_reply
+        self.identify_requests = 0
+        self.heartbeat_interval = heartbeat_interval
+        self.heartbeat_paused = False
+        self._closed = threading.Event()
+        self._responder = None
+        if identify_reply is not None or heartbeat_interval:
+            self._responder = threading.Thread(target=self._respond_loop, daemon=True)
+            self._responder.start()
+
+    def _respond_loop(self):
+        """Answer identify commands and send heartbeats until the device is closed"""
+        next_heartbeat = time.monotonic()
+        while not self._closed.is_set():
+            wait = 0.05
+            if self.heartbeat_interval:
+                now = time.monotonic()
+                if now >= next_heartbeat:
+                    next_heartbeat = now + self.heartbeat_interval
+                    if not self.heartbeat_paused:
+                        try:
+                            self.send_line(HEARTBEAT_LINE)
+                        except OSError:
+                            return
+                wait = min(wait, max(0.0, next_heartbeat - now))
+
+            try:
+                readable, _, _ = select.select([self.master_fd], [], [], wait)
+                if not readable:
+                    continue
+                data = os.read(self.master_fd, 1024)
+            except (OSError, ValueError):
+                break
+            try:
+                self.on_host_data(data)
+            except OSError:
+                return
+
+    def on_host_data(self, data):
+        """Bytes the host wrote: answer identify commands"""
+        if self.identify_reply is None:
+            return
+        for _ in range(data.count(IDENTIFY_COMMAND)):
+            self.identify_requests += 1
+            self.send_line(self.identify_reply)
+
+    def pause_heartbeat(self, paused=True):
+        """Stop (or resume) heartbeats while keeping the port open, like a hung board"""
+        self.heartbeat_paused = paused
+
+    def write(self, data):
+        """Write raw bytes to the host side, returns the write time"""
+        sent_at = time.perf_counter()
+        os.write(self.master_fd, data)
+        return sent_at
+
+    def send_line(self, line):
+        """Send one firmware line, as Serial.println would"""
+        return self.write(line.encode('utf-8') + b"\r\n")
+
+    def send_frame(self, events, x=0, y=0):
+        """Send one binary protocol frame"""
+        frame = binary_protocol.encode_frame(events, x, y, self.sequence)
+        self.sequence = (self.sequence + 1) & 0xFF
+        return self.write(frame)
+
+    def close(self):
+        """Close both ends of the pseudo terminal"""
+        self._closed.set()
+        if self._responder is not None:
+            self._responder.join(timeout=1.0)
+        for fd in (self.master_fd, self.slave_fd):
+            try:
+                os.close(fd)
+            except OSError:
+                pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+class RecordedSerialPort(io.RawIOBase):
+    """In-memory stand-in for serial.Serial that replays recorded chunks
+
+    Each chunk becomes visible in in_waiting once the previous one has been
+    consumed, the way bursts arrive from the device. Like serial.Serial it
+    is a raw I/O object, so readline() goes through read(1) per byte.
+    """
+
+    def __init__(self, chunks):
+        super().__init__()
+        self.chunks = list(chunks)
+        self.is_open = True
+        self.timeout = None
+        self._next_chunk = 0
+        self._data = b""
+        self._position = 0
+
+    def _available(self):
+        while self._position >= len(self._data) and self._next_chunk < len(self.chunks):
+            self._data = self.chunks[self._next_chunk]
+            self._position = 0
+            self._next_chunk += 1
+        return len(self._data) - self._position
+
+    @property
+    def in_waiting(self):
+        return self._available()
+
+    def read(self, size=1):
+        size = min(size, self._available())
+        data = self._data[self._position:self._position + size]
+        self._position += size
+        return data
+
+    def feed(self, data):
+        """Append a chunk, as if it had just arrived"""
+        self.chunks.append(data)
+
+    def readable(self):
+        return True
+
+    def close(self):
+        self.is_open = False
+        super().close()
+
+
+# Lines the firmware prints for every stick direction
+DIRECTION_LINES = [
+    "Joystick Up", "Joystick RightUp", "Joystick Right", "Joystick RightDown",
+    "Joystick Down", "Joystick LeftDown", "Joystick Left", "Joystick LeftUp",
+]
+
+# Lines the firmware prints for button clicks
+BUTTON_LINES = [
+    "Joystick Button Clicked", "Up Button Clicked", "Right Button Clicked",
+    "Down Button Clicked", "Left Button Clicked", "E Button Clicked", "F Button Clicked",
+]
+
+
+def synthetic_session_ticks(ticks, seed=0):
+    """Firmware loop ticks for a busy session
+
+    Yields (lines, not_center, x, y) per tick. Most ticks carry a direction
+    and a position; ticks also carry center transitions and button clicks
+    now and then.
+    """
+    rng = random.Random(seed)
+
+    not_center = False
+    for _ in range(ticks):
+        lines = []
+        x = y = 0
+        if rng.random() < 0.1:
+            lines.append(rng.choice(BUTTON_LINES))
+        if rng.random() < 0.9:
+            if not not_center:
+                lines.append("Joystick NotCenter")
+                not_center = True
+            lines.append(rng.choice(DIRECTION_LINES))
+            x, y = rng.randint(-100, 100), rng.randint(-100, 100)
+        elif not_center:
+            lines.append("Joystick Center")
+            lines.append("Joystick Centered")
+            not_center = False
+        yield lines, not_center, x, y
+
+
+def jittered_hold_records(holds, seed=0, interval=0.1, jitter=0.01, stall_chance=0.0, stall=0.15,
+                          center=True):
+    """Session records (seconds, bytes) of the stick held in one direction at a time
+
+    Each hold repeats its direction line every interval seconds with
+    Gaussian jitter, and now and then (stall_chance per line) a line is
+    held up by an extra stall seconds, like a busy USB link. With center
+    the firmware's Center line ends each hold, otherwise the lines just
+    stop. Returns (records, [(direction, last line time), ...]).
+    """
+    rng = random.Random(seed)
+    records = []
+    holds_ended = []
+    now = 0.5
+    for _ in range(holds):
+        direction = rng.choice(DIRECTION_LINES)
+        records.append((now, b"Joystick NotCenter\r\n"))
+        due = now
+        for _ in range(rng.randint(5, 30)):
+            arrival = due + max(0.0, rng.gauss(0.0, jitter))
+            if rng.random() < stall_chance:
+                arrival += stall * rng.random()
+            now = max(now, arrival)
+            records.append((now, (direction + "\r\n").encode('utf-8')))
+            due += interval
+        holds_ended.append((direction, now))
+        if center:
+            now += interval
+            records.append((now, b"Joystick Center\r\n"))
+        now += rng.uniform(0.5, 1.0)
+    return records, holds_ended
+
+
+def text_tick(lines, x, y):
+    """Bytes the text firmware prints for one loop tick"""
+    if x or y:
+        lines = lines + [f"Joystick Position -> X: {x}, Y: {y}"]
+    return "".join(line + "\r\n" for line in lines).encode('utf-8')
+
+
+def binary_tick(lines, not_center, x, y, sequence):
+    """Frame the binary firmware sends for one loop tick (nothing when idle)"""
+    if not lines and not x and not y:
+        return b""
+    messages = [line.encode('utf-8') for line in lines
+                if line.encode('utf-8') in binary_protocol.EVENT_MESSAGES]
+    events = binary_protocol.events_from_messages(messages, not_center)
+    return binary_protocol.encode_frame(events, x, y, sequence)
+
+
+def synthetic_session_chunks(ticks, seed=0, binary=False):
+    """Byte chunks for a busy session, one chunk per firmware loop tick"""
+    chunks = []
+    for sequence, (lines, not_center, x, y) in enumerate(synthetic_session_ticks(ticks, seed)):
+        if binary:
+            chunks.append(binary_tick(lines, not_center, x, y, sequence))
+        else:
+            chunks.append(text_tick(lines, x, y))
+    return chunks
+
+
+# Lines setup() prints before the first loop, after the banner
+STARTUP_LINES = ["Calibrating joystick...", "Calibration complete!", "Starting joystick and button detection...", ""]
+
+# Amplitudes inside this band read as 0 and count as centered (JoystickShield library)
+CENTER_BAND = 10
+
+# (horizontal, vertical) sign -> direction line
+DIRECTION_OF = {
+    (0, 1): "Joystick Up", (1, 1): "Joystick RightUp", (1, 0): "Joystick Right", (1, -1): "Joystick RightDown",
+    (0, -1): "Joystick Down", (-1, -1): "Joystick LeftDown", (-1, 0): "Joystick Left", (-1, 1): "Joystick LeftUp",
+}
+DIRECTION_BITS = {line: bit for bit, line in enumerate(DIRECTION_LINES)}
+
+BUTTON_EVENT_SHIFT = 8  # EVENT_JOYSTICK_BUTTON
+NOT_CENTER_BIT = 15  # EVENT_NOT_CENTER
+
+
+class FirmwareModel:
+    """What one loop() of src/main.cpp writes, for a given stick position and held buttons
+
+    buttons is a mask, bit i = message_dispatch.BUTTON_NAMES[i]. Text mode
+    prints the firmware's lines in its order (direction, held buttons'
+    Clicked, button edges, NotCenter/Center, position, Centered,
+    heartbeat); binary mode sends its frame. lines counts the text lines
+    written, heartbeats included. position, changes_only and heartbeat
+    are the settings the host changes with device commands.
+    """
+
+    def __init__(self, binary=False, heartbeat_interval=1.0):
+        self.binary = binary
+        self.heartbeat_interval = heartbeat_interval
+        self.position = True
+        self.changes_only = False
+        self.heartbeat = True
+        self.was_not_center = False
+        self.last_buttons = 0
+        self.last_events = 0
+        self.last_position = (0, 0)
+        self.sequence = 0
+        self.last_heartbeat = 0.0
+        self.lines = 0
+
+    def startup(self):
+        """Everything setup() prints"""
+        lines = [FIRMWARE_BANNER] + STARTUP_LINES
+        self.lines += len(lines) - 1
+        return "".join(line + "\r\n" for line in lines).encode('utf-8')
+
+    def tick(self, x, y, buttons, now):
+        """Bytes written by one loop at now (seconds since boot)"""
+        x = 0 if -CENTER_BAND <= x <= CENTER_BAND else max(-100, min(100, int(x)))
+        y = 0 if -CENTER_BAND <= y <= CENTER_BAND else max(-100, min(100, int(y)))
+        text = not self.binary
+        lines = []
+        events = 0
+        # Report-on-change: a direction or button held since the last loop is not repeated
+        repeated = self.last_events if self.changes_only else 0
+
+        direction = DIRECTION_OF.get(((x > 0) - (x < 0), (y > 0) - (y < 0)))
+        if direction is not None:
+            bit = 1 << DIRECTION_BITS[direction]
+            events |= bit
+            if text and not repeated & bit:
+                lines.append(direction)
+        for index, line in enumerate(BUTTON_LINES):
+            bit = 1 << (BUTTON_EVENT_SHIFT + index)
+            if buttons & (1 << index):
+                events |= bit
+                if text and not repeated & bit:
+                    lines.append(line)
+
+        changed = buttons ^ self.last_buttons
+        if text and changed:
+            for index, name in enumerate(message_dispatch.BUTTON_NAMES):
+                if changed & (1 << index):
+                    lines.append(f"{name} {'Pressed' if buttons & (1 << index) else 'Released'}")
+        self.last_buttons = buttons
+
+        not_center = direction is not None
+        centered = self.was_not_center and not not_center
+        center_changed = not_center != self.was_not_center
+        if text:
+            if not_center and not self.was_not_center:
+                lines.append("Joystick NotCenter")
+            elif centered:
+                lines.append("Joystick Center")
+        self.was_not_center = not_center
+
+        if not self.position:
+            x = y = 0
+        position_changed = (x, y) != self.last_position
+        self.last_position = (x, y)
+
+        frame = b""
+        if text:
+            if (x or y) and (not self.changes_only or position_changed):
+                lines.append(f"Joystick Position -> X: {x}, Y: {y}")
+            if centered:
+                lines.append("Joystick Centered")
+        else:
+            if not_center:
+                events |= 1 << NOT_CENTER_BIT
+            if self.changes_only:
+                send = events != self.last_events or position_changed
+            else:
+                send = events or center_changed or changed or x or y
+            if send:
+                frame = binary_protocol.encode_frame(events, x, y, self.sequence)
+                self.sequence = (self.sequence + 1) & 0xFF
+        self.last_events = events
+
+        if self.heartbeat and self.heartbeat_interval and now - self.last_heartbeat >= self.heartbeat_interval:
+            lines.append(HEARTBEAT_LINE)
+            self.last_heartbeat = now
+
+        self.lines += len(lines)
+        return frame + "".join(line + "\r\n" for line in lines).encode('utf-8')
+
+
+def button_mask(names):
+    """["E", "F Button", ...] -> button mask"""
+    mask = 0
+    for name in names:
+        if name not in message_dispatch.BUTTON_NAMES:
+            name = f"{name} Button"
+        mask |= 1 << message_dispatch.BUTTON_NAMES.index(name)
+    return mask
+
+
+class ScriptedTrajectory:
+    """Stick path from (seconds, x, y, buttons) segments, repeated when loop is set
+
+    The stick glides linearly from one segment's position to the next;
+    buttons are the names held during a segment.
+    """
+
+    def __init__(self, segments, loop=True):
+        if not segments:
+            raise ValueError("A trajectory needs at least one segment")
+        self.segments = [(float(seconds), x, y, button_mask(buttons)) for seconds, x, y, buttons in segments]
+        self.duration = sum(segment[0] for segment in self.segments)
+        self.loop = loop
+
+    def __call__(self, t):
+        if self.loop and self.duration > 0:
+            t %= self.duration
+        start = 0.0
+        for index, (seconds, x, y, buttons) in enumerate(self.segments):
+            if t < start + seconds or index == len(self.segments) - 1:
+                next_x, next_y = self.segments[(index + 1) % len(self.segments)][1:3] if self.loop else (x, y)
+                share = min(1.0, (t - start) / seconds) if seconds > 0 else 1.0
+                return x + (next_x - x) * share, y + (next_y - y) * share, buttons
+            start += seconds
+
+
+class RandomTrajectory:
+    """Seeded random play: the stick moves to a target, stays there, and buttons get pressed
+
+    Calls must come with non-decreasing t; the path is generated as it is
+    reached, so a soak test can run for hours.
+    """
+
+    def __init__(self, seed=0, move_time=(0.03, 0.3), hold_time=(0.1, 1.5), center_chance=0.3,
+                 button_chance=0.3):
+        self.rng = random.Random(seed)
+        self.move_time = move_time
+        self.hold_time = hold_time
+        self.center_chance = center_chance
+        self.button_chance = button_chance
+        self.start = 0.0
+        self.origin = (0.0, 0.0)
+        self._next_segment()
+
+    def _next_segment(self):
+        rng = self.rng
+        if rng.random() < self.center_chance:
+            target = (0.0, 0.0)
+        else:
+            angle = rng.uniform(0.0, 2 * math.pi)
+            radius = rng.uniform(20.0, 100.0)
+            target = (radius * math.cos(angle), radius * math.sin(angle))
+        self.target = target
+        self.move = rng.uniform(*self.move_time)
+        self.end = self.start + self.move + rng.uniform(*self.hold_time)
+        self.buttons = 0
+        if rng.random() < self.button_chance:
+            self.buttons = 1 << rng.randrange(len(message_dispatch.BUTTON_NAMES))
+
+    def __call__(self, t):
+        while t >= self.end:
+            self.origin = self.target
+            self.start = self.end
+            self._next_segment()
+        share = min(1.0, (t - self.start) / self.move)
+        (x0, y0), (x1, y1) = self.origin, self.target
+        return x0 + (x1 - x0) * share, y0 + (y1 - y0) * share, self.buttons
+
+
+class JoystickShieldSimulator(VirtualJoystickShield):
+    """A whole JoystickShield on a pty: boot output, the firmware loop and the identify reply
+
+    Runs the FirmwareModel at interval seconds (the firmware's 100 ms
+    sample interval, or much faster) on a trajectory, on absolute
+    deadlines. It answers the identify command like the firmware, so
+    PortDiscovery finds it when its port_name is listed (see
+    port_discovery.EXTRA_PORTS_ENV), and applies and acknowledges device
+    commands (device_commands.py); with supports_commands=False it ignores
+    them like firmware that predates them. When the host does not keep up,
+    output that does not fit the pty is dropped and counted in overruns
+    rather than blocking the loop.
+    """
+
+    def __init__(self, trajectory=None, interval=0.1, binary=False, heartbeat_interval=1.0, seed=0,
+                 supports_commands=True):
+        super().__init__(identify_reply=FIRMWARE_BANNER)
+        os.set_blocking(self.master_fd, False)
+        self.model = FirmwareModel(binary, heartbeat_interval)
+        self.trajectory = trajectory or RandomTrajectory(seed)
+        self.interval = interval
+        self.supports_commands = supports_commands
+        self.commands = []  # Command lines received, in order
+        self.ticks = 0
+        self.bytes_sent = 0
+        self.overruns = 0
+        self.late_ticks = 0
+        self._loop = None
+        self._command_line = bytearray()
+
+    def write(self, data):
+        sent_at = time.perf_counter()
+        try:
+            written = os.write(self.master_fd, data)
+        except BlockingIOError:
+            written = 0
+        self.bytes_sent += written
+        if written < len(data):
+            self.overruns += 1
+        return sent_at
+
+    def on_host_data(self, data):
+        """Identify probes and command lines, cut up like handleHostCommands() does"""
+        if not self.supports_commands:
+            super().on_host_data(data)
+            return
+        line = self._command_line
+        for byte in data:
+            if byte == IDENTIFY_COMMAND[0] and not line:
+                self.identify_requests += 1
+                self.send_line(self.identify_reply)
+            elif byte in b"\r\n":
+                if line.startswith(device_commands.COMMAND_PREFIX.encode('ascii')):
+                    reply = self.run_command(line.decode('ascii', errors='replace'))
+                    if reply is not None:
+                        self.send_line(reply)
+                line.clear()
+            else:
+                line.append(byte)
+
+    def run_command(self, line):
+        """Apply one "!<seq> <COMMAND> <value>" line, returns the ACK or NAK line"""
+        self.commands.append(line)
+        parts = line[1:].split()
+        if len(parts) < 2:
+            return None
+        sequence, command = parts[:2]
+        limits = device_commands.COMMAND_RANGES.get(command)
+        try:
+            value = int(parts[2])
+        except (IndexError, ValueError):
+            return f"NAK {sequence} {command} value"
+        if limits is None:
+            return f"NAK {sequence} {command} unknown"
+        if not limits[0] <= value <= limits[1]:
+            return f"NAK {sequence} {command} range"
+
+        model = self.model
+        if command == "INTERVAL":
+            self.interval = value / 1000
+        elif command == "POSITION":
+            model.position = bool(value)
+        elif command == "CHANGES":
+            model.changes_only = bool(value)
+        elif command == "HEARTBEAT":
+            model.heartbeat = bool(value)
+        return f"ACK {sequence} {command} {value}"
+
+    def start(self):
+        """Boot and start the firmware loop"""
+        if self._loop is None:
+            self._loop = threading.Thread(target=self._firmware_loop, daemon=True)
+            self._loop.start()
+        return self
+
+    def _firmware_loop(self):
+        self.write(self.model.startup())
+        booted = time.monotonic()
+        due = booted
+        while not self._closed.is_set():
+            now = time.monotonic() - booted
+            x, y, buttons = self.trajectory(now)
+            data = self.model.tick(x, y, buttons, now)
+            if data:
+                try:
+                    self.write(data)
+                except OSError:
+                    return
+            self.ticks += 1
+
+            due += self.interval
+            remaining = due - time.monotonic()
+            if remaining < -self.interval:
+                # A whole loop behind: resync instead of bursting
+                self.late_ticks += 1
+                due = time.monotonic()
+            elif remaining > 0 and self._closed.wait(remaining):
+                return
+
+    def close(self):
+        self._closed.set()
+        if self._loop is not None:
+            self._loop.join(timeout=1.0)
+        super().close()
+
+    def __enter__(self):
+        return self.start()
+
+
+def main():
+    import argparse
+    import json
+
+    parser = argparse.ArgumentParser(description="Simulated JoystickShield on a pseudo terminal")
+    parser.add_argument("--rate", type=float, default=10.0,
+                        help="Firmware loops per second (the real firmware runs 10)")
+    parser.add_argument("--binary", action="store_true", help="Speak the binary frame protocol")
+    parser.add_argument("--script", metavar="PATH",
+                        help="JSON list of [seconds, x, y, [buttons]] segments instead of random play")
+    parser.add_argument("--seed", type=int, default=0, help="Random play seed")
+    args = parser.parse_args()
+
+    trajectory = None
+    if args.script:
+        with open(args.script, "r", encoding="utf-8") as f:
+            trajectory = ScriptedTrajectory(json.load(f))
+
+    from port_discovery import EXTRA_PORTS_ENV
+
+    with JoystickShieldSimulator(trajectory, 1.0 / args.rate, args.binary, seed=args.seed) as device:
+        print(f"🕹️  Simulated JoystickShield on {device.port_name} at {args.rate:g} Hz "
+              f"({'binary' if args.binary else 'text'} protocol)")
+        print(f"   Let the controller find it: {EXTRA_PORTS_ENV}={device.port_name}")
+        print("⌨️  Press Ctrl+C to exit")
+        try:
+            while True:
+                time.sleep(5.0)
+                print(f"   {device.ticks} loops, {device.model.lines} lines, {device.bytes_sent} bytes, "
+                      f"{device.overruns} overruns")
+        except KeyboardInterrupt:
+            pass
+
+
+if __name__ == "__main__":
+    main()
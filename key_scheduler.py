@@ -0,0 +1,217 @@
+#!/usr/bin/env python3
+"""
+Key Scheduler
+Timer heap for key actions that must happen later (tap releases etc.)
+"""
+
+import heapq
+import itertools
+import math
+import threading
+import time
+
+
+class TimerHandle:
+    """A scheduled callback, can be cancelled until it has run"""
+
+    __slots__ = ("deadline", "callback", "args", "cancelled")
+
+    def __init__(self, deadline, callback, args):
+        self.deadline = deadline
+        self.callback = callback
+        self.args = args
+        self.cancelled = False
+
+
+class TimerScheduler:
+    """Min-heap of timers, run by whoever owns the event loop
+
+    The scheduler has no thread of its own: the owner asks for
+    time_until_next() to know how long it may sleep and calls run_due()
+    when it wakes up. Cancelled timers stay in the heap and are skipped.
+    """
+
+    def __init__(self, clock=time.monotonic):
+        self.clock = clock
+        self._heap = []
+        self._counter = itertools.count()
+        self._lock = threading.Lock()
+
+    def call_at(self, deadline, callback, *args):
+        """Run callback(*args) once the clock reaches deadline"""
+        handle = TimerHandle(deadline, callback, args)
+        with self._lock:
+            heapq.heappush(self._heap, (deadline, next(self._counter), handle))
+        return handle
+
+    def call_later(self, delay, callback, *args):
+        """Run callback(*args) after delay seconds"""
+        return self.call_at(self.clock() + delay, callback, *args)
+
+    def cancel(self, handle):
+        """Stop a timer from running"""
+        handle.cancelled = True
+
+    def next_deadline(self):
+        """Deadline of the earliest live timer, or None"""
+        with self._lock:
+            heap = self._heap
+            while heap and heap[0][2].cancelled:
+                heapq.heappop(heap)
+            return heap[0][0] if heap else None
+
+    def time_until_next(self):
+        """Seconds until the earliest live timer is due, or None"""
+        deadline = self.next_deadline()
+        if deadline is None:
+            return None
+        return max(0.0, deadline - self.clock())
+
+    def run_due(self, now=None):
+        """Run every timer whose deadline has passed, returns how many ran"""
+        if now is None:
+            now = self.clock()
+
+        ran = 0
+        while True:
+            with self._lock:
+                heap = self._heap
+                if not heap or heap[0][0] > now:
+                    break
+                handle = heapq.heappop(heap)[2]
+            if handle.cancelled:
+                continue
+            handle.cancelled = True
+            handle.callback(*handle.args)
+            ran += 1
+        return ran
+
+    def clear(self):
+        """Drop every pending timer without running it"""
+        with self._lock:
+            for _, _, handle in self._heap:
+                handle.cancelled = True
+            self._heap.clear()
+
+    def __len__(self):
+        with self._lock:
+            return sum(1 for _, _, handle in self._heap if not handle.cancelled)
+
+
+class DeadlineTracker:
+    """One deadline per key, re-armed on refresh and popped once expired
+
+    A heap orders the deadlines; re-arming a key leaves its old heap entry
+    behind, which is skipped because it no longer matches the key's
+    current deadline.
+    """
+
+    def __init__(self):
+        self.deadlines = {}
+        self._heap = []
+
+    def arm(self, key, deadline):
+        """Set (or move) the deadline of key"""
+        self.deadlines[key] = deadline
+        heapq.heappush(self._heap, (deadline, key))
+
+    def disarm(self, key):
+        """Forget the deadline of key"""
+        self.deadlines.pop(key, None)
+
+    def clear(self):
+        """Forget every deadline"""
+        self.deadlines.clear()
+        self._heap.clear()
+
+    def next_deadline(self):
+        """Earliest live deadline, or None"""
+        heap = self._heap
+        deadlines = self.deadlines
+        while heap and deadlines.get(heap[0][1]) != heap[0][0]:
+            heapq.heappop(heap)
+        return heap[0][0] if heap else None
+
+    def pop_expired(self, now):
+        """Remove and return every key whose deadline is not after now"""
+        heap = self._heap
+        if not heap or heap[0][0] > now:
+            return ()
+
+        expired = []
+        deadlines = self.deadlines
+        while heap and heap[0][0] <= now:
+            deadline, key = heapq.heappop(heap)
+            if deadlines.get(key) == deadline:
+                del deadlines[key]
+                expired.append(key)
+        return expired
+
+    def __contains__(self, key):
+        return key in self.deadlines
+
+    def __len__(self):
+        return len(self.deadlines)
+
+
+class RepeatCadence:
+    """Learns how often a repeated message arrives and derives a timeout from it
+
+    Keeps an exponentially weighted mean and variance of the interval
+    between observations. Intervals longer than maximum are gaps (the
+    message stopped and started again), not cadence, and are skipped. The
+    timeout is mean + deviations * standard deviation + margin, clamped to
+    [minimum, maximum]: just long enough that normal link jitter never
+    lets it expire between two repeats.
+    """
+
+    def __init__(self, initial=0.1, minimum=0.12, maximum=0.4, alpha=0.1, deviations=4.0, margin=0.01):
+        self.minimum = minimum
+        self.maximum = maximum
+        self.alpha = alpha
+        self.deviations = deviations
+        self.margin = margin
+        self.mean = initial
+        self.variance = 0.0
+        self.samples = 0
+        self.last = None
+
+    def observe(self, now):
+        """The message arrived at now, returns the updated timeout"""
+        last = self.last
+        self.last = now
+        if last is not None:
+            interval = now - last
+            if 0 < interval <= self.maximum:
+                difference = interval - self.mean
+                increment = self.alpha * difference
+                self.mean += increment
+                self.variance = (1 - self.alpha) * (self.variance + difference * increment)
+                self.samples += 1
+        return self.timeout()
+
+    def reset(self):
+        """The message stopped on purpose, the next interval is not cadence"""
+        self.last = None
+
+    def timeout(self):
+        timeout = self.mean + self.deviations * math.sqrt(self.variance) + self.margin
+        return min(self.maximum, max(self.minimum, timeout))
+
+
+class ManualClock:
+    """Clock that only moves when told to, for tests and replays"""
+
+    def __init__(self, start=0.0):
+        self.now = start
+
+    def __call__(self):
+        return self.now
+
+    def advance(self, seconds):
+        """Move the clock forward by seconds"""
+        self.now += seconds
+
+    def set(self, now):
+        """Move the clock forward to now (never backwards)"""
+        self.now = max(self.now, now)
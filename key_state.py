@@ -0,0 +1,103 @@
+#!/usr/bin/env python3
+"""
+Key State
+Held keys as an integer bitmask, key transitions as mask arithmetic
+"""
+
+import threading
+
+# Distinct (release, press) batches kept in the transition cache
+TRANSITION_CACHE_SIZE = 4096
+
+
+class KeyState:
+    """Bitmask of held keys over a fixed key index
+
+    Every key gets one bit, in the order it was first seen (the controller
+    seeds the index from vk_codes). Moving the held keys of a scope to a
+    target mask is
+
+        held    = mask & scope
+        changed = held ^ target
+        release = changed & held
+        press   = changed & target
+
+    and the (key, down) batch for a (release, press) pair is cached. The
+    lock is re-entrant and must be held by anyone who diffs, injects and
+    applies, so the listener thread and stop() never interleave.
+    """
+
+    def __init__(self, keys=()):
+        self.bits = {}
+        self.names = []
+        self.mask = 0
+        self.lock = threading.RLock()
+        self._transitions = {}
+        for key in keys:
+            self.bit(key)
+
+    def bit(self, key):
+        """Bit of key, assigning the next free one to unknown keys"""
+        bit = self.bits.get(key)
+        if bit is None:
+            with self.lock:
+                bit = self.bits.get(key)
+                if bit is None:
+                    bit = self.bits[key] = 1 << len(self.names)
+                    self.names.append(key)
+        return bit
+
+    def mask_of(self, keys):
+        """Mask of a key name or a list of key names"""
+        if isinstance(keys, str):
+            return self.bit(keys)
+        mask = 0
+        for key in keys:
+            mask |= self.bit(key)
+        return mask
+
+    def keys_of(self, mask):
+        """Key names of the bits set in mask, lowest bit first"""
+        names = self.names
+        keys = []
+        while mask:
+            lowest = mask & -mask
+            keys.append(names[lowest.bit_length() - 1])
+            mask ^= lowest
+        return keys
+
+    def is_pressed(self, key):
+        bit = self.bits.get(key)
+        return bit is not None and self.mask & bit != 0
+
+    __contains__ = is_pressed
+
+    def held_keys(self):
+        return self.keys_of(self.mask)
+
+    def diff(self, target, scope=-1):
+        """(release, press) masks that move the held keys of scope to target"""
+        held = self.mask & scope
+        changed = held ^ target
+        return changed & held, changed & target
+
+    def transitions(self, release, press):
+        """(key, down) batch for release and press masks, releases first"""
+        cache_key = (release, press)
+        batch = self._transitions.get(cache_key)
+        if batch is None:
+            batch = tuple([(key, False) for key in self.keys_of(release)] +
+                          [(key, True) for key in self.keys_of(press)])
+            if len(self._transitions) < TRANSITION_CACHE_SIZE:
+                self._transitions[cache_key] = batch
+        return batch
+
+    def apply(self, release, press):
+        """Record that release was released and press was pressed"""
+        self.mask = (self.mask & ~release) | press
+
+    def clear(self):
+        """Forget every held key, returns the mask that was held"""
+        held = self.mask
+        self.mask = 0
+        return held
@@ -0,0 +1,178 @@
+#!/usr/bin/env python3
+"""
+Latency Metrics
+Fixed-bucket latency histograms for the controller's hot path
+
+Each serial batch is stamped when it is read, each message when it is
+parsed and dispatched, and each key when it is injected. The deltas go
+into histograms per stage and per event type:
+
+    read_to_parse       bytes read -> message looked up in the dispatch table
+    parse_to_dispatch   lookup -> handler called
+    dispatch_to_inject  handler called -> keybd_event / keyboard call
+    read_to_inject      end to end
+
+plus plain durations of the focus check, the injection call, press_keys and
+reconnects after a lost link.
+The controller keeps metrics = None when instrumentation is off, so the
+hot path pays a single attribute check.
+"""
+
+import bisect
+import json
+import time
+
+# Bucket upper bounds in microseconds; one more bucket catches everything above
+BUCKET_BOUNDS_US = [
+    1, 2, 5, 10, 20, 50, 100, 200, 500,
+    1000, 2000, 5000, 10000, 20000, 50000,
+    100000, 200000, 500000, 1000000,
+    2000000, 5000000, 10000000,
+]
+
+
+class LatencyHistogram:
+    """Counts of latencies in fixed buckets, plus count, sum and max"""
+
+    __slots__ = ("counts", "count", "total_ns", "max_ns")
+
+    BOUNDS_NS = [bound * 1000 for bound in BUCKET_BOUNDS_US]
+
+    def __init__(self):
+        self.counts = [0] * (len(BUCKET_BOUNDS_US) + 1)
+        self.count = 0
+        self.total_ns = 0
+        self.max_ns = 0
+
+    def record(self, ns):
+        self.counts[bisect.bisect_left(self.BOUNDS_NS, ns)] += 1
+        self.count += 1
+        self.total_ns += ns
+        if ns > self.max_ns:
+            self.max_ns = ns
+
+    def percentile_us(self, fraction):
+        """Upper bound of the bucket holding the given fraction of samples"""
+        if not self.count:
+            return 0
+        target = fraction * self.count
+        seen = 0
+        for index, bucket_count in enumerate(self.counts):
+            seen += bucket_count
+            if seen >= target:
+                if index < len(BUCKET_BOUNDS_US):
+                    return BUCKET_BOUNDS_US[index]
+                break
+        return self.max_ns / 1000
+
+    def to_dict(self):
+        buckets = {}
+        for index, bucket_count in enumerate(self.counts):
+            if bucket_count:
+                label = f"<={BUCKET_BOUNDS_US[index]}us" if index < len(BUCKET_BOUNDS_US) else "overflow"
+                buckets[label] = bucket_count
+        return {
+            "count": self.count,
+            "mean_us": round(self.total_ns / self.count / 1000, 3) if self.count else 0,
+            "p50_us": self.percentile_us(0.50),
+            "p99_us": self.percentile_us(0.99),
+            "max_us": round(self.max_ns / 1000, 3),
+            "buckets": buckets,
+        }
+
+
+class LatencyMetrics:
+    """Hot-path timestamps accumulated into per-stage, per-event histograms"""
+
+    def __init__(self, clock_ns=time.perf_counter_ns):
+        self.clock_ns = clock_ns
+        self.started_ns = clock_ns()
+        self.histograms = {}
+
+        # Timestamps of the event being processed right now
+        self.read_ns = None
+        self.parse_ns = None
+        self.dispatch_ns = None
+        self.kind = None
+
+        # Plain counters (dropped frames, reconnects, ...)
+        self.counters = {}
+
+    def histogram(self, name, kind="all"):
+        """Histogram for one stage and event type, created on first use"""
+        key = (name, kind)
+        histogram = self.histograms.get(key)
+        if histogram is None:
+            histogram = self.histograms[key] = LatencyHistogram()
+        return histogram
+
+    def mark_read(self):
+        """A batch of serial data has just been read"""
+        self.read_ns = self.clock_ns()
+
+    def mark_parsed(self, kind):
+        """One message of the batch has been looked up"""
+        now = self.clock_ns()
+        self.kind = kind
+        self.parse_ns = now
+        if self.read_ns is not None:
+            self.histogram("read_to_parse", kind).record(now - self.read_ns)
+
+    def mark_dispatched(self):
+        """The message's handler is about to run"""
+        now = self.clock_ns()
+        self.dispatch_ns = now
+        if self.parse_ns is not None:
+            self.histogram("parse_to_dispatch", self.kind).record(now - self.parse_ns)
+
+    def mark_injected(self):
+        """A key is about to be sent to the OS"""
+        now = self.clock_ns()
+        if self.dispatch_ns is not None:
+            self.histogram("dispatch_to_inject", self.kind).record(now - self.dispatch_ns)
+        if self.read_ns is not None:
+            self.histogram("read_to_inject", self.kind).record(now - self.read_ns)
+
+    def end_batch(self):
+        """Forget the batch, later injections (timers) have no serial origin"""
+        self.read_ns = self.parse_ns = self.dispatch_ns = None
+        self.kind = None
+
+    def record_duration(self, name, started_ns):
+        """Record how long a section took, given its start timestamp"""
+        self.histogram(name).record(self.clock_ns() - started_ns)
+
+    def increment(self, name, amount=1):
+        self.counters[name] = self.counters.get(name, 0) + amount
+
+    def snapshot(self):
+        """All histograms and counters as a JSON-ready dict"""
+        histograms = {}
+        for (name, kind), histogram in sorted(list(self.histograms.items())):
+            histograms[f"{name}/{kind}"] = histogram.to_dict()
+        return {
+            "uptime_s": round((self.clock_ns() - self.started_ns) / 1e9, 3),
+            "counters": dict(self.counters),
+            "histograms": histograms,
+        }
+
+    def to_json(self):
+        return json.dumps(self.snapshot(), indent=2)
+
+    def dump(self, path):
+        """Write the snapshot to a JSON file"""
+        with open(path, "w", encoding="utf-8") as f:
+            f.write(self.to_json())
+
+    def summary_lines(self):
+        """One line per end-to-end histogram, for the periodic summary"""
+        lines = []
+        for (name, kind), histogram in sorted(list(self.histograms.items())):
+            if name in ("read_to_inject", "focus_check", "inject_call", "press_keys", "reconnect") and histogram.count:
+                lines.append(f"{name}/{kind}: n={histogram.count} "
+                             f"p50<={histogram.percentile_us(0.5)}us p99<={histogram.percentile_us(0.99)}us "
+                             f"max={histogram.max_ns / 1000:.0f}us")
+        if "timeout_releases" in self.counters:
+            lines.append(f"direction timeouts: {self.counters['timeout_releases']} releases, "
+                         f"{self.counters.get('spurious_represses', 0)} spurious re-presses")
+        return lines
@@ -0,0 +1,139 @@
+#!/usr/bin/env python3
+"""
+Message Dispatch
+Compiles the key mapping into an exact-match table of wire messages
+"""
+
+# Action kinds
+IGNORE = "ignore"
+UNKNOWN = "unknown"
+DIRECTION = "direction"
+CLICK = "click"
+HOLD = "hold"
+CENTER = "center"
+NOT_CENTER = "not_center"
+POSITION = "position"
+BUTTON_DOWN = "button_down"
+BUTTON_UP = "button_up"
+REPLY = "reply"
+
+# System information printed by the firmware at startup
+SYSTEM_MESSAGES = [
+    "=== JoystickShield Game Controller ===",
+    "Calibrating joystick...",
+    "Calibration complete!",
+    "Starting joystick and button detection...",
+    "Arduino Heartbeat",
+]
+HEARTBEAT_MESSAGE = "Arduino Heartbeat"
+
+# Joystick returned to center ("Joystick Centered" is the firmware's second report)
+CENTER_MESSAGES = ["Joystick Center", "Joystick Centered"]
+NOT_CENTER_MESSAGE = "Joystick NotCenter"
+
+# Buttons in the order of the binary frame's event bits 8..14; the text
+# firmware prints "<button> Pressed" and "<button> Released" on every edge
+BUTTON_NAMES = ["Joystick Button", "Up Button", "Right Button", "Down Button",
+                "Left Button", "E Button", "F Button"]
+
+# Prefixes that still need parsing after the exact lookup misses
+POSITION_PREFIX = b"Joystick Position -> "
+TIMESTAMP_SEPARATOR = b" > "
+# Replies to host commands ("ACK 3 INTERVAL 2", "NAK 4 INTERVAL range"), see device_commands.py
+REPLY_PREFIXES = (b"ACK ", b"NAK ")
+
+
+class MessageAction:
+    """Prebuilt action for one wire message, mask is its keys as a key-state bitmask"""
+
+    __slots__ = ("kind", "message", "keys", "button", "mask")
+
+    def __init__(self, kind, message, keys=(), button=None):
+        self.kind = kind
+        self.message = message
+        self.keys = tuple(keys)
+        self.button = button
+        self.mask = 0
+
+    def __repr__(self):
+        return f"MessageAction({self.kind!r}, {self.message!r}, keys={self.keys!r})"
+
+
+def classify_mapping(message, keys):
+    """Build the action for one key_mapping entry"""
+    if isinstance(keys, str):
+        keys = [keys]
+
+    if message == NOT_CENTER_MESSAGE:
+        return MessageAction(NOT_CENTER, message)
+    if not keys:
+        return MessageAction(UNKNOWN, message)
+    if message.endswith(" Clicked"):
+        return MessageAction(CLICK, message, keys, button=message[:-len(" Clicked")])
+    if message.startswith("Joystick "):
+        return MessageAction(DIRECTION, message, keys)
+    return MessageAction(HOLD, message, keys)
+
+
+class DispatchTable:
+    """Exact-match table from raw line bytes to a prebuilt MessageAction
+
+    Only lines that miss the table are looked at again: timestamped lines
+    (PlatformIO monitor "HH:MM:SS.mmm > message") have the prefix removed
+    and are looked up once more, position lines become POSITION actions and
+    everything else is UNKNOWN.
+
+    key_mask, if given, turns a list of keys into a bitmask and is used to
+    precompute each action's mask.
+    """
+
+    def __init__(self, key_mapping, key_mask=None):
+        self.actions = {}
+
+        for message in SYSTEM_MESSAGES:
+            self._add(MessageAction(IGNORE, message))
+        for message in CENTER_MESSAGES:
+            self._add(MessageAction(CENTER, message))
+        for button in BUTTON_NAMES:
+            self._add(MessageAction(BUTTON_DOWN, f"{button} Pressed", button=button))
+            self._add(MessageAction(BUTTON_UP, f"{button} Released", button=button))
+        for message, keys in key_mapping.items():
+            action = classify_mapping(message, keys)
+            if key_mask is not None and action.keys:
+                action.mask = key_mask(action.keys)
+            self._add(action)
+
+    def _add(self, action):
+        self.actions[action.message.encode('utf-8')] = action
+
+    def lookup(self, line):
+        """Return the action for one line (bytes, without line ending)"""
+        action = self.actions.get(line)
+        if action is not None:
+            return action
+        return self._lookup_fallback(line)
+
+    def _lookup_fallback(self, line):
+        if line.startswith(POSITION_PREFIX):
+            return MessageAction(POSITION, line.decode('utf-8', errors='ignore'))
+        if line.startswith(REPLY_PREFIXES):
+            return MessageAction(REPLY, line.decode('utf-8', errors='ignore'))
+
+        stripped = line.strip()
+        if stripped != line:
+            line = stripped
+            action = self.actions.get(line)
+            if action is not None:
+                return action
+
+        separator = line.find(TIMESTAMP_SEPARATOR)
+        if separator != -1:
+            line = line[separator + len(TIMESTAMP_SEPARATOR):].strip()
+            action = self.actions.get(line)
+            if action is not None:
+                return action
+
+        message = line.decode('utf-8', errors='ignore')
+        if line.startswith(POSITION_PREFIX):
+            return MessageAction(POSITION, message)
+        return MessageAction(UNKNOWN, message)
@@ -0,0 +1,178 @@
+#!/usr/bin/env python3
+"""
+Mouse Output
+Stick-to-mouse camera control on a dedicated fixed-rate tick
+
+The position stream only sets the latest stick position. A separate
+thread ticks at a fixed rate (250-1000 Hz), turns the position into a
+velocity (radial deadzone and acceleration curve from a lookup table),
+smooths it and integrates it into relative mouse moves for the output
+backend. Sub-pixel remainders are carried from tick to tick, so slow
+movement still adds up to whole pixels.
+
+The tick loop allocates no containers: per-tick state lives in plain
+attributes and the velocity table is built once.
+"""
+
+import math
+import sys
+import threading
+import time
+
+import analog_movement
+import controller_logging
+
+log = controller_logging.get_logger()
+
+DEFAULT_RATE = 500  # Ticks per second
+DEFAULT_SPEED = 1200.0  # Pixels per second at full deflection
+DEFAULT_CURVE = 2.0  # Acceleration exponent: small pushes aim finely, full pushes turn fast
+DEFAULT_SMOOTHING = 0.03  # Velocity smoothing time constant (seconds), 0 for none
+
+
+def _high_resolution_timer(enable):
+    """Ask Windows for 1 ms sleep granularity (the default is about 15.6 ms)"""
+    if not sys.platform.startswith("win"):
+        return
+    try:
+        import ctypes
+        winmm = ctypes.windll.winmm
+        if enable:
+            winmm.timeBeginPeriod(1)
+        else:
+            winmm.timeEndPeriod(1)
+    except (AttributeError, OSError):
+        pass
+
+
+class StickMouse:
+    """Moves the mouse from the latest stick position at a fixed tick rate
+
+    update(x, y) may be called from any thread. A position older than
+    stale_after seconds counts as centered; stale_after may also be a
+    callable, read on every tick, so it follows a timeout that changes.
+    allowed, if set, is called before every move and can veto it (e.g.
+    the console has focus).
+    """
+
+    def __init__(self, output, rate=DEFAULT_RATE, speed=DEFAULT_SPEED,
+                 deadzone=analog_movement.DEFAULT_DEADZONE, curve=DEFAULT_CURVE,
+                 smoothing=DEFAULT_SMOOTHING, stale_after=0.15, allowed=None, clock=time.perf_counter):
+        if rate <= 0:
+            raise ValueError("The mouse tick rate must be positive")
+        if not output.supports_mouse:
+            raise ValueError(f"The {output.name} output cannot move the mouse")
+        self.output = output
+        self.rate = rate
+        self.period = 1.0 / rate
+        self.speed = speed
+        self.stale_after = stale_after
+        self.allowed = allowed
+        self.clock = clock
+
+        # Pixels per tick along each axis, per stick position
+        scale = speed * self.period
+        self.table = [(dx * scale, dy * scale) for dx, dy in
+                      analog_movement.build_duty_table(deadzone, curve, square=False)]
+        # Share of the distance to the target velocity covered per tick
+        self.alpha = 1.0 - math.exp(-self.period / smoothing) if smoothing > 0 else 1.0
+
+        self.target = self.table[analog_movement.position_index(0, 0)]
+        self.updated_at = None
+        self.velocity_x = 0.0
+        self.velocity_y = 0.0
+        self.remainder_x = 0.0
+        self.remainder_y = 0.0
+
+        # Tick statistics, updated in place
+        self.ticks = 0
+        self.moves = 0
+        self.late_ticks = 0
+        self.max_lateness = 0.0
+
+        self._stop = threading.Event()
+        self._thread = None
+
+    def update(self, x, y):
+        """Latest stick position (-100..100 per axis, +Y is up)"""
+        self.target = self.table[analog_movement.position_index(x, y)]
+        self.updated_at = self.clock()
+
+    def tick(self, now):
+        """Advance one period, returns True if the mouse moved"""
+        self.ticks += 1
+        stale_after = self.stale_after
+        if callable(stale_after):
+            stale_after = stale_after()
+        if self.updated_at is None or now - self.updated_at > stale_after:
+            target_x = target_y = 0.0
+        else:
+            target_x, target_y = self.target
+
+        alpha = self.alpha
+        self.velocity_x += (target_x - self.velocity_x) * alpha
+        self.velocity_y += (target_y - self.velocity_y) * alpha
+        if target_x == 0.0 and target_y == 0.0 and abs(self.velocity_x) + abs(self.velocity_y) < 0.01:
+            # Settled at rest: drop the tail and any partial pixel
+            self.velocity_x = self.velocity_y = 0.0
+            self.remainder_x = self.remainder_y = 0.0
+            return False
+
+        # Screen Y grows downwards, stick Y upwards
+        total_x = self.remainder_x + self.velocity_x
+        total_y = self.remainder_y - self.velocity_y
+        dx = int(total_x)
+        dy = int(total_y)
+        self.remainder_x = total_x - dx
+        self.remainder_y = total_y - dy
+        if not (dx or dy):
+            return False
+        if self.allowed is not None and not self.allowed():
+            return False
+        self.moves += 1
+        return self.output.move_mouse(dx, dy)
+
+    def run(self):
+        """Tick until stop(), on absolute deadlines so the rate does not drift"""
+        clock = self.clock
+        period = self.period
+        wait = self._stop.wait
+        deadline = clock()
+        _high_resolution_timer(True)
+        try:
+            while True:
+                deadline += period
+                remaining = deadline - clock()
+                if remaining > 0:
+                    if wait(remaining):
+                        break
+                elif self._stop.is_set():
+                    break
+                now = clock()
+                lateness = now - deadline
+                if lateness > self.max_lateness:
+                    self.max_lateness = lateness
+                if lateness > period:
+                    # Fell a whole tick behind: resync instead of bursting
+                    self.late_ticks += 1
+                    deadline = now
+                try:
+                    self.tick(now)
+                except Exception as e:
+                    log.error("❌ Mouse output error: %s", e)
+        finally:
+            _high_resolution_timer(False)
+
+    def start(self):
+        if self._thread is not None:
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self.run, daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        if self._thread is None:
+            return
+        self._stop.set()
+        self._thread.join(timeout=1.0)
+        self._thread = None
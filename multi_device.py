@@ -0,0 +1,418 @@
+#!/usr/bin/env python3
+"""
+Multi Device
+Several JoystickShields on one controller, multiplexed on a single selector loop
+
+Every device gets its own GameJoystickController (profile, key state,
+timers, turbo, combos), but there is one listener thread for all of them:
+a selectors loop waits on every port's file descriptor and on the
+earliest timer or liveness deadline of any device, and hands each ready
+port's lines to its controller.
+
+All devices inject through one SharedOutput. It serializes the backend
+calls and counts per key how many devices hold it, so when two players
+map the same key one of them letting go does not release it under the
+other.
+
+There is one ProfileManager, and so one profile directory watcher, for
+all devices. Each switch or reload is compiled against every device's
+key state and handed to that device's controller, which swaps it in on
+the listener thread between two batches. A device added with a profile
+name keeps that profile whatever window is in the foreground.
+
+Usage: python multi_device.py [--device PORT[=PROFILE] ...]
+"""
+
+import argparse
+import copy
+import selectors
+import sys
+import threading
+import time
+
+import serial
+
+import controller_logging
+import focus_tracker
+import game_profiles
+import output_backends
+from game_profiles import PROFILE_DIR, ProfileError, ProfileManager
+from joystick_controller_final import GameJoystickController
+from key_state import KeyState
+from output_backends import OutputBackend
+from port_discovery import PortDiscovery
+from serial_reader import SerialLineReader
+
+log = controller_logging.get_logger()
+
+
+class SharedOutput:
+    """One backend shared by every device, one batch at a time"""
+
+    def __init__(self, backend):
+        self.backend = backend
+        self.name = backend.name
+        self.supports_mouse = backend.supports_mouse
+        self.lock = threading.Lock()
+        self.holders = {}  # key -> number of devices holding it down
+
+    def view(self, device_name):
+        """Output backend for one device's controller"""
+        return DeviceOutput(self, device_name)
+
+    def send(self, transitions):
+        """Forward the transitions that change what the OS sees"""
+        with self.lock:
+            holders = self.holders
+            previous = [(key, holders.get(key, 0)) for key, _ in transitions]
+            forwarded = []
+            for key, down in transitions:
+                count = holders.get(key, 0)
+                if down:
+                    holders[key] = count + 1
+                    if count:
+                        continue
+                elif count > 1:
+                    holders[key] = count - 1
+                    continue
+                else:
+                    holders.pop(key, None)
+                forwarded.append((key, down))
+            if not forwarded or self.backend.send(forwarded):
+                return True
+            # Nothing changed for the OS, so nothing changed for the other devices either
+            for key, count in reversed(previous):
+                if count:
+                    holders[key] = count
+                else:
+                    holders.pop(key, None)
+            return False
+
+    def move_mouse(self, dx, dy):
+        with self.lock:
+            return self.backend.move_mouse(dx, dy)
+
+    def register_keys(self, vk_codes):
+        with self.lock:
+            self.backend.register_keys(vk_codes)
+
+    def supports_vk_code(self, vk_code):
+        return self.backend.supports_vk_code(vk_code)
+
+    def close(self):
+        self.backend.close()
+
+
+class DeviceOutput(OutputBackend):
+    """A device's handle on the SharedOutput, named after the device in key logs"""
+
+    def __init__(self, shared, device_name):
+        self.shared = shared
+        self.name = f"{device_name} {shared.name}"
+        self.supports_mouse = shared.supports_mouse
+
+    def send(self, transitions):
+        return self.shared.send(transitions)
+
+    def supports(self, key):
+        return self.shared.backend.supports(key)
+
+    def register_keys(self, vk_codes):
+        self.shared.register_keys(vk_codes)
+
+    def supports_vk_code(self, vk_code):
+        return self.shared.supports_vk_code(vk_code)
+
+    def move_mouse(self, dx, dy):
+        return self.shared.move_mouse(dx, dy)
+
+    def close(self):
+        """The shared backend is closed once, by MultiDeviceController.stop()"""
+
+
+class Device:
+    """One attached JoystickShield"""
+
+    __slots__ = ("name", "controller", "reader", "forced", "source")
+
+    def __init__(self, name, controller, forced=None):
+        self.name = name
+        self.controller = controller
+        self.reader = None
+        self.forced = forced  # Profile name used whatever window has focus
+        self.source = None  # Shared profile the controller's compiled copy was made from
+
+
+class MultiDeviceController:
+    """Runs N device controllers on one listener thread and one output backend"""
+
+    # Longest select() when nothing is due, so stop() is noticed
+    IDLE_WAIT = SerialLineReader.IDLE_WAIT
+    # Ports without a file descriptor (Windows) are polled this often
+    POLL_INTERVAL = 0.01
+
+    def __init__(self, output, clock=time.monotonic):
+        self.shared_output = SharedOutput(output)
+        self.clock = clock
+        self.devices = []
+        self.is_running = False
+        self.stopped = threading.Event()
+        self.selector = selectors.DefaultSelector()
+        self.polled = []  # Devices whose port cannot be selected on
+        self.focus_tracker = focus_tracker.create_focus_tracker()
+        self.profile_manager = None
+        self._listener = None
+
+    def load_profiles(self, directory=PROFILE_DIR):
+        """Load and watch the profile directory shared by every device
+
+        Returns False when it holds no usable profile; devices then keep
+        the built-in mapping unless they name a profile that shows up later.
+        """
+        if directory == PROFILE_DIR:
+            game_profiles.seed_profile_dir(directory)
+        self.profile_manager = ProfileManager(
+            directory, KeyState(output_backends.VK_CODES), output_backends.VK_CODES,
+            GameJoystickController.DIRECTION_KEYS, on_switch=self.on_profile_switch,
+            focus_tracker=self.focus_tracker, output=self.shared_output, on_reload=self.on_profiles_reloaded)
+        if self.profile_manager.poll() is None:
+            print(f"⚠️  No usable profile in {directory}, using the built-in mapping")
+            return False
+        return True
+
+    def on_profile_switch(self, profile):
+        """The foreground profile changed or was reloaded (watcher thread)"""
+        self.dispatch_profiles(profile)
+
+    def on_profiles_reloaded(self, profiles):
+        """Files were reloaded: devices with a fixed profile may need the new version"""
+        self.dispatch_profiles()
+
+    def dispatch_profiles(self, active=None):
+        """Hand each device the profile it should use, compiled for its key state
+
+        Devices without a fixed profile follow active; with active=None
+        only devices with a fixed profile are looked at.
+        """
+        for device in list(self.devices):
+            if device.forced:
+                profile = self.profile_manager.find(device.forced)
+            else:
+                profile = active
+            if profile is None or profile is device.source:
+                continue
+            controller = device.controller
+            try:
+                compiled = copy.copy(profile).compile(controller.key_state, controller.DIRECTION_KEYS)
+            except ProfileError as e:
+                log.error("❌ %s: profile %s not used: %s", device.name, profile.name, e)
+                continue
+            device.source = profile
+            controller.switch_profile(compiled)
+
+    def add_device(self, port, name=None, profile=None):
+        """Attach an open serial port, returns the device's controller
+
+        The device uses the shared profiles of load_profiles(), or always
+        the one named profile; without load_profiles() it keeps the
+        built-in mapping.
+        """
+        name = name or f"P{len(self.devices) + 1}"
+        controller = GameJoystickController(clock=self.clock, output=self.shared_output.view(name))
+        controller.focus_tracker = self.focus_tracker
+        controller.auto_reconnect = False
+        controller.attach_serial_port(port)
+
+        device = Device(name, controller, forced=profile)
+        self.devices.append(device)
+        if self.profile_manager is not None:
+            self.dispatch_profiles(self.profile_manager.active)
+            if profile and device.source is None:
+                print(f"⚠️  {name}: no profile named {profile}, using the built-in mapping")
+        if self.is_running:
+            self._watch(device)
+        return controller
+
+    def _watch(self, device):
+        device.reader = SerialLineReader(device.controller.serial_port)
+        device.controller.is_running = True
+        device.controller.mark_link_alive()
+        device.controller.restore_device_settings()
+        if device.reader.fd is not None:
+            self.selector.register(device.reader.fd, selectors.EVENT_READ, device)
+        else:
+            self.polled.append(device)
+
+    def detach(self, device):
+        """Drop a device whose link is gone, releasing its keys; the others keep running"""
+        if device.reader is not None and device.reader.fd is not None:
+            try:
+                self.selector.unregister(device.reader.fd)
+            except (KeyError, ValueError):
+                pass
+        if device in self.polled:
+            self.polled.remove(device)
+        self.devices.remove(device)
+        device.controller.is_running = False
+        device.controller.on_link_lost()
+        log.error("🔌 %s detached, %d device(s) left", device.name, len(self.devices))
+
+    def next_timeout(self):
+        """Seconds until the earliest timer or liveness deadline of any device"""
+        deadline = None
+        for device in self.devices:
+            controller = device.controller
+            for candidate in (controller.next_wakeup(), controller.liveness_deadline()):
+                if candidate is not None and (deadline is None or candidate < deadline):
+                    deadline = candidate
+        timeout = self.IDLE_WAIT if deadline is None else min(self.IDLE_WAIT, deadline - self.clock())
+        if self.polled:
+            timeout = min(timeout, self.POLL_INTERVAL)
+        return max(timeout, 0.0)
+
+    def read_device(self, device):
+        try:
+            items = device.reader.read_ready()
+        except Exception as e:
+            log.error("❌ %s serial port read error: %s", device.name, e)
+            self.detach(device)
+            return
+        device.controller.mark_link_alive()
+        device.controller.process_serial_items(items)
+
+    def listen(self):
+        """The listener loop: one select() over every port, then every device's timers"""
+        print(f"🎮 Listening to {len(self.devices)} JoystickShield(s) on one thread...")
+        for device in self.devices:
+            self._watch(device)
+
+        while self.is_running and self.devices:
+            timeout = self.next_timeout()
+            if self.selector.get_map():
+                ready = self.selector.select(timeout)
+            else:
+                ready = ()
+                self.stopped.wait(timeout)
+
+            for key, _ in ready:
+                self.read_device(key.data)
+            for device in list(self.polled):
+                try:
+                    waiting = device.controller.serial_port.in_waiting
+                except Exception as e:
+                    log.error("❌ %s serial port read error: %s", device.name, e)
+                    self.detach(device)
+                    continue
+                if waiting:
+                    self.read_device(device)
+
+            for device in list(self.devices):
+                device.controller.run_timers()
+                if device.controller.link_timed_out():
+                    self.detach(device)
+
+        if self.is_running:
+            log.error("🔌 No JoystickShield left")
+
+    def start(self, block=True):
+        """Start the listener thread; with block, wait for Ctrl+C like the single-device controller"""
+        self.focus_tracker.start()
+        if self.profile_manager is not None:
+            self.profile_manager.start()
+        for device in self.devices:
+            controller = device.controller
+            if controller.mouse_output is not None:
+                controller.mouse_output.start()
+        self.is_running = True
+        self._listener = threading.Thread(target=self.listen, daemon=True)
+        self._listener.start()
+        if not block:
+            return
+
+        try:
+            while self._listener.is_alive():
+                time.sleep(0.1)
+        except KeyboardInterrupt:
+            print("\n\n🛑 Exiting...")
+        self.stop()
+
+    def stop(self):
+        self.is_running = False
+        self.stopped.set()
+        if self.profile_manager is not None:
+            self.profile_manager.stop()
+        if self._listener is not None:
+            self._listener.join(timeout=2.0)
+            self._listener = None
+        for device in self.devices:
+            device.controller.stop()
+        self.selector.close()
+        self.shared_output.close()
+        self.focus_tracker.stop()
+
+
+def parse_device(spec):
+    """"PORT" or "PORT=PROFILE" -> (port, profile or None)"""
+    port, _, profile = spec.partition("=")
+    return port, profile or None
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Several JoystickShields on one controller")
+    parser.add_argument("--device", metavar="PORT[=PROFILE]", action="append", default=[],
+                        help="Serial port of one player, optionally with a fixed profile (repeatable; "
+                             "default: every JoystickShield found)")
+    parser.add_argument("--log-level", choices=sorted(controller_logging.LOG_LEVELS), default="info",
+                        help="debug: every message, info: key changes, game: errors only")
+    parser.add_argument("--output", choices=sorted(output_backends.BACKENDS),
+                        help="Key injection backend (default: first available)")
+    parser.add_argument("--profiles", metavar="DIR", default=PROFILE_DIR,
+                        help="Directory of JSON game profiles, reloaded when files change")
+    parser.add_argument("--direction-timeout", type=float, metavar="SECONDS",
+                        help="Fixed direction key timeout (default: learned per device)")
+    args = parser.parse_args()
+
+    controller_logging.setup_logging(args.log_level)
+
+    output = output_backends.create_backend(args.output, output_backends.VK_CODES)
+    if output is None:
+        print("❌ No key injection backend available, please install:")
+        print("pip install keyboard")
+        sys.exit(1)
+    print(f"✅ Key injection: {output.name}")
+
+    ports = []
+    if args.device:
+        for spec in args.device:
+            device, profile = parse_device(spec)
+            try:
+                ports.append((serial.Serial(device, 115200, timeout=1), device, profile))
+            except serial.SerialException as e:
+                print(f"❌ Unable to open {device}: {e}")
+                sys.exit(1)
+    else:
+        print("🔍 Searching for JoystickShields...")
+        ports = [(port, entry.device, None) for port, entry in PortDiscovery().find_all()]
+    if not ports:
+        print("❌ No JoystickShield found, program exiting")
+        sys.exit(1)
+
+    multi = MultiDeviceController(output)
+    if args.profiles:
+        multi.load_profiles(args.profiles)
+    for port, device, profile in ports:
+        controller = multi.add_device(port, profile=profile)
+        if args.direction_timeout is not None:
+            controller.direction_timeout_override = args.direction_timeout
+            controller.set_direction_timeout(args.direction_timeout)
+        print(f"✅ {multi.devices[-1].name}: {device}"
+              + (f" ({controller.profile.name})" if controller.profile is not None else ""))
+    print("\n⌨️  Press Ctrl+C to exit")
+    try:
+        multi.start()
+    finally:
+        controller_logging.shutdown_logging()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,405 @@
+#!/usr/bin/env python3
+"""
+Output Backends
+Key injection for the controller, one call per batch of key transitions
+
+A batch is a sequence of (key, down) pairs, e.g. a diagonal flip from
+RightDown to RightUp is [("s", False), ("w", True)]. Each backend submits
+the whole batch at once:
+
+    sendinput   Windows SendInput with one INPUT array per batch
+    uinput      Linux /dev/uinput, one write() per batch ending in SYN_REPORT
+    keyboard    keyboard library, one call per key (no batch API)
+    recording   in memory, for tests, benchmarks and replays
+
+Backends that can also move the mouse (supports_mouse) take relative
+moves through move_mouse(dx, dy), built from preallocated structures so
+a high-rate mouse tick allocates nothing.
+
+The backend is chosen once when the controller starts; there is no
+per-key fallback afterwards.
+"""
+
+import ctypes
+import os
+import struct
+import sys
+import time
+
+try:
+    import keyboard
+    KEYBOARD_AVAILABLE = True
+except ImportError:
+    KEYBOARD_AVAILABLE = False
+
+# Windows virtual key codes
+VK_CODES = {
+    'w': 0x57, 'a': 0x41, 's': 0x53, 'd': 0x44,
+    'v': 0x56, 'space': 0x20, 'e': 0x45, 'f': 0x46,
+    'up': 0x26, 'down': 0x28, 'left': 0x25, 'right': 0x27,
+    'o': 0x4F, 'j': 0x4A, 'i': 0x49, 'k': 0x4B,  # Basic keys
+    'shift': 0x10, 'ctrl': 0x11, 'alt': 0x12  # Modifier keys
+}
+
+# Linux input event codes (linux/input-event-codes.h)
+EVDEV_CODES = {
+    'esc': 1, 'tab': 15, 'enter': 28, 'space': 57,
+    'shift': 42, 'ctrl': 29, 'alt': 56,
+    'up': 103, 'down': 108, 'left': 105, 'right': 106,
+}
+EVDEV_CODES.update({str(digit % 10): 1 + digit for digit in range(1, 11)})
+for _row, _first_code in (("qwertyuiop", 16), ("asdfghjkl", 30), ("zxcvbnm", 44)):
+    EVDEV_CODES.update({letter: _first_code + offset for offset, letter in enumerate(_row)})
+
+# Windows virtual key code -> Linux input event code, for keys a profile adds with vk_codes
+VK_TO_EVDEV = {
+    0x08: 14, 0x09: 15, 0x0D: 28, 0x10: 42, 0x11: 29, 0x12: 56, 0x13: 119, 0x14: 58, 0x1B: 1, 0x20: 57,
+    0x21: 104, 0x22: 109, 0x23: 107, 0x24: 102, 0x25: 105, 0x26: 103, 0x27: 106, 0x28: 108,
+    0x2D: 110, 0x2E: 111,
+    0x6A: 55, 0x6B: 78, 0x6D: 74, 0x6E: 83, 0x6F: 98, 0x90: 69, 0x91: 70,
+    0xA0: 42, 0xA1: 54, 0xA2: 29, 0xA3: 97, 0xA4: 56, 0xA5: 100,
+    0xBA: 39, 0xBB: 13, 0xBC: 51, 0xBD: 12, 0xBE: 52, 0xBF: 53, 0xC0: 41,
+    0xDB: 26, 0xDC: 43, 0xDD: 27, 0xDE: 40,
+}
+VK_TO_EVDEV.update({0x30 + digit: EVDEV_CODES[str(digit)] for digit in range(10)})
+VK_TO_EVDEV.update({ord(letter.upper()): EVDEV_CODES[letter] for letter in "abcdefghijklmnopqrstuvwxyz"})
+# F1-F10, F11, F12
+VK_TO_EVDEV.update({0x70 + number: 59 + number for number in range(10)})
+VK_TO_EVDEV.update({0x7A: 87, 0x7B: 88})
+# Numpad 0-9
+VK_TO_EVDEV.update(zip(range(0x60, 0x6A), (82, 79, 80, 81, 75, 76, 77, 71, 72, 73)))
+
+
+class OutputBackend:
+    """Injects batches of key transitions into the OS"""
+
+    name = "none"
+    supports_mouse = False
+
+    def send(self, transitions):
+        """Submit [(key, down), ...] in one go, returns True if every key was sent
+
+        A batch with a key the backend cannot inject is rejected as a whole,
+        so False always means nothing changed for the OS.
+        """
+        raise NotImplementedError
+
+    def press(self, key):
+        return self.send(((key, True),))
+
+    def release(self, key):
+        return self.send(((key, False),))
+
+    def supports(self, key):
+        """True if the backend can inject key"""
+        return True
+
+    def register_keys(self, vk_codes):
+        """Make more keys (name -> virtual key code) injectable"""
+
+    def supports_vk_code(self, vk_code):
+        """True if a key added by register_keys with this virtual key code can be injected"""
+        return True
+
+    def move_mouse(self, dx, dy):
+        """Move the mouse by (dx, dy) pixels, returns True if it moved"""
+        return False
+
+    def close(self):
+        """Release OS resources"""
+
+
+class RecordingBackend(OutputBackend):
+    """Keeps every transition in memory instead of injecting it
+
+    events holds (clock time, key, down) per transition and batches counts
+    send() calls. on_send, if set, is called with each batch. Mouse moves
+    are summed in mouse_x/mouse_y and, with keep, listed in mouse_moves as
+    (clock time, dx, dy).
+    """
+
+    name = "recording"
+    supports_mouse = True
+
+    def __init__(self, clock=time.perf_counter, keep=True):
+        self.clock = clock
+        self.keep = keep
+        self.events = []
+        self.batches = 0
+        self.on_send = None
+        self.mouse_moves = []
+        self.mouse_x = 0
+        self.mouse_y = 0
+
+    def send(self, transitions):
+        self.batches += 1
+        if self.keep:
+            now = self.clock()
+            self.events.extend((now, key, down) for key, down in transitions)
+        if self.on_send is not None:
+            self.on_send(transitions)
+        return True
+
+    def move_mouse(self, dx, dy):
+        self.mouse_x += dx
+        self.mouse_y += dy
+        if self.keep:
+            self.mouse_moves.append((self.clock(), dx, dy))
+        return True
+
+    def clear(self):
+        self.events.clear()
+        self.batches = 0
+        self.mouse_moves.clear()
+        self.mouse_x = self.mouse_y = 0
+
+
+class KeyboardLibraryBackend(OutputBackend):
+    """keyboard library, one call per transition"""
+
+    name = "keyboard"
+
+    def __init__(self):
+        if not KEYBOARD_AVAILABLE:
+            raise RuntimeError("keyboard library not installed")
+
+    def send(self, transitions):
+        for key, down in transitions:
+            if down:
+                keyboard.press(key)
+            else:
+                keyboard.release(key)
+        return True
+
+
+class SendInputBackend(OutputBackend):
+    """Windows SendInput, the whole batch in one INPUT array"""
+
+    name = "sendinput"
+    supports_mouse = True
+
+    INPUT_MOUSE = 0
+    INPUT_KEYBOARD = 1
+    MOUSEEVENTF_MOVE = 0x0001
+    KEYEVENTF_EXTENDEDKEY = 0x0001
+    KEYEVENTF_KEYUP = 0x0002
+    MAPVK_VK_TO_VSC = 0
+
+    # Arrow keys are on the extended part of the keyboard
+    EXTENDED_KEYS = {'up', 'down', 'left', 'right'}
+
+    def __init__(self, vk_codes=None):
+        if not sys.platform.startswith("win"):
+            raise RuntimeError("SendInput is only available on Windows")
+        from ctypes import wintypes
+
+        class MOUSEINPUT(ctypes.Structure):
+            _fields_ = [("dx", wintypes.LONG), ("dy", wintypes.LONG),
+                        ("mouseData", wintypes.DWORD), ("dwFlags", wintypes.DWORD),
+                        ("time", wintypes.DWORD), ("dwExtraInfo", wintypes.WPARAM)]
+
+        class KEYBDINPUT(ctypes.Structure):
+            _fields_ = [("wVk", wintypes.WORD), ("wScan", wintypes.WORD),
+                        ("dwFlags", wintypes.DWORD), ("time", wintypes.DWORD),
+                        ("dwExtraInfo", wintypes.WPARAM)]
+
+        class HARDWAREINPUT(ctypes.Structure):
+            _fields_ = [("uMsg", wintypes.DWORD), ("wParamL", wintypes.WORD),
+                        ("wParamH", wintypes.WORD)]
+
+        class INPUTUNION(ctypes.Union):
+            _fields_ = [("mi", MOUSEINPUT), ("ki", KEYBDINPUT), ("hi", HARDWAREINPUT)]
+
+        class INPUT(ctypes.Structure):
+            _fields_ = [("type", wintypes.DWORD), ("union", INPUTUNION)]
+
+        self.INPUT = INPUT
+        self.KEYBDINPUT = KEYBDINPUT
+        self.user32 = ctypes.windll.user32
+        self.vk_codes = {}
+
+        # One prebuilt INPUT per (key, down); a batch only copies them into an array
+        self.inputs = {}
+        self.register_keys(vk_codes if vk_codes is not None else VK_CODES)
+        self._array_types = {}
+        self._input_size = ctypes.sizeof(INPUT)
+
+        # One mouse INPUT reused for every move, only dx/dy change
+        self._mouse_input = INPUT(type=self.INPUT_MOUSE)
+        self._mouse = self._mouse_input.union.mi
+        self._mouse.dwFlags = self.MOUSEEVENTF_MOVE
+        self._mouse_pointer = ctypes.pointer(self._mouse_input)
+
+    def register_keys(self, vk_codes):
+        for key, vk_code in vk_codes.items():
+            scan_code = self.user32.MapVirtualKeyW(vk_code, self.MAPVK_VK_TO_VSC)
+            flags = self.KEYEVENTF_EXTENDEDKEY if key in self.EXTENDED_KEYS else 0
+            for down in (True, False):
+                entry = self.INPUT(type=self.INPUT_KEYBOARD)
+                entry.union.ki = self.KEYBDINPUT(vk_code, scan_code,
+                                                 flags if down else flags | self.KEYEVENTF_KEYUP, 0, 0)
+                self.inputs[key, down] = entry
+            self.vk_codes[key] = vk_code
+
+    def supports(self, key):
+        return key in self.vk_codes
+
+    def send(self, transitions):
+        inputs = self.inputs
+        try:
+            entries = [inputs[transition] for transition in transitions]
+        except KeyError:
+            # All or nothing: a partly injected batch would leave the caller's key state wrong
+            return False
+        if not entries:
+            return False
+        count = len(entries)
+        array_type = self._array_types.get(count)
+        if array_type is None:
+            array_type = self._array_types[count] = self.INPUT * count
+        sent = self.user32.SendInput(count, array_type(*entries), self._input_size)
+        return sent == count
+
+    def move_mouse(self, dx, dy):
+        mouse = self._mouse
+        mouse.dx = dx
+        mouse.dy = dy
+        return self.user32.SendInput(1, self._mouse_pointer, self._input_size) == 1
+
+
+class UinputBackend(OutputBackend):
+    """Linux virtual keyboard on /dev/uinput, one write() per batch
+
+    The device is created with every code in VK_TO_EVDEV enabled, because
+    uinput cannot add keys once it exists; register_keys() then only maps
+    a profile's virtual key codes onto them.
+    """
+
+    name = "uinput"
+    supports_mouse = True
+
+    DEVICE = "/dev/uinput"
+    EV_SYN = 0x00
+    EV_KEY = 0x01
+    EV_REL = 0x02
+    SYN_REPORT = 0
+    REL_X = 0x00
+    REL_Y = 0x01
+
+    # ioctl requests from linux/uinput.h
+    UI_DEV_CREATE = 0x5501
+    UI_DEV_DESTROY = 0x5502
+    UI_SET_EVBIT = 0x40045564
+    UI_SET_KEYBIT = 0x40045565
+    UI_SET_RELBIT = 0x40045566
+
+    # struct input_event: timeval, type, code, value
+    INPUT_EVENT = struct.Struct("llHHi")
+    # struct uinput_user_dev: name, input_id, ff_effects_max, abs arrays
+    USER_DEV = struct.Struct("80sHHHHI" + "64i" * 4)
+    BUS_USB = 0x03
+
+    def __init__(self, codes=None, device_name=b"JoystickShield Virtual Keyboard"):
+        if not sys.platform.startswith("linux"):
+            raise RuntimeError("uinput is only available on Linux")
+        import fcntl
+
+        self.codes = codes if codes is not None else EVDEV_CODES
+        self.fd = os.open(self.DEVICE, os.O_WRONLY | os.O_NONBLOCK)
+        try:
+            fcntl.ioctl(self.fd, self.UI_SET_EVBIT, self.EV_KEY)
+            for code in set(self.codes.values()) | set(VK_TO_EVDEV.values()):
+                fcntl.ioctl(self.fd, self.UI_SET_KEYBIT, code)
+            fcntl.ioctl(self.fd, self.UI_SET_EVBIT, self.EV_REL)
+            fcntl.ioctl(self.fd, self.UI_SET_RELBIT, self.REL_X)
+            fcntl.ioctl(self.fd, self.UI_SET_RELBIT, self.REL_Y)
+            os.write(self.fd, self.USER_DEV.pack(device_name, self.BUS_USB, 0x2341, 0x0001, 1, 0,
+                                                 *([0] * 256)))
+            fcntl.ioctl(self.fd, self.UI_DEV_CREATE)
+        except OSError:
+            os.close(self.fd)
+            raise
+        self._fcntl = fcntl
+
+        # Prepacked events, a batch is a join of them plus one SYN_REPORT
+        self.codes = dict(self.codes)
+        self.events = {}
+        for key, code in self.codes.items():
+            self._add_key(key, code)
+        self.sync = self.INPUT_EVENT.pack(0, 0, self.EV_SYN, self.SYN_REPORT, 0)
+
+        # REL_X, REL_Y and SYN_REPORT in one buffer, only the two values are rewritten per move
+        size = self.INPUT_EVENT.size
+        self.mouse_events = bytearray(self.INPUT_EVENT.pack(0, 0, self.EV_REL, self.REL_X, 0) +
+                                      self.INPUT_EVENT.pack(0, 0, self.EV_REL, self.REL_Y, 0) + self.sync)
+        self._value_offset = size - 4
+        self._rel_y_offset = size + size - 4
+
+    def _add_key(self, key, code):
+        self.codes[key] = code
+        for down in (True, False):
+            self.events[key, down] = self.INPUT_EVENT.pack(0, 0, self.EV_KEY, code, 1 if down else 0)
+
+    def supports(self, key):
+        return key in self.codes
+
+    def supports_vk_code(self, vk_code):
+        return vk_code in VK_TO_EVDEV
+
+    def register_keys(self, vk_codes):
+        for key, vk_code in vk_codes.items():
+            code = VK_TO_EVDEV.get(vk_code)
+            if code is not None:
+                self._add_key(key, code)
+
+    def send(self, transitions):
+        events = self.events
+        try:
+            chunks = [events[transition] for transition in transitions]
+        except KeyError:
+            # All or nothing: a partly injected batch would leave the caller's key state wrong
+            return False
+        if not chunks:
+            return False
+        chunks.append(self.sync)
+        data = b"".join(chunks)
+        return os.write(self.fd, data) == len(data)
+
+    def move_mouse(self, dx, dy):
+        events = self.mouse_events
+        struct.pack_into("i", events, self._value_offset, dx)
+        struct.pack_into("i", events, self._rel_y_offset, dy)
+        return os.write(self.fd, events) == len(events)
+
+    def close(self):
+        if self.fd is not None:
+            try:
+                self._fcntl.ioctl(self.fd, self.UI_DEV_DESTROY)
+            finally:
+                os.close(self.fd)
+                self.fd = None
+
+
+# Backend name -> factory(vk_codes), in order of preference
+BACKENDS = {
+    "sendinput": lambda vk_codes: SendInputBackend(vk_codes),
+    "uinput": lambda vk_codes: UinputBackend(),
+    "keyboard": lambda vk_codes: KeyboardLibraryBackend(),
+    "recording": lambda vk_codes: RecordingBackend(),
+}
+
+
+def create_backend(preferred=None, vk_codes=None):
+    """First backend that works on this machine, or None
+
+    preferred names one backend from BACKENDS to try alone; otherwise every
+    real backend is tried in order. The recording backend is never picked
+    automatically.
+    """
+    names = [preferred] if preferred else [name for name in BACKENDS if name != "recording"]
+    for name in names:
+        try:
+            return BACKENDS[name](vk_codes)
+        except (RuntimeError, OSError, AttributeError) as e:
+            print(f"   ⚠️  {name} output unavailable: {e}")
+    return None
@@ -0,0 +1,233 @@
+#!/usr/bin/env python3
+"""
+Port Discovery
+Finds the JoystickShield by handshake instead of taking the first port that opens
+
+Every candidate port is probed on its own thread: the probe opens the port,
+sends the identify command and waits (up to a deadline) for the firmware
+banner, which the board prints after a reset and in reply to the command.
+Ports that stay silent or print something else are closed and skipped.
+
+The last good port and its VID:PID are cached in a small JSON file and
+probed first without resetting the board, so a normal start connects in a
+fraction of a second.
+"""
+
+import json
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import serial
+import serial.tools.list_ports
+
+BANNER = b"=== JoystickShield Game Controller ==="
+IDENTIFY_COMMAND = b"?\n"
+
+# Resend the identify command this often until the banner arrives
+IDENTIFY_INTERVAL = 0.25
+# Full probe: long enough for the reset, the 1 s startup delay and the banner
+PROBE_TIMEOUT = 3.0
+# Cached port probe: the board is not reset and answers the identify command at once
+CACHED_PROBE_TIMEOUT = 0.5
+
+# Port descriptions that are probably an Arduino, probed first
+ARDUINO_KEYWORDS = ['arduino', 'ch340', 'cp210', 'ftdi']
+
+CACHE_PATH = os.path.join(os.path.expanduser("~"), ".joystick_controller_port.json")
+
+# Extra ports to probe first, os.pathsep-separated (e.g. the pty of joystick_simulator.py)
+EXTRA_PORTS_ENV = "JOYSTICK_EXTRA_PORTS"
+
+
+def port_id(port):
+    """VID:PID of a port listing entry, or None"""
+    vid = getattr(port, "vid", None)
+    pid = getattr(port, "pid", None)
+    if vid is None or pid is None:
+        return None
+    return f"{vid:04X}:{pid:04X}"
+
+
+class ExtraPort:
+    """Listing entry for a port that is not in the system's port list"""
+
+    def __init__(self, device):
+        self.device = device
+        self.description = f"{EXTRA_PORTS_ENV} port"
+        self.vid = None
+        self.pid = None
+
+
+def probe_port(device, baudrate=115200, timeout=PROBE_TIMEOUT, reset=True, cancelled=None):
+    """Open device and wait for the banner, returns the open port or None
+
+    reset=False keeps DTR low so an Arduino does not restart on open.
+    cancelled is an optional threading.Event that ends the probe early.
+    """
+    try:
+        port = serial.Serial()
+        port.port = device
+        port.baudrate = baudrate
+        # Short read timeout: a read returns as soon as a byte arrives
+        port.timeout = 0.02
+        if not reset:
+            port.dtr = False
+        port.open()
+    except (serial.SerialException, OSError, ValueError):
+        return None
+
+    deadline = time.monotonic() + timeout
+    next_identify = 0.0
+    received = b""
+    try:
+        while not (cancelled is not None and cancelled.is_set()):
+            now = time.monotonic()
+            if now >= deadline:
+                break
+            if now >= next_identify:
+                port.write(IDENTIFY_COMMAND)
+                next_identify = now + IDENTIFY_INTERVAL
+
+            data = port.read(port.in_waiting or 1)
+            if data:
+                # Keep only what could still be the start of a banner
+                received = received[-len(BANNER):] + data
+                if BANNER in received:
+                    port.timeout = 1
+                    return port
+    except (serial.SerialException, OSError):
+        pass
+
+    port.close()
+    return None
+
+
+class PortDiscovery:
+    """Finds and remembers the port the JoystickShield is on
+
+    list_ports returns port listing entries (anything with device,
+    description and optionally vid/pid); it defaults to pyserial's comports().
+    extra_ports are device paths probed before the listed ports; they
+    default to the EXTRA_PORTS_ENV environment variable.
+    """
+
+    def __init__(self, cache_path=CACHE_PATH, list_ports=None,
+                 probe_timeout=PROBE_TIMEOUT, cached_probe_timeout=CACHED_PROBE_TIMEOUT, extra_ports=None):
+        self.cache_path = cache_path
+        self.list_ports = list_ports or serial.tools.list_ports.comports
+        if extra_ports is None:
+            extra_ports = [path for path in os.environ.get(EXTRA_PORTS_ENV, "").split(os.pathsep) if path]
+        self.extra_ports = list(extra_ports)
+        self.probe_timeout = probe_timeout
+        self.cached_probe_timeout = cached_probe_timeout
+
+    def load_cache(self):
+        """Last good port as {"device": ..., "id": "VID:PID"}, or None"""
+        if not self.cache_path:
+            return None
+        try:
+            with open(self.cache_path, "r", encoding="utf-8") as f:
+                cached = json.load(f)
+        except (OSError, ValueError):
+            return None
+        return cached if isinstance(cached, dict) else None
+
+    def save_cache(self, port):
+        """Remember port (a listing entry) for the next start"""
+        if not self.cache_path:
+            return
+        try:
+            with open(self.cache_path, "w", encoding="utf-8") as f:
+                json.dump({"device": port.device, "id": port_id(port)}, f)
+        except OSError as e:
+            print(f"   ⚠️  Unable to save port cache: {e}")
+
+    def candidates(self):
+        """Extra ports, then listed ports with likely Arduinos first"""
+        arduino_ports = [ExtraPort(device) for device in self.extra_ports]
+        other_ports = []
+        for port in self.list_ports():
+            description = (getattr(port, "description", "") or "").lower()
+            if any(keyword in description for keyword in ARDUINO_KEYWORDS):
+                arduino_ports.append(port)
+            else:
+                other_ports.append(port)
+        return arduino_ports + other_ports
+
+    def cached_candidate(self, ports):
+        """The listed port matching the cache, by VID:PID first, then by name"""
+        cached = self.load_cache()
+        if not cached:
+            return None
+        if cached.get("id"):
+            for port in ports:
+                if port_id(port) == cached["id"]:
+                    return port
+        for port in ports:
+            if port.device == cached.get("device"):
+                return port
+        return None
+
+    def find(self, baudrate=115200):
+        """Return (open serial port, listing entry) of the JoystickShield, or (None, None)"""
+        ports = self.candidates()
+        if not ports:
+            return None, None
+
+        cached = self.cached_candidate(ports)
+        if cached is not None:
+            port = probe_port(cached.device, baudrate, self.cached_probe_timeout, reset=False)
+            if port is not None:
+                self.save_cache(cached)
+                return port, cached
+
+        found = self.probe_all(ports, baudrate)
+        if found[0] is not None:
+            self.save_cache(found[1])
+        return found
+
+    def find_all(self, baudrate=115200):
+        """Return [(open serial port, listing entry), ...] of every JoystickShield, sorted by device"""
+        ports = self.candidates()
+        found = []
+        lock = threading.Lock()
+
+        def probe(entry):
+            port = probe_port(entry.device, baudrate, self.probe_timeout)
+            if port is not None:
+                with lock:
+                    found.append((port, entry))
+
+        if ports:
+            with ThreadPoolExecutor(max_workers=len(ports)) as executor:
+                for entry in ports:
+                    executor.submit(probe, entry)
+        # Stable player order from one start to the next
+        found.sort(key=lambda item: item[1].device)
+        return found
+
+    def probe_all(self, ports, baudrate=115200):
+        """Probe every port concurrently, the first to answer wins"""
+        winner = []
+        lock = threading.Lock()
+        done = threading.Event()
+
+        def probe(entry):
+            port = probe_port(entry.device, baudrate, self.probe_timeout, cancelled=done)
+            if port is None:
+                return
+            with lock:
+                if winner:
+                    # Another port answered first
+                    port.close()
+                    return
+                winner.append((port, entry))
+                done.set()
+
+        with ThreadPoolExecutor(max_workers=len(ports)) as executor:
+            for entry in ports:
+                executor.submit(probe, entry)
+
+        return winner[0] if winner else (None, None)
@@ -0,0 +1,176 @@
+#!/usr/bin/env python3
+"""
+Serial Reader
+Event-driven, buffered line reader for the joystick serial port
+"""
+
+import select
+
+from binary_protocol import FRAME_SIZE, SYNC, SYNC_BYTE, decode_frame
+
+
+class SerialLineReader:
+    """Waits for serial data without polling and hands out complete lines
+
+    Everything waiting on the port is drained with a single read() into one
+    reusable buffer, complete lines are cut out of it and the partial tail
+    is kept for the next read. Lines are returned as bytes without the line
+    ending and are never decoded here.
+
+    Firmware built with the binary protocol is detected from the first sync
+    byte; from then on binary frames are returned as BinaryFrame objects in
+    the same list, in arrival order with any text lines.
+    """
+
+    # Longest time to block when nothing is pending, so stop() is noticed
+    IDLE_WAIT = 0.5
+
+    # Drop buffered data that grows this long without a line ending (noise)
+    MAX_LINE_LENGTH = 1024
+
+    def __init__(self, serial_port):
+        self.serial_port = serial_port
+
+        # Readiness on the file descriptor is only available on POSIX ports;
+        # Windows ports fall back to a blocking read with a timeout
+        try:
+            self.fd = serial_port.fileno()
+        except Exception:
+            self.fd = None
+
+        self._buffer = bytearray()
+
+        # Switched on when the first binary frame sync byte arrives
+        self.binary_mode = False
+        self.frame_errors = 0
+
+    def wait(self, timeout=None):
+        """Block until data is available or the timeout expires
+
+        Returns True when at least one byte is ready to be read.
+        """
+        if self.serial_port.in_waiting:
+            return True
+
+        if timeout is None or timeout > self.IDLE_WAIT:
+            timeout = self.IDLE_WAIT
+        if timeout < 0:
+            timeout = 0
+
+        if self.fd is not None:
+            readable, _, _ = select.select([self.fd], [], [], timeout)
+            if readable and not self.serial_port.in_waiting:
+                # Readable with nothing queued: a disconnected device raises here
+                return self._blocking_wait(0)
+            return bool(readable)
+
+        return self._blocking_wait(timeout)
+
+    def _blocking_wait(self, timeout):
+        """Wait for the first byte using the port's own read timeout"""
+        previous_timeout = self.serial_port.timeout
+        try:
+            self.serial_port.timeout = timeout
+            first_byte = self.serial_port.read(1)
+        finally:
+            self.serial_port.timeout = previous_timeout
+        self._buffer += first_byte
+        return bool(first_byte)
+
+    def read_ready(self):
+        """read_lines() once a selector has reported the port readable
+
+        A readable port with nothing queued was disconnected; the read
+        raises here instead of spinning on a readable descriptor.
+        """
+        if not self.serial_port.in_waiting:
+            self._blocking_wait(0)
+        return self.read_lines()
+
+    def fill(self):
+        """Drain everything waiting on the port into the buffer"""
+        waiting = self.serial_port.in_waiting
+        if not waiting:
+            return 0
+        data = self.serial_port.read(waiting)
+        self._buffer += data
+        return len(data)
+
+    def read_lines(self):
+        """Read every complete line (and binary frame) currently available"""
+        self.fill()
+        if not self.binary_mode and self._buffer.find(SYNC_BYTE) != -1:
+            self.binary_mode = True
+        if self.binary_mode:
+            return self.split_mixed()
+        return self.split_lines()
+
+    def split_lines(self):
+        """Cut complete lines out of the buffer, keeping the partial tail"""
+        buffer = self._buffer
+        lines = []
+        start = 0
+        end = buffer.find(b"\n")
+
+        with memoryview(buffer) as view:
+            while end != -1:
+                stop = end
+                if stop > start and buffer[stop - 1] == 0x0D:
+                    stop -= 1
+                if stop > start:
+                    lines.append(bytes(view[start:stop]))
+                start = end + 1
+                end = buffer.find(b"\n", start)
+
+        if start:
+            del buffer[:start]
+        if len(buffer) > self.MAX_LINE_LENGTH:
+            buffer.clear()
+        return lines
+
+    def split_mixed(self):
+        """Cut binary frames and text lines out of the buffer
+
+        A frame with a bad checksum costs one byte: decoding resumes at the
+        next byte to find the real sync byte again. Text that is cut short
+        by a sync byte is treated as noise and dropped.
+        """
+        buffer = self._buffer
+        length = len(buffer)
+        items = []
+        position = 0
+
+        with memoryview(buffer) as view:
+            while position < length:
+                if buffer[position] == SYNC:
+                    if length - position < FRAME_SIZE:
+                        break
+                    frame = decode_frame(view, position)
+                    if frame is None:
+                        self.frame_errors += 1
+                        position += 1
+                        continue
+                    items.append(frame)
+                    position += FRAME_SIZE
+                    continue
+
+                end = buffer.find(b"\n", position)
+                sync = buffer.find(SYNC_BYTE, position)
+                if sync != -1 and (end == -1 or sync < end):
+                    position = sync
+                    continue
+                if end == -1:
+                    break
+
+                stop = end
+                if stop > position and buffer[stop - 1] == 0x0D:
+                    stop -= 1
+                if stop > position:
+                    items.append(bytes(view[position:stop]))
+                position = end + 1
+
+        if position:
+            del buffer[:position]
+        if len(buffer) > self.MAX_LINE_LENGTH:
+            buffer.clear()
+        return items
@@ -0,0 +1,231 @@
+#!/usr/bin/env python3
+"""
+Session Recorder
+Captures raw serial bytes with arrival times and replays them into the controller
+
+File format (little endian):
+    header   b"JSR1", uint16 version, float64 wall-clock start time
+    records  uint32 microseconds since the previous record, uint16 length, data
+
+Usage:
+    python joystick_controller_final.py --record session.jsr
+    python session_recorder.py session.jsr             # as fast as possible
+    python session_recorder.py session.jsr --realtime  # through a pty at recorded speed
+"""
+
+import argparse
+import struct
+import threading
+import time
+
+MAGIC = b"JSR1"
+VERSION = 1
+HEADER = struct.Struct("<4sHd")
+RECORD = struct.Struct("<IH")
+
+# Longest gap a single record can express; longer gaps get empty filler records
+MAX_DELTA_US = 0xFFFFFFFF
+
+
+class SessionRecorder:
+    """Appends timestamped serial chunks to a session file"""
+
+    def __init__(self, path, clock=time.monotonic):
+        self.clock = clock
+        self.file = open(path, "wb")
+        self.file.write(HEADER.pack(MAGIC, VERSION, time.time()))
+        self._last_us = int(clock() * 1e6)
+        self._lock = threading.Lock()
+
+    def record(self, data):
+        """Write one chunk stamped with the current time"""
+        if not data:
+            return
+        with self._lock:
+            if self.file is None:
+                return
+            now_us = int(self.clock() * 1e6)
+            delta = now_us - self._last_us
+            while delta > MAX_DELTA_US:
+                self.file.write(RECORD.pack(MAX_DELTA_US, 0))
+                delta -= MAX_DELTA_US
+            self._last_us = now_us
+
+            view = memoryview(data)
+            for offset in range(0, len(view), 0xFFFF):
+                chunk = view[offset:offset + 0xFFFF]
+                self.file.write(RECORD.pack(delta, len(chunk)))
+                self.file.write(chunk)
+                delta = 0
+
+    def close(self):
+        with self._lock:
+            if self.file is not None:
+                self.file.close()
+                self.file = None
+
+
+class RecordingSerialPort:
+    """Serial port wrapper that records every byte read through it"""
+
+    def __init__(self, serial_port, recorder):
+        self._port = serial_port
+        self.recorder = recorder
+
+    def read(self, size=1):
+        data = self._port.read(size)
+        self.recorder.record(data)
+        return data
+
+    def readline(self):
+        data = self._port.readline()
+        self.recorder.record(data)
+        return data
+
+    def close(self):
+        # The recorder outlives the port, a reconnect wraps the new port with it
+        self._port.close()
+
+    def __getattr__(self, name):
+        return getattr(self._port, name)
+
+    def __setattr__(self, name, value):
+        # Settings such as timeout belong to the wrapped port
+        if name in ("_port", "recorder"):
+            object.__setattr__(self, name, value)
+        else:
+            setattr(self._port, name, value)
+
+
+def load_session(path):
+    """Read a session file, returns (start_wall_time, [(seconds, bytes), ...])"""
+    with open(path, "rb") as f:
+        content = f.read()
+
+    magic, version, started = HEADER.unpack_from(content, 0)
+    if magic != MAGIC or version != VERSION:
+        raise ValueError(f"{path} is not a version {VERSION} session file")
+
+    records = []
+    offset = HEADER.size
+    elapsed_us = 0
+    while offset + RECORD.size <= len(content):
+        delta, length = RECORD.unpack_from(content, offset)
+        offset += RECORD.size
+        elapsed_us += delta
+        if length:
+            records.append((elapsed_us / 1e6, content[offset:offset + length]))
+        offset += length
+    return started, records
+
+
+def replay_session(controller, records):
+    """Drive controller through a recorded session as fast as possible
+
+    controller must have been created with a ManualClock. Before every
+    chunk the clock steps through each direction timeout and scheduled
+    timer that falls due in the gap, so timeout-driven releases happen at
+    exactly the same (virtual) times as in the original session.
+    """
+    from joystick_simulator import RecordedSerialPort
+    from serial_reader import SerialLineReader
+
+    clock = controller.clock
+    port = RecordedSerialPort([])
+    reader = SerialLineReader(port)
+    origin = clock()
+
+    def run_timers_until(until):
+        while True:
+            deadline = controller.next_wakeup()
+            if deadline is None or deadline > until:
+                break
+            clock.set(deadline)
+            controller.run_timers()
+
+    for seconds, data in records:
+        arrival = origin + seconds
+        run_timers_until(arrival)
+        clock.set(arrival)
+        port.feed(data)
+        controller.process_serial_items(reader.read_lines())
+        controller.run_timers()
+
+    # Let every pending release fire
+    run_timers_until(float("inf"))
+
+
+def replay_to_device(device, records, speed=1.0):
+    """Write a recorded session to a simulated device at the recorded pace"""
+    started = time.perf_counter()
+    for seconds, data in records:
+        delay = started + seconds / speed - time.perf_counter()
+        if delay > 0:
+            time.sleep(delay)
+        device.write(data)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Replay a recorded JoystickShield session")
+    parser.add_argument("session", help="Session file written with --record")
+    parser.add_argument("--realtime", action="store_true",
+                        help="Replay through a simulated device at the recorded pace")
+    parser.add_argument("--speed", type=float, default=1.0, help="Pace multiplier for --realtime")
+    args = parser.parse_args()
+
+    import contextlib
+    import io
+
+    import controller_logging
+    from joystick_controller_final import GameJoystickController
+    from key_scheduler import ManualClock
+    from output_backends import RecordingBackend
+
+    started, records = load_session(args.session)
+    total_bytes = sum(len(data) for _, data in records)
+    duration = records[-1][0] if records else 0.0
+    print(f"📼 {args.session}: {len(records)} chunks, {total_bytes} bytes, "
+          f"{duration:.1f} s recorded {time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(started))}")
+
+    controller_logging.setup_logging("game")
+
+    if args.realtime:
+        import serial
+        from joystick_simulator import VirtualJoystickShield
+
+        with VirtualJoystickShield() as device:
+            output = RecordingBackend()
+            controller = GameJoystickController(output=output)
+            controller.liveness_timeout = None
+            controller.serial_port = serial.Serial(device.port_name, 115200, timeout=1)
+            controller.is_running = True
+            listener = threading.Thread(target=controller.serial_listener, daemon=True)
+            with contextlib.redirect_stdout(io.StringIO()):
+                listener.start()
+                replay_to_device(device, records, args.speed)
+                time.sleep(controller.direction_timeout * 2)
+                controller.stop()
+            listener.join(timeout=2)
+        origin = None
+    else:
+        clock = ManualClock()
+        output = RecordingBackend(clock=clock)
+        controller = GameJoystickController(clock=clock, output=output)
+        start = time.perf_counter()
+        replay_session(controller, records)
+        elapsed = time.perf_counter() - start
+        print(f"⚡ Replayed in {elapsed * 1000:.1f} ms "
+              f"({total_bytes / elapsed / 1024:,.0f} KiB/s, {duration / elapsed:,.0f}x real time)")
+        origin = 0.0
+
+    injections = output.events
+    for at, key, down in injections:
+        offset = at - (origin if origin is not None else injections[0][0])
+        print(f"  {offset:10.4f} s  {'🔽' if down else '🔼'} {key}")
+    print(f"🎹 {len(injections)} key transitions")
+
+    controller_logging.shutdown_logging()
+
+
+if __name__ == "__main__":
+    main()
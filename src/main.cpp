@@ -1,14 +1,78 @@
 #include <JoystickShield.h>
+#include <stdlib.h>
+#include <string.h>
+
+// Wire protocol: 0 = text lines (default), 1 = compact binary frames
+// Build with -DWIRE_PROTOCOL_BINARY=1 to enable binary frames
+#ifndef WIRE_PROTOCOL_BINARY
+#define WIRE_PROTOCOL_BINARY 0
+#endif
+
+// Binary frame layout: sync, events (uint16), x (int8), y (int8), sequence, checksum
+const uint8_t FRAME_SYNC = 0xA5;
+
+// Event bits, in the same order as binary_protocol.EVENT_MESSAGES on the host
+enum EventBit {
+    EVENT_UP = 0,
+    EVENT_RIGHT_UP,
+    EVENT_RIGHT,
+    EVENT_RIGHT_DOWN,
+    EVENT_DOWN,
+    EVENT_LEFT_DOWN,
+    EVENT_LEFT,
+    EVENT_LEFT_UP,
+    EVENT_JOYSTICK_BUTTON,
+    EVENT_UP_BUTTON,
+    EVENT_RIGHT_BUTTON,
+    EVENT_DOWN_BUTTON,
+    EVENT_LEFT_BUTTON,
+    EVENT_E_BUTTON,
+    EVENT_F_BUTTON,
+    EVENT_NOT_CENTER = 15
+};
 
 // Create JoystickShield object
 JoystickShield joystickShield;
 
+// Events collected during the current loop and the previous one
+uint16_t frameEvents = 0;
+uint16_t lastEvents = 0;
+uint8_t frameSequence = 0;
+
 // Variable to track joystick center state
 bool wasNotCenter = false;
 
+// Buttons held in the previous loop, bit i = event bit EVENT_JOYSTICK_BUTTON + i
+uint8_t lastButtons = 0;
+const char *const BUTTON_NAMES[] = {
+    "Joystick Button", "Up Button", "Right Button", "Down Button",
+    "Left Button", "E Button", "F Button"
+};
+
+// Banner printed at startup and in reply to the host's identify command
+const char BANNER[] = "=== JoystickShield Game Controller ===";
+const char IDENTIFY_COMMAND = '?';
+
 // Heartbeat variables
 unsigned long lastHeartbeat = 0;
-const unsigned long heartbeatInterval = 5000; // 5 seconds
+const unsigned long heartbeatInterval = 1000; // 1 second, the host treats 3 s of silence as a lost link
+
+// Settings the host can change with "!<seq> <COMMAND> <value>" lines (see device_commands.py)
+unsigned long sampleInterval = 100;  // INTERVAL: milliseconds per loop
+const long MIN_INTERVAL = 2;
+const long MAX_INTERVAL = 1000;
+bool streamPosition = true;    // POSITION: position lines / frame positions
+bool changesOnly = false;      // CHANGES: no repeated direction, click and position reports
+bool heartbeatEnabled = true;  // HEARTBEAT
+
+// Host command line being received
+char commandLine[32];
+uint8_t commandLength = 0;
+bool commandOverflow = false;
+
+// Last reported position, for report-on-change
+int lastX = 0;
+int lastY = 0;
 
 void setup() {
     // Initialize serial communication
@@ -17,7 +81,7 @@ void setup() {
     // Wait for serial port to be ready
     delay(1000);
 
-    Serial.println("=== JoystickShield Game Controller ===");
+    Serial.println(BANNER);
     Serial.println("Calibrating joystick...");
 
     // Calibrate joystick center position
@@ -43,99 +107,233 @@ void setup() {
     // joystickShield.setButtonPins(8, 2, 3, 4, 5, 7, 6); // K,A,B,C,D,F,E
 }
 
+// Set a 0/1 setting, NULL or the NAK reason
+const char *setFlag(bool *flag, long value) {
+    if (value != 0 && value != 1) {
+        return "range";
+    }
+    *flag = value;
+    return NULL;
+}
+
+// Apply one "!<seq> <COMMAND> <value>" line and answer "ACK <seq> <COMMAND> <value>" or "NAK <seq> <COMMAND> <reason>"
+void runCommand(char *line) {
+    char *sequence = strtok(line + 1, " ");
+    char *command = strtok(NULL, " ");
+    char *argument = strtok(NULL, " ");
+    if (sequence == NULL || command == NULL) {
+        return;
+    }
+
+    char *end = NULL;
+    long value = argument != NULL ? strtol(argument, &end, 10) : 0;
+    const char *error = NULL;
+    if (argument == NULL || *end != '\0') {
+        error = "value";
+    } else if (strcmp(command, "INTERVAL") == 0) {
+        if (value < MIN_INTERVAL || value > MAX_INTERVAL) {
+            error = "range";
+        } else {
+            sampleInterval = value;
+        }
+    } else if (strcmp(command, "POSITION") == 0) {
+        error = setFlag(&streamPosition, value);
+    } else if (strcmp(command, "CHANGES") == 0) {
+        error = setFlag(&changesOnly, value);
+    } else if (strcmp(command, "HEARTBEAT") == 0) {
+        error = setFlag(&heartbeatEnabled, value);
+    } else {
+        error = "unknown";
+    }
+
+    Serial.print(error != NULL ? "NAK " : "ACK ");
+    Serial.print(sequence);
+    Serial.print(' ');
+    Serial.print(command);
+    Serial.print(' ');
+    if (error != NULL) {
+        Serial.println(error);
+    } else {
+        Serial.println(value);
+    }
+}
+
+// Answer the host's port discovery probe and settings commands without waiting for a reset
+void handleHostCommands() {
+    while (Serial.available() > 0) {
+        char c = Serial.read();
+        if (c == IDENTIFY_COMMAND && commandLength == 0 && !commandOverflow) {
+            Serial.println(BANNER);
+        } else if (c == '\n' || c == '\r') {
+            if (commandLength > 0 && !commandOverflow && commandLine[0] == '!') {
+                commandLine[commandLength] = '\0';
+                runCommand(commandLine);
+            }
+            commandLength = 0;
+            commandOverflow = false;
+        } else if (commandLength < sizeof(commandLine) - 1) {
+            commandLine[commandLength++] = c;
+        } else {
+            // Too long to be a command: drop it up to the line end
+            commandOverflow = true;
+        }
+    }
+}
+
+// Record one event: print its text line, or set its bit for the binary frame
+void reportEvent(uint8_t bit, const char *message) {
+    uint16_t mask = (uint16_t)1 << bit;
+    frameEvents |= mask;
+#if !WIRE_PROTOCOL_BINARY
+    // Report-on-change: a held direction or button is printed once
+    if (!changesOnly || !(lastEvents & mask)) {
+        Serial.println(message);
+    }
+#endif
+}
+
+// Send the events and position of this loop as one binary frame
+void sendFrame(uint16_t events, int8_t x, int8_t y) {
+    uint8_t frame[7];
+    frame[0] = FRAME_SYNC;
+    frame[1] = events & 0xFF;
+    frame[2] = events >> 8;
+    frame[3] = (uint8_t)x;
+    frame[4] = (uint8_t)y;
+    frame[5] = frameSequence++;
+    frame[6] = frame[1] ^ frame[2] ^ frame[3] ^ frame[4] ^ frame[5];
+    Serial.write(frame, sizeof(frame));
+}
+
 void loop() {
+    unsigned long loopStart = millis();
+    handleHostCommands();
+
     // Process joystick and button events
     joystickShield.processEvents();
+    frameEvents = 0;
 
     // Detect joystick directions (8 directions)
     if (joystickShield.isUp()) {
-        Serial.println("Joystick Up");
+        reportEvent(EVENT_UP, "Joystick Up");
     }
 
     if (joystickShield.isRightUp()) {
-        Serial.println("Joystick RightUp");
+        reportEvent(EVENT_RIGHT_UP, "Joystick RightUp");
     }
 
     if (joystickShield.isRight()) {
-        Serial.println("Joystick Right");
+        reportEvent(EVENT_RIGHT, "Joystick Right");
     }
 
     if (joystickShield.isRightDown()) {
-        Serial.println("Joystick RightDown");
+        reportEvent(EVENT_RIGHT_DOWN, "Joystick RightDown");
     }
 
     if (joystickShield.isDown()) {
-        Serial.println("Joystick Down");
+        reportEvent(EVENT_DOWN, "Joystick Down");
     }
 
     if (joystickShield.isLeftDown()) {
-        Serial.println("Joystick LeftDown");
+        reportEvent(EVENT_LEFT_DOWN, "Joystick LeftDown");
     }
 
     if (joystickShield.isLeft()) {
-        Serial.println("Joystick Left");
+        reportEvent(EVENT_LEFT, "Joystick Left");
     }
 
     if (joystickShield.isLeftUp()) {
-        Serial.println("Joystick LeftUp");
+        reportEvent(EVENT_LEFT_UP, "Joystick LeftUp");
     }
 
     // Detect joystick button
     if (joystickShield.isJoystickButton()) {
-        Serial.println("Joystick Button Clicked");
+        reportEvent(EVENT_JOYSTICK_BUTTON, "Joystick Button Clicked");
     }
 
     // Detect direction buttons
     if (joystickShield.isUpButton()) {
-        Serial.println("Up Button Clicked");
+        reportEvent(EVENT_UP_BUTTON, "Up Button Clicked");
     }
 
     if (joystickShield.isRightButton()) {
-        Serial.println("Right Button Clicked");
+        reportEvent(EVENT_RIGHT_BUTTON, "Right Button Clicked");
     }
 
     if (joystickShield.isDownButton()) {
-        Serial.println("Down Button Clicked");
+        reportEvent(EVENT_DOWN_BUTTON, "Down Button Clicked");
     }
 
     if (joystickShield.isLeftButton()) {
-        Serial.println("Left Button Clicked");
+        reportEvent(EVENT_LEFT_BUTTON, "Left Button Clicked");
     }
 
     // Detect function buttons
     if (joystickShield.isEButton()) {
-        Serial.println("E Button Clicked");
+        reportEvent(EVENT_E_BUTTON, "E Button Clicked");
     }
 
     if (joystickShield.isFButton()) {
-        Serial.println("F Button Clicked");
+        reportEvent(EVENT_F_BUTTON, "F Button Clicked");
     }
 
+    // Button edges for host-side combos and chords ("E Button Pressed" / "E Button Released")
+    uint8_t buttons = (frameEvents >> EVENT_JOYSTICK_BUTTON) & 0x7F;
+    uint8_t buttonsChanged = buttons ^ lastButtons;
+#if !WIRE_PROTOCOL_BINARY
+    for (uint8_t i = 0; i < 7; i++) {
+        if (buttonsChanged & (1 << i)) {
+            Serial.print(BUTTON_NAMES[i]);
+            Serial.println((buttons & (1 << i)) ? " Pressed" : " Released");
+        }
+    }
+#endif
+    lastButtons = buttons;
+
     // Detect joystick center state changes
     bool currentNotCenter = joystickShield.isNotCenter();
+    bool centerChanged = currentNotCenter != wasNotCenter;
 
+#if !WIRE_PROTOCOL_BINARY
     if (currentNotCenter) {
         // Joystick is not in center
         if (!wasNotCenter) {
             // Just moved away from center
             Serial.println("Joystick NotCenter");
         }
-        wasNotCenter = true;
     } else {
         // Joystick is in center
         if (wasNotCenter) {
             // Just returned to center - send center event
             Serial.println("Joystick Center");
         }
-        wasNotCenter = false;
     }
+#endif
+    wasNotCenter = currentNotCenter;
 
     // Display joystick position data (-100 to 100)
-    int xPos = joystickShield.xAmplitude();
-    int yPos = joystickShield.yAmplitude();
-
+    int xPos = streamPosition ? joystickShield.xAmplitude() : 0;
+    int yPos = streamPosition ? joystickShield.yAmplitude() : 0;
+    bool positionChanged = xPos != lastX || yPos != lastY;
+    lastX = xPos;
+    lastY = yPos;
+
+#if WIRE_PROTOCOL_BINARY
+    // One frame per loop whenever there is anything to report
+    if (currentNotCenter) {
+        frameEvents |= (uint16_t)1 << EVENT_NOT_CENTER;
+    }
+    // A frame on every button change too, so the host sees releases
+    if (changesOnly) {
+        if (frameEvents != lastEvents || positionChanged) {
+            sendFrame(frameEvents, xPos, yPos);
+        }
+    } else if (frameEvents != 0 || centerChanged || buttonsChanged || xPos != 0 || yPos != 0) {
+        sendFrame(frameEvents, xPos, yPos);
+    }
+#else
     // Only display position info when joystick is moved
-    if (xPos != 0 || yPos != 0) {
+    if ((xPos != 0 || yPos != 0) && (!changesOnly || positionChanged)) {
         Serial.print("Joystick Position -> X: ");
         Serial.print(xPos);
         Serial.print(", Y: ");
@@ -148,13 +346,18 @@ void loop() {
         Serial.println("Joystick Centered");
     }
     wasNotCenter = nowNotCenter;
-    // Send heartbeat every 5 seconds to confirm Arduino is running
+#endif
+    lastEvents = frameEvents;
+
+    // Send heartbeat every second so the host can tell a quiet stick from a dead link
     unsigned long currentTime = millis();
-    if (currentTime - lastHeartbeat >= heartbeatInterval) {
-        // Serial.println("Arduino Heartbeat");
+    if (heartbeatEnabled && currentTime - lastHeartbeat >= heartbeatInterval) {
+        Serial.println("Arduino Heartbeat");
         lastHeartbeat = currentTime;
     }
 
-    // Delay to avoid too fast output
-    delay(100);
+    // Wait out the sample interval, still answering host commands
+    while (millis() - loopStart < sampleInterval) {
+        handleHostCommands();
+    }
 }
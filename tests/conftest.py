@@ -0,0 +1,105 @@
+"""Shared fixtures: controllers with a recording backend, on a manual clock or on real time"""
+
+import os
+import sys
+import time
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from joystick_controller_final import GameJoystickController  # noqa: E402
+from key_scheduler import ManualClock  # noqa: E402
+from output_backends import RecordingBackend  # noqa: E402
+
+PROFILES = os.path.join(ROOT, "profiles")
+
+
+class PortInfo:
+    """serial.tools.list_ports entry for a simulated board"""
+
+    def __init__(self, device, description="Arduino Uno", vid=0x2341, pid=0x0043):
+        self.device = device
+        self.description = description
+        self.vid = vid
+        self.pid = pid
+
+
+class FakePort:
+    """Serial port stand-in that keeps what the host writes"""
+
+    def __init__(self):
+        self.written = []
+        self.is_open = True
+
+    def write(self, data):
+        self.written.append(data.decode('ascii').strip())
+        return len(data)
+
+    def close(self):
+        self.is_open = False
+
+
+def recording_controller():
+    """Controller on real time that records its key transitions, for tests with a listener"""
+    controller = GameJoystickController(output=RecordingBackend())
+    controller.liveness_timeout = None  # Most simulated devices send no heartbeats
+    return controller
+
+
+def close_controller(controller):
+    controller.is_running = False
+    controller.stopped.set()
+    controller.focus_tracker.stop()
+
+
+@pytest.fixture
+def clock():
+    return ManualClock(1.0)
+
+
+@pytest.fixture
+def controller(clock):
+    controller = GameJoystickController(clock=clock, output=RecordingBackend(clock=clock))
+    controller.liveness_timeout = None
+    yield controller
+    close_controller(controller)
+
+
+@pytest.fixture
+def live_controller():
+    controller = recording_controller()
+    yield controller
+    close_controller(controller)
+
+
+def run_until(controller, clock, end):
+    """Run every timer due up to end, moving the clock from deadline to deadline"""
+    while True:
+        deadline = controller.next_wakeup()
+        if deadline is None or deadline > end:
+            break
+        clock.set(deadline)
+        controller.run_timers()
+    clock.set(end)
+    controller.run_timers()
+
+
+def wait_for(condition, timeout=2.0):
+    """Poll condition until it holds, False if it never did within timeout seconds"""
+    deadline = time.perf_counter() + timeout
+    while not condition():
+        if time.perf_counter() > deadline:
+            return False
+        time.sleep(0.002)
+    return True
+
+
+def pressed_count(controller):
+    """Key presses the controller's recording backend has seen"""
+    return sum(down for _, _, down in controller.output.events)
+
+
+def held(controller):
+    return set(controller.key_state.held_keys())
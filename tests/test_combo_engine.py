@@ -0,0 +1,51 @@
+import os
+
+from conftest import PROFILES, held, run_until
+import game_profiles
+import output_backends
+
+
+def load_arrows(controller):
+    profile = game_profiles.load_profile(os.path.join(PROFILES, "arrows.json"), output_backends.VK_CODES)
+    return profile.compile(controller.key_state, controller.DIRECTION_KEYS)
+
+
+def fire_dash(controller):
+    for line in (b"Down Button Pressed", b"Down Button Released", b"Right Button Pressed",
+                 b"Right Button Released", b"E Button Pressed"):
+        controller.process_joystick_line(line)
+
+
+def test_dash_macro_holds_then_releases(controller, clock):
+    controller.apply_profile(load_arrows(controller))
+    fire_dash(controller)
+    assert {"shift", "right"} <= held(controller)
+
+    run_until(controller, clock, clock() + 0.5)
+    assert not {"shift", "right"} & held(controller)
+
+
+def test_profile_reload_releases_keys_of_a_running_macro(controller, clock):
+    controller.apply_profile(load_arrows(controller))
+    fire_dash(controller)
+    assert {"shift", "right"} <= held(controller)
+
+    # Hot reload of the same file while the macro waits between "+right" and "-right"
+    controller.apply_profile(load_arrows(controller))
+    assert not {"shift", "right"} & held(controller)
+    assert len(controller.macro_player) == 0
+
+    run_until(controller, clock, clock() + 5.0)
+    assert not {"shift", "right"} & held(controller)
+    presses = [key for _, key, down in controller.output.events if down]
+    releases = [key for _, key, down in controller.output.events if not down]
+    assert sorted(presses) == sorted(releases)
+
+
+def test_stop_releases_keys_of_a_running_macro(controller):
+    controller.apply_profile(load_arrows(controller))
+    fire_dash(controller)
+
+    controller.macro_player.stop()
+    assert controller.macro_player.held == 0
+    assert not {"shift", "right"} & held(controller)
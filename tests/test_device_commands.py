@@ -0,0 +1,177 @@
+import threading
+
+import pytest
+import serial
+
+from conftest import FakePort, pressed_count, run_until, wait_for
+import device_commands
+from device_commands import FIRMWARE_DEFAULTS, CommandError
+from joystick_simulator import JoystickShieldSimulator, ScriptedTrajectory
+
+
+@pytest.fixture
+def port(controller):
+    port = FakePort()
+    controller.attach_serial_port(port)
+    return port
+
+
+def reply(controller, line):
+    controller.process_joystick_line(line.encode('ascii'))
+
+
+def test_ack_records_the_setting(controller, clock, port):
+    pending = controller.device_commands.send("INTERVAL", 2)
+    assert port.written == ["!1 INTERVAL 2"]
+    clock.advance(0.004)
+    reply(controller, "ACK 1 INTERVAL 2")
+    assert pending.done and pending.ok
+    assert pending.round_trip == pytest.approx(0.004)
+    assert controller.device_commands.acknowledged["INTERVAL"] == 2
+    assert controller.device_commands.supported is True
+
+
+def test_nak_leaves_the_setting(controller, port):
+    pending = controller.device_commands.send("INTERVAL", 2)
+    reply(controller, "NAK 1 INTERVAL range")
+    assert pending.done and pending.ok is False
+    assert pending.reply == "NAK 1 INTERVAL range"
+    assert controller.device_commands.acknowledged["INTERVAL"] == FIRMWARE_DEFAULTS["INTERVAL"]
+
+
+def test_unanswered_command_is_retried_then_marks_the_device_unsupported(controller, clock, port):
+    commands = controller.device_commands
+    pending = commands.send("CHANGES", 1)
+    run_until(controller, clock, clock() + commands.timeout * commands.retries + 0.01)
+    assert port.written == ["!1 CHANGES 1"] * commands.retries
+    assert pending.ok is False and pending.reply == "timeout"
+    assert commands.supported is False
+    assert controller.changes_only is False
+
+    # Old firmware: later commands are not written at all
+    assert commands.send("CHANGES", 1).reply == "unsupported"
+    assert len(port.written) == commands.retries
+
+
+def test_reply_to_a_retry_is_accepted(controller, clock, port):
+    commands = controller.device_commands
+    pending = commands.send("HEARTBEAT", 0)
+    run_until(controller, clock, clock() + commands.timeout + 0.01)
+    assert len(port.written) == 2
+    reply(controller, "ACK 1 HEARTBEAT 0")
+    assert pending.ok and pending.attempts == 2
+    run_until(controller, clock, clock() + 1.0)
+    assert len(port.written) == 2
+
+
+def test_setting_reverted_before_the_ack_is_sent_again(controller, port):
+    commands = controller.device_commands
+    commands.apply({"CHANGES": 1})
+    commands.apply({})
+    assert port.written == ["!1 CHANGES 1", "!2 CHANGES 0"]
+    reply(controller, "ACK 1 CHANGES 1")
+    reply(controller, "ACK 2 CHANGES 0")
+    assert commands.acknowledged["CHANGES"] == 0
+    assert controller.changes_only is False
+
+
+def test_stale_ack_triggers_a_resend(controller, port):
+    commands = controller.device_commands
+    commands.apply({"CHANGES": 1})
+    # Something overwrote what the host wants without sending it
+    commands.desired["CHANGES"] = 0
+    reply(controller, "ACK 1 CHANGES 1")
+    assert port.written[-1] == "!2 CHANGES 0"
+    reply(controller, "ACK 2 CHANGES 0")
+    assert controller.changes_only is False
+
+
+def test_apply_sends_only_what_differs(controller, port):
+    commands = controller.device_commands
+    commands.apply({"INTERVAL": 2, "CHANGES": 1})
+    assert sorted(port.written) == ["!1 INTERVAL 2", "!2 CHANGES 1"]
+    commands.apply({"INTERVAL": 2, "CHANGES": 1})
+    assert len(port.written) == 2
+
+
+def test_changes_only_and_heartbeat_adjust_the_controller(controller, port):
+    controller.liveness_timeout = 3.0
+    commands = controller.device_commands
+    commands.apply({"CHANGES": 1, "HEARTBEAT": 0})
+    reply(controller, "ACK 1 CHANGES 1")
+    reply(controller, "ACK 2 HEARTBEAT 0")
+    assert controller.changes_only
+    assert controller.turbo.hold_timeout is None
+    assert controller.liveness_timeout is None
+
+    controller.process_joystick_line(b"Joystick Up")
+    assert controller.next_direction_deadline() is None
+
+    controller.on_link_lost()
+    assert not controller.changes_only
+    assert controller.liveness_timeout == 3.0
+    assert commands.acknowledged == FIRMWARE_DEFAULTS
+
+
+def test_settings_are_validated():
+    with pytest.raises(CommandError):
+        device_commands.validate("INTERVAL", 1)
+    with pytest.raises(CommandError):
+        device_commands.validate("SPEED", 1)
+    assert device_commands.parse_device_settings({"interval": 2, "changes_only": True}, "p.json") == {
+        "INTERVAL": 2, "CHANGES": 1}
+    with pytest.raises(CommandError):
+        device_commands.parse_device_settings({"rate": 2}, "p.json")
+
+
+def run_listener(controller, device):
+    controller.attach_serial_port(serial.Serial(device.port_name, 115200, timeout=1))
+    controller.is_running = True
+    listener = threading.Thread(target=controller.serial_listener, daemon=True)
+    listener.start()
+    return listener
+
+
+def stop_listener(controller, listener):
+    controller.is_running = False
+    listener.join(timeout=2)
+    controller.serial_port.close()
+
+
+def test_simulator_applies_and_restores_settings(live_controller):
+    trajectory = ScriptedTrajectory([(0.5, 80, 0, []), (0.5, 0, 0, [])])
+    with JoystickShieldSimulator(trajectory, interval=0.1) as device:
+        listener = run_listener(live_controller, device)
+        commands = live_controller.device_commands
+        try:
+            sent = commands.apply({"INTERVAL": 2, "CHANGES": 1, "POSITION": 0})
+            assert len(sent) == 3
+            assert all(pending.wait(2.0) for pending in sent)
+            assert device.interval == pytest.approx(0.002)
+            assert device.model.changes_only and not device.model.position
+            assert live_controller.changes_only
+
+            sent = commands.apply({})
+            assert all(pending.wait(2.0) for pending in sent)
+            assert device.interval == pytest.approx(0.1)
+            assert commands.acknowledged == FIRMWARE_DEFAULTS
+            assert not live_controller.changes_only
+        finally:
+            stop_listener(live_controller, listener)
+    assert device.commands[0].startswith("!")
+
+
+def test_simulated_old_firmware_keeps_working(live_controller):
+    trajectory = ScriptedTrajectory([(0.2, 80, 0, []), (0.05, 80, 0, []), (0.2, 0, 0, []), (0.05, 0, 0, [])])
+    with JoystickShieldSimulator(trajectory, interval=0.02, supports_commands=False) as device:
+        live_controller.device_commands.timeout = 0.05
+        listener = run_listener(live_controller, device)
+        try:
+            pending = live_controller.device_commands.send("INTERVAL", 2)
+            assert pending.wait(2.0) is False
+            assert pending.reply == "timeout"
+            assert live_controller.device_commands.supported is False
+            presses = pressed_count(live_controller)
+            assert wait_for(lambda: pressed_count(live_controller) > presses)
+        finally:
+            stop_listener(live_controller, listener)
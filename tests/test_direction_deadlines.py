@@ -0,0 +1,71 @@
+from conftest import held, run_until
+
+
+def count_wakeups(controller, clock, end):
+    """Timer wakeups a deadline-driven loop makes up to end"""
+    wakeups = 0
+    while True:
+        deadline = controller.next_wakeup()
+        if deadline is None or deadline > end:
+            break
+        clock.set(deadline)
+        controller.run_timers()
+        wakeups += 1
+    clock.set(end)
+    return wakeups
+
+
+def test_held_direction_is_released_at_its_deadline(controller, clock):
+    controller.set_direction_timeout(0.15)
+    controller.process_joystick_line(b"Joystick Up")
+    pressed_at = clock()
+    run_until(controller, clock, pressed_at + 0.149)
+    assert held(controller) == {"w"}
+    run_until(controller, clock, pressed_at + 0.151)
+    assert held(controller) == set()
+    released = [at for at, key, down in controller.output.events if key == "w" and not down]
+    assert released == [pressed_at + 0.15]
+
+
+def test_repeats_push_the_deadline_back(controller, clock):
+    controller.set_direction_timeout(0.15)
+    start = clock()
+    for _ in range(5):
+        controller.process_joystick_line(b"Joystick Up")
+        run_until(controller, clock, clock() + 0.1)
+    assert held(controller) == {"w"}
+    run_until(controller, clock, clock() + 0.06)
+    assert held(controller) == set()
+    assert controller.timeout_releases == 1
+    assert clock() - start > 0.5
+
+
+def test_nothing_is_due_without_held_keys(controller, clock):
+    assert controller.next_wakeup() is None
+    assert count_wakeups(controller, clock, clock() + 10.0) == 0
+
+
+def test_four_held_keys_wake_the_loop_once_each(controller, clock):
+    controller.set_direction_timeout(0.15)
+    state = controller.key_state
+    for key in controller.DIRECTION_KEYS:
+        controller.change_keys(0, state.bit(key))
+        controller.refresh_direction_deadlines([key])
+        clock.advance(0.01)
+    assert held(controller) == set(controller.DIRECTION_KEYS)
+
+    # Ten seconds of idle loop cost four wakeups, one per release, not a scan every tick
+    assert count_wakeups(controller, clock, clock() + 10.0) == 4
+    assert held(controller) == set()
+    assert controller.timeout_releases == 4
+    assert controller.next_wakeup() is None
+
+
+def test_refreshed_keys_cost_no_extra_wakeups(controller, clock):
+    controller.set_direction_timeout(0.15)
+    wakeups = 0
+    for _ in range(100):
+        controller.process_joystick_line(b"Joystick Up")
+        wakeups += count_wakeups(controller, clock, clock() + 0.05)
+    assert wakeups == 0
+    assert held(controller) == {"w"}
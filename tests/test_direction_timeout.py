@@ -0,0 +1,106 @@
+import pytest
+
+import game_profiles
+import output_backends
+from conftest import held, run_until
+from key_scheduler import RepeatCadence
+
+
+def compiled_profile(controller, **fields):
+    data = {"mapping": {"Joystick Up": "w", "Joystick Down": "s", "Joystick Left": "a", "Joystick Right": "d"}}
+    data.update(fields)
+    profile = game_profiles.parse_profile(data, output_backends.VK_CODES, "test.json")
+    return profile.compile(controller.key_state, controller.DIRECTION_KEYS)
+
+
+def test_profile_timeout_replaces_the_adaptive_one(controller):
+    controller.apply_profile(compiled_profile(controller, direction_timeout=0.3))
+    assert controller.direction_timeout == 0.3
+    assert controller.direction_cadence is None
+
+
+def test_command_line_timeout_wins_over_the_profile(controller):
+    controller.direction_timeout_override = 0.2
+    controller.set_direction_timeout(0.2)
+    controller.apply_profile(compiled_profile(controller, direction_timeout=0.5))
+    assert controller.direction_timeout == 0.2
+    controller.apply_profile(compiled_profile(controller))
+    assert controller.direction_timeout == 0.2
+
+
+def repeat(controller, clock, message, intervals):
+    """Send message once, then again after each interval, running timers in between"""
+    controller.process_joystick_line(message)
+    for interval in intervals:
+        run_until(controller, clock, clock() + interval)
+        controller.process_joystick_line(message)
+
+
+def test_timeout_converges_to_the_repeat_cadence(controller, clock):
+    assert controller.direction_cadence is not None
+    assert controller.direction_timeout == 0.15
+    repeat(controller, clock, b"Joystick Up", [0.2] * 200)
+    # mean + 4 sd + 10 ms, with no jitter left to widen it
+    assert controller.direction_timeout == pytest.approx(0.21, abs=0.001)
+
+    # Once learned, a 200 ms cadence no longer expires between repeats
+    releases = controller.timeout_releases
+    repeat(controller, clock, b"Joystick Up", [0.2] * 20)
+    assert held(controller) == {"w"}
+    assert controller.timeout_releases == releases
+
+
+def test_jittered_cadence_never_expires_between_repeats(controller, clock):
+    jitter = [0.09, 0.13, 0.1, 0.11, 0.08, 0.12]
+    repeat(controller, clock, b"Joystick Up", jitter * 20)
+    releases = controller.timeout_releases
+    repeat(controller, clock, b"Joystick Up", jitter * 20)
+    assert controller.timeout_releases == releases
+    assert controller.direction_timeout > max(jitter)
+
+
+def test_timeout_stays_within_its_clamps():
+    cadence = RepeatCadence(0.1, 0.12, 0.4)
+    for now in range(50):
+        timeout = cadence.observe(now * 0.01)
+    assert timeout == 0.12
+
+    # Wild jitter widens it, but never past the maximum
+    now = 1.0
+    for interval in [0.02, 0.39] * 30:
+        now += interval
+        timeout = cadence.observe(now)
+        assert 0.12 <= timeout <= 0.4
+    assert timeout == 0.4
+
+    # A gap longer than the maximum is a stop and restart, not cadence
+    samples = cadence.samples
+    cadence.observe(now + 5.0)
+    assert cadence.samples == samples
+
+
+def test_gap_that_causes_a_release_and_re_press_is_spurious(controller, clock):
+    repeat(controller, clock, b"Joystick Up", [0.1] * 50)
+    timeout = controller.direction_timeout
+    assert timeout == pytest.approx(0.12)
+
+    # One repeat goes missing: the key is released, then the next repeat presses it again
+    run_until(controller, clock, clock() + 0.2)
+    assert held(controller) == set()
+    assert controller.timeout_releases == 1
+    controller.process_joystick_line(b"Joystick Up")
+    assert held(controller) == {"w"}
+    assert controller.spurious_represses == 1
+
+
+def test_release_after_a_center_is_not_spurious(controller, clock):
+    repeat(controller, clock, b"Joystick Up", [0.1] * 20)
+    controller.process_joystick_line(b"Joystick Center")
+    run_until(controller, clock, clock() + 0.2)
+    controller.process_joystick_line(b"Joystick Up")
+
+    # A re-press long after a timeout release is a new move
+    run_until(controller, clock, clock() + 1.0)
+    controller.process_joystick_line(b"Joystick Up")
+    assert controller.timeout_releases == 1
+    assert controller.spurious_represses == 0
@@ -0,0 +1,63 @@
+import focus_tracker
+from focus_tracker import FakeFocusTracker
+from key_scheduler import ManualClock
+
+
+def make_tracker(**kwargs):
+    clock = ManualClock(10.0)
+    return FakeFocusTracker(hwnd=1, title="Game", ttl=0.25, clock=clock, **kwargs), clock
+
+
+def test_checks_within_the_ttl_hit_the_cache():
+    tracker, clock = make_tracker()
+    assert tracker.current().kind == focus_tracker.GAME
+    for _ in range(5):
+        clock.advance(0.04)
+        assert tracker.is_game_focused()
+    assert tracker.queries == 1
+
+
+def test_cache_expires_after_the_ttl():
+    tracker, clock = make_tracker(notify=False)
+    tracker.current()
+    tracker.set_foreground(2, "python.exe")
+    clock.advance(0.2)
+    assert tracker.current().hwnd == 1
+    assert tracker.queries == 1
+
+    clock.advance(0.05)
+    info = tracker.current()
+    assert (info.hwnd, info.kind) == (2, focus_tracker.CONSOLE)
+    assert tracker.queries == 2
+
+
+def test_foreground_event_invalidates_before_the_ttl():
+    tracker, clock = make_tracker(notify=True)
+    tracker.current()
+    tracker.set_foreground(2, "Command Prompt - cmd")
+    assert not tracker.is_game_focused()
+    assert tracker.queries == 2
+
+    clock.advance(0.1)
+    assert not tracker.is_game_focused()
+    assert tracker.queries == 2
+
+
+def test_failed_query_counts_as_an_unknown_window():
+    tracker, _ = make_tracker()
+    tracker.query_foreground = lambda: 1 / 0
+    info = tracker.current()
+    assert (info.hwnd, info.kind) == (0, focus_tracker.OTHER)
+    assert tracker.is_game_focused()
+
+
+def test_controller_warns_once_per_console_window(controller, clock, caplog):
+    tracker = FakeFocusTracker(clock=clock)
+    controller.focus_tracker = tracker
+    assert controller.ensure_game_focus()
+
+    tracker.set_foreground(7, "python")
+    for _ in range(3):
+        assert not controller.ensure_game_focus()
+    assert sum("Please switch" in record.getMessage() for record in caplog.records) == 1
+    assert tracker.queries == 2
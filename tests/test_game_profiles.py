@@ -0,0 +1,29 @@
+import os
+import sys
+
+import game_profiles
+
+
+def test_source_checkout_uses_the_bundled_profiles():
+    assert game_profiles.user_profile_dir() == game_profiles.BUNDLED_PROFILE_DIR
+
+
+def test_frozen_exe_uses_a_directory_next_to_it(monkeypatch, tmp_path):
+    monkeypatch.setattr(sys, "frozen", True, raising=False)
+    monkeypatch.setattr(sys, "executable", str(tmp_path / "JoystickController.exe"))
+    assert game_profiles.user_profile_dir() == str(tmp_path / "profiles")
+
+
+def test_seeding_copies_the_bundled_profiles_once(tmp_path):
+    target = tmp_path / "profiles"
+    assert game_profiles.seed_profile_dir(str(target))
+    bundled = sorted(name for name in os.listdir(game_profiles.BUNDLED_PROFILE_DIR) if name.endswith(".json"))
+    assert sorted(os.listdir(target)) == bundled
+
+    (target / "default.json").write_text("{}", encoding="utf-8")
+    assert not game_profiles.seed_profile_dir(str(target))
+    assert (target / "default.json").read_text(encoding="utf-8") == "{}"
+
+
+def test_bundled_directory_is_never_seeded():
+    assert not game_profiles.seed_profile_dir(game_profiles.BUNDLED_PROFILE_DIR)
@@ -0,0 +1,88 @@
+import queue
+import threading
+import time
+
+import pytest
+
+import injection_process
+import output_backends
+from joystick_controller_final import GameJoystickController
+from injection_process import KIND_CLOSE, KIND_KEY_DOWN, KIND_KEY_UP, KIND_RESET, EventRing, RingOutput
+from output_backends import RecordingBackend
+
+
+class PickyBackend(RecordingBackend):
+    """Rejects every batch that presses "e" """
+
+    def send(self, transitions):
+        if ("e", True) in transitions:
+            return False
+        return super().send(transitions)
+
+
+def run_injector(monkeypatch, records):
+    """Run injector_main in a thread on a fresh ring holding records, returns (backend, replies)"""
+    backend = PickyBackend()
+    monkeypatch.setattr(output_backends, "create_backend", lambda name, vk_codes: backend)
+    monkeypatch.setattr(injection_process.signal, "signal", lambda *args: None)
+    keys = list(output_backends.VK_CODES)
+    ring = EventRing.create(64)
+    results = queue.Queue()
+    doorbell = threading.Semaphore(0)
+    ring.put([(kind, injection_process.FLAG_BATCH_END, 0, 0, keys.index(key) if key else 0)
+              for kind, key in records] + [(KIND_CLOSE, 0, 0, 0, 0)])
+    doorbell.release()
+    injector = threading.Thread(target=injection_process.injector_main, args=(
+        ring.name, 64, keys, output_backends.VK_CODES, "recording", doorbell, queue.Queue(), results))
+    injector.start()
+    injector.join(timeout=5)
+    ring.close()
+    replies = []
+    while not results.empty():
+        replies.append(results.get())
+    return backend, replies
+
+
+def test_rejected_batch_is_reported(monkeypatch):
+    _, replies = run_injector(monkeypatch, [(KIND_KEY_DOWN, "w"), (KIND_KEY_DOWN, "e")])
+    assert ("rejected", [("e", True)]) in replies
+    assert replies[-1][1]["failures"] == 1
+
+
+def test_reset_releases_only_the_keys_really_held(monkeypatch):
+    backend, _ = run_injector(monkeypatch, [
+        (KIND_KEY_DOWN, "w"), (KIND_KEY_DOWN, "a"), (KIND_KEY_UP, "a"), (KIND_KEY_DOWN, "e"),
+        (KIND_RESET, None)])
+    assert [(key, down) for _, key, down in backend.events] == [
+        ("w", True), ("a", True), ("a", False), ("w", False)]
+
+
+@pytest.fixture
+def ring_output():
+    output = RingOutput("recording", output_backends.VK_CODES)
+    yield output
+    output.close()
+
+
+def test_controller_forgets_held_keys_on_a_rejection(ring_output):
+    controller = GameJoystickController(output=ring_output)
+    controller.focus_tracker.stop()
+    assert ring_output.on_rejected == controller.on_injection_rejected
+    controller.press_keys_continuous(["w", "shift"])
+    ring_output.on_rejected([("e", True)])
+    assert controller.key_state.held_keys() == []
+
+    ring_output.close()
+    transitions = [(key, down) for _, key, down in ring_output.injected_events]
+    assert sorted(transitions[:2]) == [("shift", True), ("w", True)]
+    assert sorted(transitions[2:]) == [("shift", False), ("w", False)]
+
+
+def test_close_gives_up_on_a_dead_injector(ring_output):
+    ring_output.process.kill()
+    ring_output.process.join(timeout=2)
+    while ring_output.ring.put([(KIND_KEY_DOWN, 0, 0, 0, 0)]):
+        pass
+    started = time.perf_counter()
+    ring_output.close()
+    assert time.perf_counter() - started < 2.0
@@ -0,0 +1,31 @@
+def moving(mouse, clock, seconds):
+    """True if a tick after seconds without a position update still moves the mouse"""
+    mouse.velocity_x = mouse.velocity_y = 0.0
+    return mouse.tick(clock() + seconds)
+
+
+def test_stale_position_follows_the_current_direction_timeout(controller, clock):
+    controller.enable_mouse_output(smoothing=0)
+    mouse = controller.mouse_output
+    mouse.clock = clock
+    mouse.update(100, 0)
+
+    controller.set_direction_timeout(0.15)
+    assert moving(mouse, clock, 0.1)
+    assert not moving(mouse, clock, 0.2)
+
+    # A later timeout (profile reload, --direction-timeout, adaptive) applies at once
+    controller.set_direction_timeout(0.3)
+    assert moving(mouse, clock, 0.2)
+    assert not moving(mouse, clock, 0.35)
+
+
+def test_changes_only_never_goes_stale(controller, clock):
+    controller.enable_mouse_output(smoothing=0)
+    mouse = controller.mouse_output
+    mouse.clock = clock
+    mouse.update(0, 100)
+    controller.on_device_setting("CHANGES", 1)
+    assert moving(mouse, clock, 60.0)
+    controller.on_device_setting("CHANGES", 0)
+    assert not moving(mouse, clock, 1.0)
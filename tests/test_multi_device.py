@@ -0,0 +1,68 @@
+import os
+import shutil
+
+import pytest
+
+from conftest import PROFILES, FakePort, held
+from multi_device import MultiDeviceController
+from output_backends import RecordingBackend
+
+
+@pytest.fixture
+def profile_dir(tmp_path):
+    for name in ("default.json", "arrows.json"):
+        shutil.copy(os.path.join(PROFILES, name), tmp_path / name)
+    return tmp_path
+
+
+@pytest.fixture
+def multi(profile_dir):
+    multi = MultiDeviceController(RecordingBackend())
+    assert multi.load_profiles(str(profile_dir))
+    multi.add_device(FakePort())
+    multi.add_device(FakePort())
+    multi.add_device(FakePort(), profile="arrows")
+    yield multi
+    multi.stop()
+
+
+def touch(path):
+    stat = os.stat(path)
+    os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000))
+
+
+def test_devices_share_one_profile_manager(multi):
+    names = [device.controller.profile.name for device in multi.devices]
+    assert names == ["default", "default", "arrows"]
+    assert all(device.controller.profile_manager is None for device in multi.devices)
+
+    # Every device gets its own compiled copy, bound to its own key state
+    first, second, _ = (device.controller for device in multi.devices)
+    assert first.profile is not second.profile
+    assert first.profile.tables is not second.profile.tables
+
+    first.process_joystick_line(b"Joystick Up")
+    multi.devices[2].controller.process_joystick_line(b"Joystick Up")
+    assert held(first) == {"w"}
+    assert held(second) == set()
+    assert held(multi.devices[2].controller) == {"up"}
+
+
+def test_reload_reaches_every_device_using_the_file(multi, profile_dir):
+    sources = [device.source for device in multi.devices]
+    touch(profile_dir / "arrows.json")
+    multi.profile_manager.poll()
+    assert [device.source for device in multi.devices][:2] == sources[:2]
+    assert multi.devices[2].source is not sources[2]
+
+    touch(profile_dir / "default.json")
+    multi.profile_manager.poll()
+    assert all(device.source is not source for device, source in zip(multi.devices[:2], sources[:2]))
+    assert multi.devices[0].source is multi.devices[1].source
+
+
+def test_one_watcher_thread_for_every_device(multi):
+    multi.focus_tracker.start = lambda: None
+    multi.start(block=False)
+    assert multi.profile_manager._thread is not None
+    assert all(device.controller.profile_manager is None for device in multi.devices)
@@ -0,0 +1,73 @@
+import os
+
+import pytest
+
+import game_profiles
+import output_backends
+from output_backends import UinputBackend
+
+
+@pytest.fixture
+def uinput(monkeypatch):
+    """UinputBackend without /dev/uinput: writes are collected instead"""
+    backend = object.__new__(UinputBackend)
+    backend.codes = {"w": 17, "a": 30}
+    backend.events = {(key, down): UinputBackend.INPUT_EVENT.pack(0, 0, UinputBackend.EV_KEY, code, int(down))
+                      for key, code in backend.codes.items() for down in (True, False)}
+    backend.sync = UinputBackend.INPUT_EVENT.pack(0, 0, UinputBackend.EV_SYN, UinputBackend.SYN_REPORT, 0)
+    backend.fd = -1
+    backend.written = []
+
+    def write(fd, data):
+        backend.written.append(data)
+        return len(data)
+
+    monkeypatch.setattr(os, "write", write)
+    return backend
+
+
+def test_uinput_sends_a_batch_in_one_write(uinput):
+    assert uinput.send([("w", True), ("a", True)])
+    assert len(uinput.written) == 1
+    assert len(uinput.written[0]) == 3 * UinputBackend.INPUT_EVENT.size
+
+
+def test_uinput_rejects_a_batch_with_an_unsupported_key(uinput):
+    assert not uinput.send([("w", True), ("f13", True)])
+    assert uinput.written == []
+
+
+def test_rejected_batch_leaves_the_key_state_unchanged(controller):
+    class PickyBackend(output_backends.RecordingBackend):
+        def send(self, transitions):
+            if any(key == "e" for key, _ in transitions):
+                return False
+            return super().send(transitions)
+
+    controller.output = PickyBackend()
+    state = controller.key_state
+    assert not controller.change_keys(0, state.mask_of(["w", "e"]))
+    assert state.held_keys() == []
+    assert controller.change_keys(0, state.mask_of(["w"]))
+    assert controller.output.events[-1][1:] == ("w", True)
+
+
+def test_uinput_maps_profile_keys_to_evdev_codes(uinput):
+    uinput.register_keys({"q": 0x51, "f5": 0x74, "numpad 8": 0x68})
+    assert uinput.codes["q"] == output_backends.EVDEV_CODES["q"]
+    assert uinput.codes["f5"] == 63
+    assert uinput.codes["numpad 8"] == 72
+    assert uinput.send([("f5", True), ("numpad 8", True)])
+
+
+def test_built_in_keys_map_to_the_same_evdev_codes():
+    for key, vk_code in output_backends.VK_CODES.items():
+        assert output_backends.VK_TO_EVDEV[vk_code] == output_backends.EVDEV_CODES[key]
+
+
+def test_profile_with_a_key_uinput_cannot_inject_is_rejected(uinput):
+    data = {"vk_codes": {"f5": 0x74, "media": 0xB3}, "mapping": {"E Button Clicked": "media"}}
+    with pytest.raises(game_profiles.ProfileError, match="uinput output cannot inject \\['media'\\]"):
+        game_profiles.parse_profile(data, output_backends.VK_CODES, "media.json", uinput)
+    # Other backends take any virtual key code
+    game_profiles.parse_profile(data, output_backends.VK_CODES, "media.json", output_backends.RecordingBackend())
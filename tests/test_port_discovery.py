@@ -0,0 +1,76 @@
+import json
+import time
+
+import pytest
+
+from conftest import PortInfo
+from joystick_simulator import FIRMWARE_BANNER, VirtualJoystickShield
+from port_discovery import PortDiscovery, probe_port
+
+
+@pytest.fixture
+def devices():
+    silent = VirtualJoystickShield()
+    wrong = VirtualJoystickShield(identify_reply="GPS Receiver v2.1")
+    shield = VirtualJoystickShield(identify_reply=FIRMWARE_BANNER)
+    yield silent, wrong, shield
+    for device in (silent, wrong, shield):
+        device.close()
+
+
+def listing(devices):
+    silent, wrong, shield = devices
+    return [
+        PortInfo(silent.port_name, "USB-SERIAL CH340", 0x1A86, 0x7523),
+        PortInfo(wrong.port_name, "Arduino Uno", 0x2341, 0x0043),
+        PortInfo(shield.port_name, "USB Serial Device", 0x2341, 0x0001),
+    ]
+
+
+def test_probe_rejects_silent_and_wrong_banner_ports(devices):
+    silent, wrong, shield = devices
+    assert probe_port(silent.port_name, timeout=0.3) is None
+    assert probe_port(wrong.port_name, timeout=0.3) is None
+    port = probe_port(shield.port_name, timeout=1.0)
+    assert port is not None
+    port.close()
+
+
+def test_discovery_finds_the_shield_in_parallel_and_caches_it(devices, tmp_path):
+    cache_path = tmp_path / "port.json"
+    ports = listing(devices)
+    discovery = PortDiscovery(cache_path=str(cache_path), list_ports=lambda: ports, probe_timeout=1.0)
+
+    started = time.monotonic()
+    port, entry = discovery.find()
+    elapsed = time.monotonic() - started
+    assert port is not None
+    port.close()
+    assert entry.device == devices[2].port_name
+    # Probed together: far less than one probe timeout per port
+    assert elapsed < 1.5
+    assert json.loads(cache_path.read_text(encoding="utf-8")) == {"device": entry.device, "id": "2341:0001"}
+
+    started = time.monotonic()
+    port, entry = discovery.find()
+    assert port is not None
+    port.close()
+    assert entry.device == devices[2].port_name
+    assert time.monotonic() - started < 0.5
+
+
+def test_nothing_found_without_a_shield(devices, tmp_path):
+    ports = listing(devices)[:2]
+    discovery = PortDiscovery(cache_path=str(tmp_path / "port.json"), list_ports=lambda: ports, probe_timeout=0.3)
+    assert discovery.find() == (None, None)
+    assert not (tmp_path / "port.json").exists()
+
+
+def test_extra_ports_are_probed_first(devices):
+    shield = devices[2]
+    discovery = PortDiscovery(cache_path=None, list_ports=lambda: [], extra_ports=[shield.port_name],
+                              probe_timeout=1.0)
+    port, entry = discovery.find()
+    assert port is not None
+    port.close()
+    assert entry.device == shield.port_name
@@ -0,0 +1,181 @@
+import contextlib
+import io
+import threading
+import time
+
+import pytest
+
+from conftest import PortInfo, held, wait_for
+from joystick_simulator import FIRMWARE_BANNER, JoystickShieldSimulator, ScriptedTrajectory, VirtualJoystickShield
+from port_discovery import PortDiscovery
+
+
+class ClosedPort:
+    is_open = True
+
+    def close(self):
+        self.is_open = False
+
+
+class ScriptedDiscovery:
+    """find() fails a few times before the board shows up again"""
+
+    def __init__(self, failures, port):
+        self.failures = failures
+        self.port = port
+        self.calls = 0
+
+    def find(self):
+        self.calls += 1
+        if self.calls <= self.failures:
+            return None, None
+        return self.port, PortInfo("/dev/ttyACM1")
+
+
+def start_listener(controller, list_ports, tmp_path):
+    """Connect through port discovery and run the threaded listener"""
+    controller.enable_metrics()
+    controller.port_discovery = PortDiscovery(
+        cache_path=str(tmp_path / "port.json"), list_ports=list_ports, probe_timeout=0.5)
+    controller.serial_port = controller.port_discovery.find()[0]
+    controller.is_running = True
+    listener = threading.Thread(target=controller.serial_listener, daemon=True)
+    listener.start()
+    return listener
+
+
+def stop_listener(controller, listener):
+    controller.is_running = False
+    controller.stopped.set()
+    listener.join(timeout=2)
+    controller.serial_port.close()
+
+
+def test_silence_past_the_liveness_timeout_is_a_fault(controller, clock):
+    controller.liveness_timeout = 0.5
+    controller.serial_port = ClosedPort()
+    controller.enable_metrics()
+    controller.process_joystick_line(b"Joystick Up")
+    controller.press_keys_continuous("shift")
+    controller.process_joystick_line(b"Arduino Heartbeat")
+    controller.mark_link_alive()
+
+    clock.advance(0.49)
+    assert not controller.link_timed_out()
+    clock.advance(0.02)
+    assert controller.link_timed_out()
+
+    controller.on_link_lost()
+    assert held(controller) == set()
+    assert not controller.serial_port.is_open
+    assert controller.metrics.counters["link_faults"] == 1
+    assert controller.liveness_deadline() is None
+
+
+def test_silence_is_normal_before_the_first_heartbeat(controller, clock):
+    controller.liveness_timeout = 0.5
+    controller.process_joystick_line(b"Joystick Up")
+    controller.mark_link_alive()
+    clock.advance(10.0)
+    assert controller.liveness_deadline() is None
+    assert not controller.link_timed_out()
+
+
+def test_reconnect_backs_off_until_the_board_is_back(controller, monkeypatch):
+    port = ClosedPort()
+    controller.is_running = True
+    controller.reconnect_delay = 0.001
+    controller.reconnect_max_delay = 0.004
+    controller.port_discovery = ScriptedDiscovery(failures=3, port=port)
+    controller.enable_metrics()
+    attached = []
+    monkeypatch.setattr(controller, "attach_serial_port", attached.append)
+
+    assert controller.reconnect()
+    assert attached == [port]
+    assert controller.port_discovery.calls == 4
+    assert controller.metrics.counters["reconnects"] == 1
+    assert controller.metrics.histogram("reconnect").count == 1
+
+
+def test_reconnect_gives_up_on_stop(controller):
+    controller.is_running = True
+    controller.reconnect_delay = 5.0
+    controller.port_discovery = ScriptedDiscovery(failures=100, port=None)
+    controller.stopped.set()
+    started = time.perf_counter()
+    assert not controller.reconnect()
+    assert time.perf_counter() - started < 1.0
+
+
+@pytest.fixture
+def link(live_controller, tmp_path):
+    """Listener thread on a pty board with heartbeats that can be unplugged and replugged"""
+    with contextlib.ExitStack() as stack:
+        devices = []
+
+        def plug_in():
+            device = stack.enter_context(
+                VirtualJoystickShield(identify_reply=FIRMWARE_BANNER, heartbeat_interval=0.1))
+            devices.append(device)
+            return device
+
+        plug_in()
+        controller = live_controller
+        controller.liveness_timeout = 0.4
+        controller.reconnect_delay = 0.05
+        stack.enter_context(contextlib.redirect_stdout(io.StringIO()))
+        listener = start_listener(controller, lambda: [PortInfo(devices[-1].port_name)], tmp_path)
+        yield controller, devices, plug_in
+        stop_listener(controller, listener)
+
+
+def hold_up(controller, device):
+    """Stream the stick up until the controller presses w"""
+    return wait_for(lambda: device.send_line("Joystick Up") or controller.key_state.is_pressed("w"), 2.0)
+
+
+def test_unplugged_board_releases_keys_and_reconnects(link):
+    controller, devices, plug_in = link
+    counters = controller.metrics.counters
+    assert hold_up(controller, devices[-1])
+
+    devices[-1].close()
+    assert wait_for(lambda: counters.get("link_faults", 0) == 1, 2.0)
+    assert held(controller) == set()
+
+    # The board comes back on another port while the listener keeps retrying
+    time.sleep(0.2)
+    plug_in()
+    assert wait_for(lambda: counters.get("reconnects", 0) == 1, 3.0)
+    assert hold_up(controller, devices[-1])
+
+
+def test_idle_old_firmware_is_not_a_fault(live_controller, tmp_path):
+    # No heartbeats and no ACKs, centered: nothing arrives at all while idle
+    simulator = JoystickShieldSimulator(ScriptedTrajectory([(10.0, 0, 0, ())]), heartbeat_interval=None,
+                                        supports_commands=False)
+    controller = live_controller
+    controller.liveness_timeout = 0.2
+    controller.device_commands.timeout = 0.05
+    with simulator, contextlib.redirect_stdout(io.StringIO()):
+        listener = start_listener(controller, lambda: [PortInfo(simulator.port_name)], tmp_path)
+        time.sleep(1.0)
+        stop_listener(controller, listener)
+    assert controller.metrics.counters.get("link_faults", 0) == 0
+    assert controller.metrics.counters.get("reconnects", 0) == 0
+
+
+def test_missing_heartbeats_are_a_fault(link):
+    controller, devices, _ = link
+    counters = controller.metrics.counters
+    controller.press_keys_continuous("shift")
+    time.sleep(0.6)
+    assert counters.get("link_faults", 0) == 0
+
+    devices[-1].pause_heartbeat()
+    assert wait_for(lambda: counters.get("link_faults", 0) == 1, 2.0)
+    assert not controller.key_state.is_pressed("shift")
+
+    devices[-1].pause_heartbeat(False)
+    assert wait_for(lambda: counters.get("reconnects", 0) == 1, 3.0)
@@ -0,0 +1,112 @@
+import asyncio
+import contextlib
+import io
+import threading
+from collections import defaultdict
+
+import pytest
+import serial
+
+from async_controller import AsyncJoystickController
+from conftest import close_controller, held, recording_controller, wait_for
+from joystick_simulator import VirtualJoystickShield
+
+MODES = ("threaded", "asyncio")
+
+
+def start_runtime(mode, controller, port):
+    """Run the controller on port in its own thread, the way each mode is embedded"""
+    if mode == "threaded":
+        controller.serial_port = port
+        controller.is_running = True
+        runner = threading.Thread(target=controller.serial_listener, daemon=True)
+    else:
+        runner = threading.Thread(target=asyncio.run,
+                                  args=(AsyncJoystickController(controller).run(port),), daemon=True)
+    runner.start()
+    return runner
+
+
+def run_script(mode):
+    """Direction flips, clicks, center, a timeout release, then an unplug"""
+    controller = recording_controller()
+    controller.auto_reconnect = False
+    controller.set_direction_timeout(0.15)
+    pressed = controller.key_state.is_pressed
+
+    def released_count(key):
+        return sum(k == key and not down for _, k, down in controller.output.events)
+
+    with VirtualJoystickShield() as device, contextlib.redirect_stdout(io.StringIO()):
+        runner = start_runtime(mode, controller, serial.Serial(device.port_name, 115200, timeout=1))
+        for i in range(6):
+            key = "w" if i % 2 == 0 else "s"
+            device.send_line("Joystick Up" if key == "w" else "Joystick Down")
+            assert wait_for(lambda: pressed(key))
+            if i % 3 == 2:
+                clicks = (i + 1) // 3
+                device.send_line("E Button Clicked")
+                assert wait_for(lambda: released_count("e") == clicks)
+        device.send_line("Joystick Center")
+        assert wait_for(lambda: not held(controller))
+
+        # Held without repeats: the direction timeout releases it
+        device.send_line("Joystick Right")
+        assert wait_for(lambda: pressed("d"))
+        assert wait_for(lambda: not pressed("d"), 1.0)
+
+        device.send_line("Joystick Left")
+        assert wait_for(lambda: pressed("a"))
+        device.close()
+        runner.join(timeout=2)
+
+    return controller, runner
+
+
+@pytest.fixture(scope="module")
+def results():
+    results = {mode: run_script(mode) for mode in MODES}
+    yield results
+    for controller, _ in results.values():
+        close_controller(controller)
+
+
+@pytest.mark.parametrize("mode", MODES)
+def test_unplug_ends_the_runtime_with_nothing_held(results, mode):
+    controller, runner = results[mode]
+    assert not runner.is_alive()
+    assert held(controller) == set()
+    assert controller.timeout_releases == 1
+
+
+def test_both_modes_inject_the_same_transitions_per_key(results):
+    transitions = {}
+    for mode, (controller, _) in results.items():
+        per_key = defaultdict(list)
+        for _, key, down in controller.output.events:
+            per_key[key].append(down)
+        transitions[mode] = dict(per_key)
+    assert transitions["threaded"] == transitions["asyncio"]
+    assert transitions["threaded"]["w"] == [True, False] * 3
+    assert transitions["threaded"]["e"] == [True, False] * 2
+
+
+def test_async_stop_releases_held_keys(live_controller):
+    controller = live_controller
+
+    async def scenario(device):
+        joystick = AsyncJoystickController(controller)
+        await joystick.start(serial.Serial(device.port_name, 115200, timeout=1))
+        device.send_line("Joystick Up")
+        for _ in range(200):
+            if controller.key_state.is_pressed("w"):
+                break
+            await asyncio.sleep(0.005)
+        assert controller.key_state.is_pressed("w")
+        await joystick.stop()
+        await joystick.wait_closed()
+
+    with VirtualJoystickShield() as device, contextlib.redirect_stdout(io.StringIO()):
+        asyncio.run(scenario(device))
+    assert held(controller) == set()
+    assert not controller.is_running
@@ -0,0 +1,53 @@
+from binary_protocol import BinaryFrame, encode_frame, events_from_messages
+from joystick_simulator import RecordedSerialPort
+from serial_reader import SerialLineReader
+
+
+def reader_for(*chunks):
+    port = RecordedSerialPort(chunks)
+    return SerialLineReader(port), port
+
+
+def test_partial_line_is_kept_for_the_next_read():
+    reader, port = reader_for(b"Joystick Up\nJoy")
+    assert reader.read_lines() == [b"Joystick Up"]
+    port.feed(b"stick Down\n")
+    assert reader.read_lines() == [b"Joystick Down"]
+    assert reader.read_lines() == []
+
+
+def test_line_split_between_cr_and_lf():
+    reader, port = reader_for(b"Button A\r")
+    assert reader.read_lines() == []
+    port.feed(b"\n\r\nButton B\r\n")
+    assert reader.read_lines() == [b"Button A", b"Button B"]
+
+
+def test_overlong_noise_without_line_ending_is_dropped():
+    reader, port = reader_for(b"\x01" * (SerialLineReader.MAX_LINE_LENGTH + 1))
+    assert reader.read_lines() == []
+    port.feed(b"Joystick Left\n")
+    assert reader.read_lines() == [b"Joystick Left"]
+
+
+def test_binary_frames_mixed_with_text():
+    frame = encode_frame(events_from_messages([b"Joystick Up"]), 10, -10, 1)
+    reader, port = reader_for(b"ready\n" + frame[:3])
+    assert reader.read_lines() == [b"ready"]
+    assert reader.binary_mode
+
+    port.feed(frame[3:] + b"HEARTBEAT\n")
+    items = reader.read_lines()
+    assert isinstance(items[0], BinaryFrame)
+    assert items[1:] == [b"HEARTBEAT"]
+
+
+def test_corrupt_frame_costs_one_byte():
+    good = encode_frame(events_from_messages([b"Joystick Down"]), 0, 0, 2)
+    bad = bytearray(encode_frame(events_from_messages([b"Joystick Up"]), 0, 0, 1))
+    bad[-1] ^= 0xFF
+    reader, _ = reader_for(bytes(bad) + good)
+    items = reader.read_lines()
+    assert len(items) == 1
+    assert (items[0].sequence, items[0].y) == (2, 0)
+    assert reader.frame_errors >= 1
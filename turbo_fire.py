@@ -0,0 +1,126 @@
+#!/usr/bin/env python3
+"""
+Turbo Fire
+Per-button auto-fire at a fixed rate while the button is held
+
+Every turbo button runs on the controller's scheduler, the same timer
+heap the listener thread already sleeps on, so any number of turbo
+buttons share one thread. Shots are due at start + n * period rather
+than "period after the last shot", so the rate does not drift; shots the
+listener could not run in time are skipped instead of fired in a burst.
+
+The firmware repeats a held button's "Clicked" message every loop, so a
+button counts as held while those keep coming. Turbo stops on the
+button's Released edge, when the repeats stop for hold_timeout seconds,
+and on stop_all() (link loss, profile swap, shutdown). Firmware in
+report-on-change mode sends no repeats; hold_timeout is None then and
+only the Released edge ends a burst.
+"""
+
+import controller_logging
+
+log = controller_logging.get_logger()
+
+# Seconds without a repeat of a held button before its turbo stops (firmware loop: 100 ms)
+HOLD_TIMEOUT = 0.25
+# Longest a turbo tap stays pressed, as a share of the period
+MAX_PRESS_SHARE = 0.5
+
+
+class TurboButton:
+    """Schedule state of one held turbo button"""
+
+    __slots__ = ("button", "keys", "period", "press_duration", "started", "due", "last_seen", "shots",
+                 "skipped", "handle")
+
+    def __init__(self, button, keys, period, press_duration, now):
+        self.button = button
+        self.keys = keys
+        self.period = period
+        self.press_duration = press_duration
+        self.started = now
+        self.due = now
+        self.last_seen = now
+        self.shots = 0
+        self.skipped = 0
+        self.handle = None
+
+
+class TurboFire:
+    """Auto-fire for held buttons, on the controller's scheduler
+
+    on_shot, if set, is called with (button, due time, fire time) for
+    every shot; the benchmark uses it to measure jitter.
+    """
+
+    def __init__(self, controller, hold_timeout=HOLD_TIMEOUT):
+        self.controller = controller
+        self.scheduler = controller.scheduler
+        self.clock = controller.clock
+        self.hold_timeout = hold_timeout
+        self.rates = {}  # button ("E Button") -> shots per second
+        self.active = {}  # button -> TurboButton
+        self.on_shot = None
+
+    def set_rates(self, rates):
+        """Use other turbo rates, stopping every running turbo"""
+        self.stop_all()
+        self.rates = dict(rates)
+
+    def hold(self, button, keys):
+        """The button is (still) held, returns False if it has no turbo"""
+        rate = self.rates.get(button)
+        if rate is None:
+            return False
+        now = self.clock()
+        state = self.active.get(button)
+        if state is not None:
+            state.last_seen = now
+            return True
+
+        period = 1.0 / rate
+        tap_duration = self.controller.tap_duration
+        press_duration = min(tap_duration, period * MAX_PRESS_SHARE)
+        state = self.active[button] = TurboButton(button, keys, period, press_duration, now)
+        log.info("🔫 Turbo on: %s at %.1f Hz", button, rate)
+        self._shoot(state)
+        return True
+
+    def _shoot(self, state):
+        now = self.clock()
+        if self.hold_timeout is not None and now - state.last_seen > self.hold_timeout:
+            # No repeats: the release edge was lost or the button is old firmware's single click
+            self.release(state.button)
+            return
+
+        controller = self.controller
+        for key in state.keys:
+            controller.tap_key(key, state.press_duration)
+        state.shots += 1
+        if self.on_shot is not None:
+            self.on_shot(state.button, state.due, now)
+
+        due = state.due + state.period
+        if due <= now:
+            # Fell behind: keep the phase, drop the shots that are already late
+            missed = int((now - due) / state.period) + 1
+            state.skipped += missed
+            due += missed * state.period
+        state.due = due
+        state.handle = self.scheduler.call_at(due, self._shoot, state)
+
+    def release(self, button):
+        """Stop the turbo of one button"""
+        state = self.active.pop(button, None)
+        if state is None:
+            return
+        if state.handle is not None:
+            self.scheduler.cancel(state.handle)
+        log.info("🔫 Turbo off: %s after %d shot(s)", button, state.shots)
+
+    def stop_all(self):
+        for button in list(self.active):
+            self.release(button)
+
+    def __contains__(self, button):
+        return button in self.active